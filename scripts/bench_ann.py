@@ -0,0 +1,92 @@
+"""Measure recall@k and latency of the IVF index against exact search.
+
+Synthetic vectors are drawn around random topic centres, which is closer to
+real chunk embeddings than uniform noise. The same store is searched
+exactly (ground truth) and through the IVF index at several nprobe values.
+
+    uv run python scripts/bench_ann.py --chunks 1000000 --dim 384 --nlist 2048
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.localstore import LocalVectorStore
+
+BATCH_SIZE = 10000
+
+
+def make_vectors(
+    rng: np.random.Generator, n: int, dim: int, topics: int
+) -> np.ndarray:
+    centres = rng.standard_normal((topics, dim), dtype=np.float32)
+    labels = rng.integers(0, topics, n)
+    return centres[labels] + rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def search(store, queries, k, nprobe=None):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store._search(query[None], k, None, nprobe)[0]
+        latencies.append(time.perf_counter() - start)
+        results.append({row for row, _ in hits})
+    return results, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(rng, args.chunks, args.dim, args.topics)
+    queries = make_vectors(rng, args.queries, args.dim, args.topics)
+    embeddings = DeterministicFakeEmbedding(size=args.dim)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(
+            embeddings, path, index_type="ivf", nlist=args.nlist
+        )
+        start = time.perf_counter()
+        for i in range(0, args.chunks, BATCH_SIZE):
+            store.add_embeddings([
+                ("", vector.tolist()) for vector in vectors[i : i + BATCH_SIZE]
+            ])
+        print(f"build (incl. training) : {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        store = LocalVectorStore(embeddings, path)
+        print(f"open                   : {time.perf_counter() - start:.3f}s")
+
+        index, store.index = store.index, None
+        truth, latencies = search(store, queries, args.k)
+        store.index = index
+        print(
+            f"exact        recall 1.000  "
+            f"p50 {statistics.median(latencies) * 1000:7.2f}ms"
+        )
+
+        for nprobe in args.nprobe:
+            found, latencies = search(store, queries, args.k, nprobe)
+            recall = statistics.mean(
+                len(a & b) / args.k for a, b in zip(found, truth)
+            )
+            print(
+                f"nprobe={nprobe:<5} recall {recall:.3f}  "
+                f"p50 {statistics.median(latencies) * 1000:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Measure what compressing a local store saves and what it costs in recall.
+
+Synthetic vectors are drawn around random topic centres, with variance that
+decays over the dimensions the way it does in Matryoshka and most trained
+embeddings (so truncation and PCA have something to keep). An uncompressed
+float32 store is the ground truth; each configuration is a compressed copy
+of it. "disk" counts every file of the store except the SQLite sidecar and
+"scan" is what an unfiltered search reads per chunk, i.e. what needs to
+stay in memory.
+
+With ``--store``, an existing uncompressed local store (e.g. the ingested
+library) is the ground truth instead, queried with the vectors of a sample
+of its own chunks; it is only read, the compressed copies are temporary.
+
+Expect smaller stores, not faster ones: on 20,000 768-d chunks float32
+searched in 6.6ms, int8 in 8.1ms at a recall of 0.93, and "binary" in 9.9ms
+at a recall of 0.81, scanning 96B per chunk instead of 3072B.
+
+    uv run python scripts/bench_compression.py --chunks 200000 --dim 1536
+    uv run python scripts/bench_compression.py --store vectors/zotero
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.localstore import LocalVectorStore
+
+BATCH_SIZE = 10000
+
+CONFIGS = {
+    "float32": {},
+    "float16": {"dtype": "float16"},
+    "int8": {"quantization": "int8"},
+    "binary": {"quantization": "binary"},
+    "binary-x256": {"quantization": "binary", "rescore_factor": 256},
+    "truncate/4": {"projection": "truncate"},
+    "pca/4": {"projection": "pca"},
+    "pca/4+int8": {"projection": "pca", "quantization": "int8"},
+}
+
+
+def make_vectors(
+    rng: np.random.Generator, n: int, dim: int, topics: int
+) -> np.ndarray:
+    centres = rng.standard_normal((topics, dim), dtype=np.float32)
+    labels = rng.integers(0, topics, n)
+    vectors = centres[labels] + rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.sqrt(1 + np.arange(dim, dtype=np.float32) / 32)
+
+
+def open_store(path: str) -> LocalVectorStore:
+    if not os.path.exists(os.path.join(path, "meta.sqlite")):
+        raise SystemExit(f"No local store at {path}")
+    store = LocalVectorStore(DeterministicFakeEmbedding(size=1), path)
+    if store.projection is not None or store.quantization is not None:
+        raise SystemExit("--store needs an uncompressed store as baseline")
+    return store
+
+
+def sample_queries(
+    rng: np.random.Generator, store: LocalVectorStore, n: int
+) -> np.ndarray:
+    rows = np.flatnonzero(~store._deleted)
+    sample = np.sort(rng.choice(rows, min(n, len(rows)), replace=False))
+    return store._read(sample)
+
+
+def search(store, queries, k):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store._search(query[None], k, None)[0]
+        latencies.append(time.perf_counter() - start)
+        results.append({row for row, _ in hits})
+    return results, latencies
+
+
+def store_bytes(store) -> tuple[int, int]:
+    """Bytes on disk (without SQLite) and bytes an unfiltered search scans."""
+    disk = sum(
+        os.path.getsize(os.path.join(store.path, name))
+        for name in os.listdir(store.path)
+        if not name.startswith("meta.sqlite")
+    )
+    if store._codes is not None:
+        scan = store._codes
+    elif store._float is not None:
+        # float16 vectors are scanned from their float32 copy in memory
+        scan = store._float
+    else:
+        scan = store._matrix
+    return disk, scan.nbytes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--store", help="benchmark an existing local store directory"
+    )
+    parser.add_argument(
+        "--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS)
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as path:
+        if args.store:
+            base = open_store(args.store)
+            queries = sample_queries(rng, base, args.queries)
+            chunks, dim = len(base), base.dimension
+        else:
+            chunks, dim = args.chunks, args.dim
+            vectors = make_vectors(rng, chunks, dim, args.topics)
+            queries = make_vectors(rng, args.queries, dim, args.topics)
+            base = LocalVectorStore(
+                DeterministicFakeEmbedding(size=dim), os.path.join(path, "base")
+            )
+            for i in range(0, chunks, BATCH_SIZE):
+                base.add_embeddings([
+                    ("", vector.tolist())
+                    for vector in vectors[i : i + BATCH_SIZE]
+                ])
+        truth, _ = search(base, queries, args.k)
+
+        print(
+            f"{'config':<12} {'disk/chunk':>11} {'scan/chunk':>11} "
+            f"{'build':>7} {'p50':>9} {'recall':>7}"
+        )
+        for name in args.configs:
+            options = dict(CONFIGS[name])
+            if "projection" in options:
+                options["projection_dim"] = dim // 4
+            start = time.perf_counter()
+            store = (
+                base.compress(os.path.join(path, name), **options)
+                if options
+                else base
+            )
+            build = time.perf_counter() - start
+            found, latencies = search(store, queries, args.k)
+            recall = statistics.mean(
+                len(a & b) / args.k for a, b in zip(found, truth)
+            )
+            disk, scan = store_bytes(store)
+            print(
+                f"{name:<12} {disk / chunks:>10.0f}B "
+                f"{scan / chunks:>10.0f}B {build:>6.1f}s "
+                f"{statistics.median(latencies) * 1000:>7.2f}ms {recall:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
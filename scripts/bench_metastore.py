@@ -0,0 +1,227 @@
+"""Compare bulk MetaStore writes against the previous row-by-row writes.
+
+The baseline replays what MetaStore did before it kept one connection: a
+fresh connection per call, the default rollback journal, one INSERT per
+item and link, and one UPDATE / DELETE per key. Both write the same schema
+from the same synthetic items.
+
+Expect modest gains for bulk writes: populating is bound by JSON encoding
+and index maintenance, and ran at about the same speed (x0.9 to x1.1), while
+bulk updates and deletes gained x1.3 to x2.3 depending on the run. The clear
+win is for many single-key calls, the ingest pattern, at about x14.
+
+    uv run python scripts/bench_metastore.py --items 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from zotgpt.metastore import MetaStore
+
+
+class FakeItem:
+    """Stand-in for ZoteroItem with a realistic payload size."""
+
+    def __init__(self, i: int, rng: random.Random) -> None:
+        self.key = f"K{i:07d}"
+        self.tags = rng.sample([f"tag {n}" for n in range(500)], 4)
+        self.creators = rng.sample([f"Author {n}" for n in range(5000)], 3)
+        self.collections = [f"C{rng.randrange(20)}"]
+        self.item = {
+            "data": {
+                "key": self.key,
+                "parentItem": f"P{i:07d}",
+                "title": f"Attachment {i}",
+                "filename": f"paper-{i}.pdf",
+                "contentType": "application/pdf",
+            }
+        }
+        self.parent_item = {
+            "data": {
+                "key": f"P{i:07d}",
+                "title": f"A study of topic {i}",
+                "abstractNote": "lorem ipsum " * 80,
+                "tags": [{"tag": tag} for tag in self.tags],
+                "collections": self.collections,
+            }
+        }
+
+    def get_title(self) -> str:
+        return self.parent_item["data"]["title"]
+
+    def get_tags(self) -> list:
+        return self.tags
+
+    def get_creators(self) -> list:
+        return self.creators
+
+    def get_collections(self) -> list:
+        return self.collections
+
+    def get_url(self) -> str:
+        return ""
+
+    def get_pdf_path(self) -> str:
+        return f"pdfs/{self.key}/{self.item['data']['filename']}"
+
+
+def row_by_row_populate(db_path: str, items: list) -> None:
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for item in items:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO items (key, title, url, path, parent_key, item, parent_item)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                item.key,
+                item.get_title(),
+                item.get_url(),
+                item.get_pdf_path(),
+                item.item["data"]["parentItem"],
+                json.dumps(item.item),
+                json.dumps(item.parent_item),
+            ),
+        )
+        for tag in item.get_tags():
+            cursor.execute(
+                "INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,)
+            )
+            cursor.execute(
+                "INSERT INTO item_tags SELECT ?, id FROM tags WHERE name = ?",
+                (item.key, tag),
+            )
+        for creator in item.get_creators():
+            cursor.execute(
+                "INSERT OR IGNORE INTO creators (name) VALUES (?)", (creator,)
+            )
+            cursor.execute(
+                "INSERT INTO item_creators SELECT ?, id FROM creators WHERE name = ?",
+                (item.key, creator),
+            )
+        for collection in item.get_collections():
+            cursor.execute(
+                "INSERT OR IGNORE INTO collections (key) VALUES (?)",
+                (collection,),
+            )
+            cursor.execute(
+                "INSERT INTO item_collections VALUES (?, ?)",
+                (item.key, collection),
+            )
+    conn.commit()
+    conn.close()
+
+
+def row_by_row_update(db_path: str, keys: list) -> None:
+    conn = sqlite3.connect(db_path)
+    for key in keys:
+        conn.execute("UPDATE items SET embedded = 1 WHERE key = ?", (key,))
+    conn.commit()
+    conn.close()
+
+
+def one_call_per_key(update, keys: list) -> None:
+    # How the ingest pipeline marks items, once each as they finish
+    for key in keys:
+        update([key])
+
+
+def row_by_row_delete(db_path: str, keys: list) -> None:
+    conn = sqlite3.connect(db_path)
+    for key in keys:
+        conn.execute("DELETE FROM items WHERE key = ?", (key,))
+        for table in ["item_tags", "item_creators", "item_collections"]:
+            conn.execute(
+                f"DELETE FROM {table} WHERE item_key = ?",  # noqa: S608
+                (key,),
+            )
+    conn.commit()
+    conn.close()
+
+
+def timed(label: str, func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28}: {elapsed:7.2f}s")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--embedded", type=int, default=20_000)
+    parser.add_argument("--deleted", type=int, default=5_000)
+    parser.add_argument("--single-calls", type=int, default=1_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)  # noqa: S311
+    items = [FakeItem(i, rng) for i in range(args.items)]
+    keys = [item.key for item in items]
+    embedded = rng.sample(keys, min(args.embedded, len(keys)))
+    deleted = rng.sample(keys, min(args.deleted, len(keys)))
+    singles = rng.sample(keys, min(args.single_calls, len(keys)))
+
+    with tempfile.TemporaryDirectory() as path:
+        print("row by row (one connection per call, rollback journal)")
+        baseline_path = os.path.join(path, "baseline", "db.sqlite")
+        baseline = MetaStore(baseline_path)
+        baseline.create_database()
+        baseline.close()
+        sqlite3.connect(baseline_path).execute("PRAGMA journal_mode = DELETE")
+        before = [
+            timed("populate", row_by_row_populate, baseline_path, items),
+            timed(
+                f"mark {len(embedded)} embedded",
+                row_by_row_update,
+                baseline_path,
+                embedded,
+            ),
+            timed(
+                f"delete {len(deleted)}",
+                row_by_row_delete,
+                baseline_path,
+                deleted,
+            ),
+            timed(
+                f"{len(singles)} single-key updates",
+                one_call_per_key,
+                lambda keys: row_by_row_update(baseline_path, keys),
+                singles,
+            ),
+        ]
+
+        print("MetaStore (shared connection, WAL, executemany)")
+        store = MetaStore(os.path.join(path, "bulk", "db.sqlite"))
+        store.create_database()
+        after = [
+            timed("populate", store.populate_database, items),
+            timed(
+                f"mark {len(embedded)} embedded",
+                store.update_embedded_value_by_key,
+                embedded,
+            ),
+            timed(f"delete {len(deleted)}", store.delete_items_by_key, deleted),
+            timed(
+                f"{len(singles)} single-key updates",
+                one_call_per_key,
+                store.update_embedded_value_by_key,
+                singles,
+            ),
+        ]
+        store.close()
+
+        for label, a, b in zip(
+            ["populate", "embedded", "delete", "single-key"], before, after
+        ):
+            print(f"{label:<10} speedup x{a / b:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark serial vs bulk parent resolution against a stub Zotero client.
+
+The stub sleeps for a fixed latency on every request to mimic a round-trip
+to the Zotero web API, so the numbers reflect the number of requests and how
+much of their latency overlaps.
+
+    uv run python scripts/bench_parent_resolution.py --items 4000 --latency 0.05
+"""
+
+import argparse
+import threading
+import time
+
+from zotgpt.zotero import ZoteroItem
+
+
+class StubZoteroClient:
+    def __init__(self, num_items: int, latency: float, items_per_parent: int):
+        self.latency = latency
+        # shared through the shallow copies made for concurrent requests
+        self.counter = {"requests": 0}
+        self._lock = threading.Lock()
+        self.parents = {}
+        self.attachments = []
+        for i in range(num_items):
+            parent_key = f"P{i // items_per_parent:07d}"
+            self.parents[parent_key] = {
+                "data": {
+                    "key": parent_key,
+                    "itemType": "journalArticle",
+                    "date": "2024",
+                    "title": f"Paper {parent_key}",
+                    "url": "",
+                    "abstractNote": "",
+                    "DOI": "",
+                    "creators": [{"firstName": "Ada", "lastName": "Lovelace"}],
+                    "tags": [{"tag": "stub"}],
+                    "collections": ["STUB"],
+                }
+            }
+            self.attachments.append({
+                "data": {
+                    "key": f"A{i:07d}",
+                    "parentItem": parent_key,
+                    "title": "Full Text PDF",
+                    "filename": f"{i}.pdf",
+                    "url": "",
+                    "accessDate": "",
+                    "dateAdded": "",
+                    "dateModified": "",
+                }
+            })
+
+    def _request(self):
+        with self._lock:
+            self.counter["requests"] += 1
+        time.sleep(self.latency)
+
+    def item(self, key):
+        self._request()
+        return self.parents[key]
+
+    def items(self, itemKey="", limit=None, **kwargs):
+        self._request()
+        return [self.parents[key] for key in itemKey.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--items-per-parent", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    zc = StubZoteroClient(args.items, args.latency, args.items_per_parent)
+
+    start_time = time.time()
+    serial = [ZoteroItem(zc, item) for item in zc.attachments]
+    serial_time = time.time() - start_time
+    serial_requests = zc.counter["requests"]
+    zc.counter["requests"] = 0
+
+    start_time = time.time()
+    bulk = ZoteroItem.from_items(
+        zc, zc.attachments, max_workers=args.max_workers
+    )
+    bulk_time = time.time() - start_time
+
+    if [x.get_title() for x in serial] != [x.get_title() for x in bulk]:
+        raise RuntimeError("bulk and serial construction disagree")
+    print(f"serial : {serial_time:.2f}s ({serial_requests} requests)")
+    print(f"bulk   : {bulk_time:.2f}s ({zc.counter['requests']} requests)")
+    print(f"speedup: {serial_time / bulk_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
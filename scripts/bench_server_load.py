@@ -0,0 +1,96 @@
+"""Load test the HTTP API with a stub LLM and an in-memory vector store.
+
+Every LLM call sleeps for --latency seconds, so with the async path the
+wall time for N concurrent questions stays close to a single call rather
+than growing with N.
+
+    uv run python scripts/bench_server_load.py --requests 50 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from zotgpt.retrieval import Retriever
+from zotgpt.server import create_app
+
+
+class StubChatModel(BaseChatModel):
+    latency: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _result(self) -> ChatResult:
+        message = AIMessage(content="stub answer")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+async def ask(client: httpx.AsyncClient, i: int) -> float:
+    start = time.perf_counter()
+    response = await client.post(
+        "/retrieve", json={"query": f"question {i}", "chat_history": []}
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(num_requests: int, latency: float) -> None:
+    vector_store = InMemoryVectorStore(DeterministicFakeEmbedding(size=256))
+    vector_store.add_documents([
+        Document(
+            page_content=f"chunk {i}",
+            metadata={"id": f"K{i}", "title": "", "source": "", "page": 0},
+        )
+        for i in range(1000)
+    ])
+    retriever = Retriever(vector_store, llm=StubChatModel(latency=latency))
+    app = create_app(retriever)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://zotgpt", timeout=600
+    ) as client:
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[
+            ask(client, i) for i in range(num_requests)
+        ])
+        elapsed = time.perf_counter() - start
+
+    print(f"requests      : {num_requests}")
+    print(f"llm latency   : {latency:.2f}s")
+    print(f"wall time     : {elapsed:.2f}s")
+    print(f"serial bound  : {num_requests * latency:.2f}s")
+    print(f"p50 latency   : {statistics.median(latencies):.2f}s")
+    print(f"max latency   : {max(latencies):.2f}s")
+    print(f"throughput    : {num_requests / elapsed:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.latency))
+
+
+if __name__ == "__main__":
+    main()
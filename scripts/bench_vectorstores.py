@@ -0,0 +1,143 @@
+"""Compare the local memory-mapped store with Chroma on synthetic vectors.
+
+Both stores are filled with the same random unit vectors and queried with
+the same vectors, bypassing the embedding model, so the numbers reflect
+index build, open and search cost only.
+
+    uv run python scripts/bench_vectorstores.py --chunks 100000 --dim 1536
+    uv run python scripts/bench_vectorstores.py --chunks 1000000 --dim 384 --skip-chroma
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.localstore import LocalVectorStore
+
+BATCH_SIZE = 5000
+
+
+def make_vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def batches(n: int):
+    for start in range(0, n, BATCH_SIZE):
+        yield start, min(start + BATCH_SIZE, n)
+
+
+def fill_local(path, embeddings, vectors, dtype):
+    store = LocalVectorStore(embeddings, path, dtype=dtype)
+    for start, end in batches(len(vectors)):
+        store.add_embeddings(
+            [(f"chunk {i}", vectors[i].tolist()) for i in range(start, end)],
+            metadatas=[{"id": f"K{i // 20}"} for i in range(start, end)],
+        )
+
+
+def fill_chroma(path, embeddings, vectors):
+    store = Chroma(
+        collection_name="bench",
+        embedding_function=embeddings,
+        persist_directory=path,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+    for start, end in batches(len(vectors)):
+        store._collection.add(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            metadatas=[{"id": f"K{i // 20}"} for i in range(start, end)],
+            documents=[f"chunk {i}" for i in range(start, end)],
+        )
+
+
+def time_queries(store, queries, k, where=None) -> list[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_by_vector(query.tolist(), k=k, filter=where)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, build, open_time, latencies, filtered) -> None:
+    p50 = statistics.median(latencies) * 1000
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000
+    print(
+        f"{name:<16} build {build:8.1f}s  open {open_time * 1000:8.1f}ms  "
+        f"p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  "
+        f"filtered p50 {statistics.median(filtered) * 1000:7.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument(
+        "--dtypes", nargs="+", default=["float32", "float16", "int8"]
+    )
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(rng, args.chunks, args.dim)
+    queries = make_vectors(rng, args.queries, args.dim)
+    embeddings = DeterministicFakeEmbedding(size=args.dim)
+    where = {"id": {"$in": [f"K{i}" for i in range(0, 200, 10)]}}
+    print(f"chunks={args.chunks} dim={args.dim} k={args.k}")
+
+    for dtype in args.dtypes:
+        with tempfile.TemporaryDirectory() as path:
+            start = time.perf_counter()
+            fill_local(path, embeddings, vectors, dtype)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = LocalVectorStore(embeddings, path)
+            open_time = time.perf_counter() - start
+
+            report(
+                f"local/{dtype}",
+                build,
+                open_time,
+                time_queries(store, queries, args.k),
+                time_queries(store, queries, args.k, where),
+            )
+
+    if args.skip_chroma:
+        return
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        fill_chroma(path, embeddings, vectors)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = Chroma(
+            collection_name="bench",
+            embedding_function=embeddings,
+            persist_directory=path,
+        )
+        # Chroma loads the HNSW index lazily, on the first query
+        time_queries(store, queries[:1], args.k)
+        open_time = time.perf_counter() - start
+
+        report(
+            "chroma",
+            build,
+            open_time,
+            time_queries(store, queries, args.k),
+            time_queries(store, queries, args.k, where),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+
+from dotenv import load_dotenv
+
+from zotgpt.embed import EmbeddingsFactory
+from zotgpt.ingest import IngestPipeline
+from zotgpt.lexical import BM25Index
+from zotgpt.metastore import MetaStore
+from zotgpt.vectorstore import VectorStoreFactory, store_options_from_env
+from zotgpt.zotero import ZoteroWrapper, make_zotero_client
+
+
+def main():
+    load_dotenv()
+
+    dimensions = os.getenv("EMBEDDINGS_DIMENSIONS")
+    ef = EmbeddingsFactory(
+        embeddings_type=os.environ["EMBEDDINGS_TYPE"],
+        embeddings_model=os.environ["EMBEDDINGS_MODEL"],
+        cache_path=os.getenv("EMBEDDINGS_CACHE_PATH"),
+        dimensions=int(dimensions) if dimensions else None,
+    )
+    embeddings = ef.create()
+
+    vsf = VectorStoreFactory(
+        embeddings=embeddings,
+        store_type=os.environ["VECTOR_STORE_TYPE"],
+        collection_name=os.environ["VECTOR_STORE_INDEX"],
+        persist_directory=os.getenv("VECTOR_STORE_DIRECTORY"),
+        store_options=store_options_from_env(),
+    )
+    vs = vsf.create()
+
+    db = MetaStore(os.environ["ZOTERO_APP_SQLITE"])
+    zot = ZoteroWrapper(make_zotero_client())
+
+    lexical_index_path = os.getenv("LEXICAL_INDEX_PATH")
+    lexical_index = (
+        BM25Index(lexical_index_path) if lexical_index_path else None
+    )
+
+    pipeline = IngestPipeline(
+        zot, embeddings, vs, metastore=db, lexical_index=lexical_index
+    )
+    if lexical_index is not None:
+        pipeline.backfill_lexical_index()
+    pipeline.run(os.environ["ZOTERO_DEFAULT_COLLECTION"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,69 @@
+import argparse
 import os
 import time
 
 from dotenv import load_dotenv
 
+from zotgpt.embed import EmbeddingsFactory
+from zotgpt.lexical import BM25Index
 from zotgpt.metastore import MetaStore
-from zotgpt.zotero import (
-    ZoteroItem,
-    ZoteroWrapper,
-    make_zotero_client,
-)
+from zotgpt.sync import sync_library
+from zotgpt.vectorstore import VectorStoreFactory, store_options_from_env
+from zotgpt.zotero import ZoteroWrapper, make_zotero_client
+
+
+def load_vector_store():
+    """The ingest vector store, so deleted items are removed from it too."""
+    if not os.getenv("VECTOR_STORE_TYPE"):
+        return None
+    dimensions = os.getenv("EMBEDDINGS_DIMENSIONS")
+    embeddings = EmbeddingsFactory(
+        embeddings_type=os.environ["EMBEDDINGS_TYPE"],
+        embeddings_model=os.environ["EMBEDDINGS_MODEL"],
+        dimensions=int(dimensions) if dimensions else None,
+    ).create()
+    return VectorStoreFactory(
+        embeddings=embeddings,
+        store_type=os.environ["VECTOR_STORE_TYPE"],
+        collection_name=os.environ["VECTOR_STORE_INDEX"],
+        persist_directory=os.getenv("VECTOR_STORE_DIRECTORY"),
+        store_options=store_options_from_env(),
+    ).create()
 
 
 def main():
     load_dotenv()
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="drop the database and reload every item from Zotero",
+    )
+    args = parser.parse_args()
+
     db_path = os.environ["ZOTERO_APP_SQLITE"]
     db = MetaStore(db_path)
-    db.delete_database_and_folder()
-    db.create_database()
 
     collection_key = os.environ["ZOTERO_DEFAULT_COLLECTION"]
     zc = make_zotero_client()
     zot = ZoteroWrapper(zc)
 
-    start_time = time.time()
-    pdf_items = zot.get_pdf_items_from_collection_key(collection_key)
-    print(f"Time to get items: {time.time() - start_time:.2f} seconds")
+    lexical_index_path = os.getenv("LEXICAL_INDEX_PATH")
+    lexical_index = (
+        BM25Index(lexical_index_path) if lexical_index_path else None
+    )
 
     start_time = time.time()
-    pdf_zot_items = [ZoteroItem(zc, item) for item in pdf_items]
-    print(f"Time to get item parents: {time.time() - start_time:.2f} seconds")
-
-    db.populate_database(pdf_zot_items)
+    sync_library(
+        zot,
+        db,
+        collection_key,
+        full=args.full,
+        vector_store=load_vector_store(),
+        lexical_index=lexical_index,
+    )
+    print(f"Time to sync library: {time.time() - start_time:.2f} seconds")
 
 
 if __name__ == "__main__":
@@ -12,7 +12,7 @@ if __name__ == "__main__":
     # Load all items with a pdf from the collection
     pdf_items = zot.get_pdf_items_from_collection_key(collection_key)
     # Turn the items into ZoteroItem objects
-    pdf_zot_items = [ZoteroItem(zc, item) for item in pdf_items]
+    pdf_zot_items = ZoteroItem.from_items(zc, pdf_items)
     # Get the first ZoteroItem
     zot_item = pdf_zot_items[0]
     # Explore ZoteroItem
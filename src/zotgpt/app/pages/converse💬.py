@@ -3,21 +3,23 @@ import os
 import streamlit as st
 
 from zotgpt.app.utils import initialize
-from zotgpt.retrieval import Retriever, format_answer
+from zotgpt.history import ChatHistory
+from zotgpt.retrieval import format_answer
 
 
 def converse():
     # Initialize embeddings and vector store only once
     initialize()
 
+    # Retriever is built once per process and shared across sessions
+    r = st.session_state["retriever"]
+
     # Initialize session state for chat history and components
     if "chat_answers_history" not in st.session_state:
         st.session_state["chat_answers_history"] = []
         st.session_state["user_prompt_history"] = []
-        st.session_state["chat_history"] = []
-
-    # Initialize retriever with stored vector store
-    r = Retriever(vector_store=st.session_state["vector_store"])
+        st.session_state["chat_history"] = ChatHistory(llm=r.llm)
+        st.session_state["rephrase_reasons"] = []
 
     # Display chat history
     for user_msg, ai_msg in zip(
@@ -37,19 +39,52 @@ def converse():
         with st.chat_message("user"):
             st.write(prompt)
 
-        # Generate and display assistant response
-        with st.chat_message("assistant"), st.spinner("Thinking..."):
-            response = r.retrieve(
-                query=prompt, chat_history=st.session_state["chat_history"]
+        # Stream the answer tokens, then list the retrieved references
+        context = []
+
+        def answer_tokens():
+            for chunk in r.stream(
+                query=prompt,
+                chat_history=st.session_state["chat_history"].messages(),
+            ):
+                if "rephrase" in chunk:
+                    st.session_state["rephrase_reasons"].append(
+                        chunk["rephrase"]["reason"]
+                    )
+                if "context" in chunk:
+                    context.extend(chunk["context"])
+                if "answer" in chunk:
+                    yield chunk["answer"]
+
+        with st.chat_message("assistant"):
+            answer = st.write_stream(answer_tokens())
+            response = {"answer": answer, "context": context}
+            references = format_answer(
+                {"answer": "", "context": context}, wrap_text=False
             )
+            if references:
+                st.write(references)
             formatted_response = format_answer(response, wrap_text=False)
-            st.write(formatted_response)
 
         # Update session state
         st.session_state["user_prompt_history"].append(prompt)
         st.session_state["chat_answers_history"].append(formatted_response)
-        st.session_state["chat_history"].append(("human", prompt))
-        st.session_state["chat_history"].append(("ai", response["answer"]))
+        st.session_state["chat_history"].add_turn(prompt, response["answer"])
+
+    # Show how often query embeddings were served from the shared cache
+    query_cache = st.session_state["embeddings"].stats
+    st.sidebar.caption(
+        f"Query cache: {query_cache['hits']} hits / "
+        f"{query_cache['misses']} misses "
+        f"({query_cache['hit_rate']:.0%} hit rate)"
+    )
+
+    # Show how many rephrase LLM calls this conversation avoided
+    reasons = st.session_state["rephrase_reasons"]
+    st.sidebar.caption(
+        f"Rephrase LLM calls saved: {len(reasons) - reasons.count('llm')} "
+        f"of {len(reasons)} turns"
+    )
 
     # Add a footer
     st.markdown("---")
@@ -1,13 +1,45 @@
+import math
+import os
+from typing import Optional
+
 import pandas as pd
 import streamlit as st
 
 from zotgpt.app.utils import initialize
 
+PAGE_SIZE = 200
+COLUMNS = ["key", "embedded", "title", "tags"]
+
+# Embedded flags change during ingestion without a new library version, so
+# cached pages also expire after this many seconds
+CACHE_TTL = 60
+
+
+def library_version() -> Optional[int]:
+    collection_key = os.getenv("ZOTERO_DEFAULT_COLLECTION")
+    if not collection_key:
+        return None
+    return st.session_state["metastore"].get_library_version(collection_key)
 
-@st.cache_data
-def load_data():
+
+# The database path and library version are part of the cache key, so a
+# sync invalidates the cached results and other databases never share them
+@st.cache_data(ttl=CACHE_TTL)
+def count_items(db_path: str, version: Optional[int], search: str) -> int:
     db = st.session_state["metastore"]
-    return db.read_database()
+    return db.count(search=search)
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_page(
+    db_path: str, version: Optional[int], search: str, page: int
+) -> pd.DataFrame:
+    # Only the displayed columns of one page are read from the database
+    db = st.session_state["metastore"]
+    rows = db.query(
+        COLUMNS, search=search, limit=PAGE_SIZE, offset=page * PAGE_SIZE
+    )
+    return pd.DataFrame(rows, columns=COLUMNS)
 
 
 def dataframe_with_selections(
@@ -32,36 +64,29 @@ def dataframe_with_selections(
     return selected_rows.drop("Select", axis=1)
 
 
-def filter_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    st.write("Filter the dataframe by entering text in the box below.")
-    filter_text = st.text_input(
-        "Filter Dataframe", label_visibility="collapsed"
-    )
+def filtered_page() -> pd.DataFrame:
+    st.write("Filter the library by entering text in the box below.")
+    filter_text = st.text_input("Filter Library", label_visibility="collapsed")
+    db_path = st.session_state["metastore"].db_path
+    version = library_version()
+    total = count_items(db_path, version, filter_text)
     if filter_text:
-        df = df[
-            df.apply(
-                lambda row: row.astype(str)
-                .str.contains(filter_text, case=False)
-                .any(),
-                axis=1,
-            )
-        ]
-        st.write(f"Filtered {len(df)} rows.")
-    return df
+        st.write(f"Filtered {total} rows.")
+    pages = max(1, math.ceil(total / PAGE_SIZE))
+    page = (
+        st.number_input(f"Page (of {pages})", 1, pages, 1) if pages > 1 else 1
+    )
+    return load_page(db_path, version, filter_text, page - 1)
 
 
 def library():
     initialize()
-    df = load_data()
-
-    selected_columns = ["key", "embedded", "title", "tags"]
-    df_show = df[selected_columns].copy()
 
     col1, col2, col3 = st.columns([16, 1, 6])
     with col1:
-        current_selection = dataframe_with_selections(
-            filter_dataframe(df_show)
-        )["key"].tolist()
+        current_selection = dataframe_with_selections(filtered_page())[
+            "key"
+        ].tolist()
 
     with col3:
         st.write(f"{len(current_selection)} Candidate Items")
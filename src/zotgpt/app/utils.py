@@ -1,38 +1,137 @@
 import os
+from typing import Optional
 
 import streamlit as st
 from dotenv import load_dotenv
 
 from zotgpt.embed import EmbeddingsFactory
+from zotgpt.embedcache import QueryCachedEmbeddings
+from zotgpt.lexical import BM25Index
 from zotgpt.metastore import MetaStore
-from zotgpt.vectorstore import VectorStoreFactory
+from zotgpt.rerank import CrossEncoderReranker
+from zotgpt.retrieval import Retriever
+from zotgpt.vectorstore import VectorStoreFactory, store_options_from_env
 from zotgpt.zotero import ZoteroWrapper, make_zotero_client
 
 load_dotenv()
 
 
+def embeddings_dimensions() -> Optional[int]:
+    # Shortened Matryoshka embeddings; must match what was ingested
+    dimensions = os.getenv("EMBEDDINGS_DIMENSIONS")
+    return int(dimensions) if dimensions else None
+
+
+@st.cache_resource
+def load_embeddings(
+    embeddings_type: str,
+    embeddings_model: str,
+    cache_path: str,
+    dimensions: Optional[int] = None,
+) -> QueryCachedEmbeddings:
+    # Shared by every session so repeated questions hit the same query cache
+    ef = EmbeddingsFactory(
+        embeddings_type=embeddings_type,
+        embeddings_model=embeddings_model,
+        cache_path=cache_path,
+        dimensions=dimensions,
+    )
+    return QueryCachedEmbeddings(
+        ef.create(),
+        max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("QUERY_CACHE_TTL", "3600")),
+    )
+
+
 def initialize_embeddings():
     if "embeddings" not in st.session_state:
-        ef = EmbeddingsFactory(
-            embeddings_type=os.environ["EMBEDDINGS_TYPE"],
-            embeddings_model=os.environ["EMBEDDINGS_MODEL"],
+        st.session_state["embeddings"] = load_embeddings(
+            os.environ["EMBEDDINGS_TYPE"],
+            os.environ["EMBEDDINGS_MODEL"],
+            os.getenv("EMBEDDINGS_CACHE_PATH"),
+            embeddings_dimensions(),
         )
-        st.session_state["embeddings"] = ef.create()
+
+
+@st.cache_resource
+def load_vector_store(
+    store_type: str,
+    collection_name: str,
+    persist_directory: str,
+    _embeddings,
+    store_options: Optional[dict] = None,
+):
+    vsf = VectorStoreFactory(
+        embeddings=_embeddings,
+        store_type=store_type,
+        collection_name=collection_name,
+        persist_directory=persist_directory,
+        store_options=store_options,
+    )
+    return vsf.create()
+
+
+@st.cache_resource
+def load_lexical_index(path: str) -> BM25Index:
+    return BM25Index(path)
+
+
+@st.cache_resource
+def load_reranker(model_name: str) -> CrossEncoderReranker:
+    return CrossEncoderReranker(
+        model_name,
+        top_n=int(os.getenv("RERANK_TOP_N", "50")),
+        latency_budget=float(os.getenv("RERANK_BUDGET", "1.0")),
+    )
+
+
+@st.cache_resource
+def load_retriever(
+    _vector_store, _lexical_index=None, _reranker=None
+) -> Retriever:
+    # Built once per process: prompts, LLM client and chains are reused
+    return Retriever(
+        vector_store=_vector_store,
+        lexical_index=_lexical_index,
+        reranker=_reranker,
+    )
+
+
+@st.cache_resource
+def load_metastore(db_path: str) -> MetaStore:
+    # One MetaStore, and so one SQLite connection, shared by every session
+    return MetaStore(db_path)
 
 
 def initialize_vector_store():
     if "vector_store" not in st.session_state:
-        vsf = VectorStoreFactory(
-            embeddings=st.session_state["embeddings"],
-            store_type=os.environ["VECTOR_STORE_TYPE"],
-            collection_name=os.environ["VECTOR_STORE_INDEX"],
+        st.session_state["vector_store"] = load_vector_store(
+            os.environ["VECTOR_STORE_TYPE"],
+            os.environ["VECTOR_STORE_INDEX"],
+            os.getenv("VECTOR_STORE_DIRECTORY"),
+            _embeddings=st.session_state["embeddings"],
+            store_options=store_options_from_env(),
+        )
+
+
+def initialize_retriever():
+    if "retriever" not in st.session_state:
+        # Hybrid (BM25 + vector) retrieval when a lexical index is configured
+        lexical_index_path = os.getenv("LEXICAL_INDEX_PATH")
+        st.session_state["retriever"] = load_retriever(
+            st.session_state["vector_store"],
+            load_lexical_index(lexical_index_path)
+            if lexical_index_path
+            else None,
+            load_reranker(os.environ["RERANK_MODEL"])
+            if os.getenv("RERANK_MODEL")
+            else None,
         )
-        st.session_state["vector_store"] = vsf.create()
 
 
 def initialize_metastore():
     if "metastore" not in st.session_state:
-        st.session_state["metastore"] = MetaStore(
+        st.session_state["metastore"] = load_metastore(
             os.environ["ZOTERO_APP_SQLITE"]
         )
 
@@ -67,6 +166,7 @@ def initialize():
     initialize_page_config()
     initialize_embeddings()
     initialize_vector_store()
+    initialize_retriever()
     initialize_metastore()
     initialize_zotero_client()
     initialize_zotero_wrapper()
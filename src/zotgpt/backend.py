@@ -1,6 +1,16 @@
+import multiprocessing as mp
+import time
+from collections.abc import Iterable, Iterator
+from multiprocessing.connection import wait
+from typing import Optional
+
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+# Yielded by a paths iterable that has nothing ready yet, so load_documents
+# collects finished workers and checks timeouts instead of blocking on it
+PENDING = object()
+
 
 def load_document(path, chunk_size=1000, chunk_overlap=200, metadata=None):
     loader = PyPDFLoader(path)
@@ -18,3 +28,135 @@ def load_document(path, chunk_size=1000, chunk_overlap=200, metadata=None):
             doc.metadata.update(metadata)
 
     return documents_splitted
+
+
+def _load_document_worker(conn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        try:
+            conn.send((load_document(*task), None))
+        except Exception as e:
+            conn.send((None, repr(e)))
+    conn.close()
+
+
+def _get_context():
+    # forkserver forks workers from a clean, preloaded server process, which
+    # is both cheap and safe to use from a threaded parent
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return mp.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_load_document_worker, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.path = None
+        self.started = None
+
+    def submit(self, path, task):
+        self.path = path
+        self.started = time.monotonic()
+        self.conn.send(task)
+
+    def result(self):
+        try:
+            return self.conn.recv()
+        except EOFError:
+            self.kill()
+            return None, f"worker exited with code {self.process.exitcode}"
+
+    def close(self):
+        self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def load_documents(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = 300,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    metadatas: Optional[dict] = None,
+) -> Iterator[tuple]:
+    """Load and split many PDFs in a pool of worker processes.
+
+    Yields ``(path, documents, error)`` in completion order, where exactly
+    one of ``documents``/``error`` is set. A worker that crashes or exceeds
+    ``timeout`` on a file is killed and replaced, failing only that file.
+    ``paths`` is consumed lazily (it may yield ``PENDING`` when no path is
+    ready yet) and ``metadatas`` maps a path to its metadata, looked up
+    when the path is submitted.
+    """
+    workers = workers or mp.cpu_count()
+    metadatas = metadatas if metadatas is not None else {}
+    ctx = _get_context()
+    paths = iter(paths)
+    idle = []
+    busy = {}
+    exhausted = False
+
+    try:
+        while busy or not exhausted:
+            pending = False
+            while not exhausted and len(busy) < workers:
+                path = next(paths, None)
+                if path is None:
+                    exhausted = True
+                    break
+                if path is PENDING:
+                    pending = True
+                    break
+                worker = idle.pop() if idle else _Worker(ctx)
+                worker.submit(
+                    path, (path, chunk_size, chunk_overlap, metadatas.get(path))
+                )
+                busy[worker.conn] = worker
+
+            # A connection becomes ready on a result or when its worker dies.
+            # While the source is pending, only poll so it is asked again
+            poll = 0 if pending else 1.0
+            for conn in wait(list(busy), timeout=poll) if busy else []:
+                worker = busy.pop(conn)
+                documents, error = worker.result()
+                if error is None or worker.process.is_alive():
+                    idle.append(worker)
+                yield worker.path, documents, error
+
+            for worker in _expired(busy, timeout):
+                yield worker.path, None, f"timed out after {timeout}s"
+    finally:
+        for worker in idle:
+            worker.close()
+        for worker in busy.values():
+            worker.kill()
+
+
+def _expired(busy, timeout):
+    if timeout is None:
+        return []
+    now = time.monotonic()
+    expired = [
+        conn for conn, worker in busy.items() if now - worker.started > timeout
+    ]
+    for conn in expired:
+        busy[conn].kill()
+    return [busy.pop(conn) for conn in expired]
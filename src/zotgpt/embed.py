@@ -1,20 +1,45 @@
-"""Module for managing different embedding models (OpenAI and Cohere)."""
+"""Module for managing different embedding models (OpenAI, Cohere and local)."""
 
+import dataclasses
 import os
+from typing import Optional
 
 from dotenv import load_dotenv
 from langchain.embeddings.base import Embeddings
 from langchain_cohere import CohereEmbeddings
 from langchain_openai import OpenAIEmbeddings
 
+from zotgpt.embedbatch import BatchedEmbeddings
+from zotgpt.embedcache import CachedEmbeddings
+from zotgpt.localembed import LocalEmbeddings
+from zotgpt.registry import get_embeddings_spec, resolve_dimension
+
 
 class EmbeddingsFactory:
     """Factory class for creating embedding model instances."""
 
-    def __init__(self, embeddings_type: str, embeddings_model: str) -> None:
-        """Initialize factory with embeddings type and model."""
+    def __init__(
+        self,
+        embeddings_type: str,
+        embeddings_model: str,
+        cache_path: Optional[str] = None,
+        cache_max_bytes: int = 1 << 30,
+        batch_options: Optional[dict] = None,
+        dimensions: Optional[int] = None,
+    ) -> None:
+        """Initialize factory with embeddings type, model and optional cache.
+
+        ``batch_options`` override the BatchedEmbeddings settings, e.g.
+        ``max_concurrency`` or ``target_latency``. ``dimensions`` asks a
+        Matryoshka model (``text-embedding-3-*``) for shorter embeddings.
+        """
         self.embeddings_type = embeddings_type
         self.embeddings_model = embeddings_model
+        self.cache_path = cache_path
+        self.cache_max_bytes = cache_max_bytes
+        self.batch_options = batch_options or {}
+        self.dimensions = dimensions
+        self._dimension: Optional[int] = None
         # Validate inputs immediately to fail fast
         self.validate_inputs()
 
@@ -23,56 +48,82 @@ class EmbeddingsFactory:
         return self.create()
 
     def validate_inputs(self) -> None:
-        """Validate embeddings type and model."""
+        """Validate embeddings type and model against the registry."""
         load_dotenv()
-        valid_embeddings_types = ["openai", "cohere"]
-        valid_embeddings_models = {
-            "openai": ["text-embedding-ada-002", "text-embedding-3-small"],
-            "cohere": ["embed-english-v3.0", "embed-english-light-v3.0"],
-        }
-
-        if self.embeddings_type not in valid_embeddings_types:
-            raise ValueError(
-                f"embeddings_type must be one of {valid_embeddings_types}"
-            )
-
-        if (
-            self.embeddings_model
-            not in valid_embeddings_models[self.embeddings_type]
-        ):
-            raise ValueError(
-                f"Invalid model for {self.embeddings_type} embeddings. "
-                f"Must be one of: {valid_embeddings_models[self.embeddings_type]}"
+        self.spec = get_embeddings_spec(
+            self.embeddings_type, self.embeddings_model
+        )
+        if self.dimensions is not None:
+            if not self.spec.matryoshka:
+                raise ValueError(
+                    f"{self.spec.key} does not support shortened embeddings"
+                )
+            if not 0 < self.dimensions <= (self.spec.dimension or 0):
+                raise ValueError(
+                    f"dimensions must be between 1 and {self.spec.dimension}"
+                )
+            self.spec = dataclasses.replace(
+                self.spec, dimension=self.dimensions
             )
 
         # Check for required environment variables
         required_env_var = f"{self.embeddings_type.upper()}_API_KEY"
-        if not os.getenv(required_env_var):
+        if self.spec.requires_api_key and not os.getenv(required_env_var):
             raise ValueError(
                 f"Missing required environment variable: {required_env_var}"
             )
 
     @property
     def dimension(self) -> int:
-        """Return the dimension of the embeddings based on the model."""
-        dimensions = {
-            "openai": {
-                "text-embedding-ada-002": 1536,
-                "text-embedding-3-small": 1536,
-            },
-            "cohere": {
-                "embed-english-v3.0": 1024,
-                "embed-english-light-v3.0": 1024,
-            },
-        }
-        return dimensions[self.embeddings_type][self.embeddings_model]
+        """Return the declared dimension, measured once if undeclared."""
+        if self._dimension is None:
+            self._dimension = self.spec.dimension or resolve_dimension(
+                self.spec, self.create_provider()
+            )
+        return self._dimension
 
     def create(self) -> Embeddings:
+        """Create batched embeddings, cached locally if configured."""
+        embeddings = self.create_provider()
+        # Local models batch internally and gain nothing from request
+        # concurrency or rate-limit handling
+        if self.embeddings_type != "local":
+            embeddings = BatchedEmbeddings(
+                embeddings,
+                spec=self.spec,
+                **{
+                    "max_batch_size": self.spec.max_batch_size,
+                    "max_batch_tokens": self.spec.max_batch_tokens,
+                    "max_input_tokens": self.spec.max_input_tokens,
+                    **self.batch_options,
+                },
+            )
+        if self.cache_path:
+            # Shortened embeddings must not share cache entries with full ones
+            model = self.embeddings_model
+            if self.dimensions is not None:
+                model = f"{model}:{self.dimensions}"
+            return CachedEmbeddings(
+                embeddings,
+                provider=self.embeddings_type,
+                model=model,
+                cache_path=self.cache_path,
+                max_bytes=self.cache_max_bytes,
+            )
+        return embeddings
+
+    def create_provider(self) -> Embeddings:
         """Create and return the appropriate embeddings instance."""
         if self.embeddings_type == "openai":
+            # Batching and retries (of queries too) are handled by
+            # BatchedEmbeddings, which needs to see rate limits rather than
+            # have them retried here
             return OpenAIEmbeddings(
                 openai_api_key=os.getenv("OPENAI_API_KEY"),
                 model=self.embeddings_model,
+                dimensions=self.dimensions,
+                chunk_size=self.spec.max_batch_size,
+                max_retries=0,
             )
 
         elif self.embeddings_type == "cohere":
@@ -81,4 +132,13 @@ class EmbeddingsFactory:
                 model=self.embeddings_model,
             )
 
+        elif self.embeddings_type == "local":
+            num_threads = os.getenv("EMBEDDINGS_NUM_THREADS")
+            return LocalEmbeddings(
+                model_name=self.embeddings_model,
+                batch_size=int(os.getenv("EMBEDDINGS_BATCH_SIZE", "64")),
+                num_threads=int(num_threads) if num_threads else None,
+                backend=os.getenv("EMBEDDINGS_BACKEND", "torch"),
+            )
+
         raise ValueError(f"Unsupported embeddings type: {self.embeddings_type}")
@@ -0,0 +1,298 @@
+"""Module for bulk embedding with token-bounded batches and AIMD concurrency.
+
+Texts are packed into batches bounded by both item count and token count,
+and several batches are sent at once. The number of concurrent requests is
+an additive-increase / multiplicative-decrease window: it grows by one per
+window of fast successes and is cut on rate limits (HTTP 429) or slow
+responses, so bulk jobs settle just under the provider's quota.
+"""
+
+import random
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Optional, TypeVar
+
+from langchain.embeddings.base import Embeddings
+
+from zotgpt.registry import EmbeddingsSpec, resolve_dimension
+from zotgpt.tokens import count_tokens, truncate_tokens
+
+T = TypeVar("T")
+
+RATE_LIMIT_ERRORS = {"RateLimitError", "TooManyRequestsError"}
+TRANSIENT_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "InternalServerError",
+    "ServiceUnavailableError",
+}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return (
+        _status_code(error) == 429
+        or type(error).__name__ in RATE_LIMIT_ERRORS
+        or "rate limit" in str(error).lower()
+    )
+
+
+def is_transient(error: Exception) -> bool:
+    status = _status_code(error)
+    return (
+        is_rate_limit(error)
+        or (status is not None and status >= 500)
+        or isinstance(error, (TimeoutError, ConnectionError))
+        or type(error).__name__ in TRANSIENT_ERRORS
+    )
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def pack_batches(
+    sizes: list[int], max_batch_size: int, max_batch_tokens: int
+) -> list[list[int]]:
+    """Group text indices into consecutive batches within both limits.
+
+    ``sizes`` holds the token count of each text.
+    """
+    batches, batch, tokens = [], [], 0
+    for i, size in enumerate(sizes):
+        if batch and (
+            len(batch) >= max_batch_size or tokens + size > max_batch_tokens
+        ):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(i)
+        tokens += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class AdaptiveLimiter:
+    """Concurrency window adjusted by AIMD on throttling and latency."""
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: Optional[float],
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(
+        self, latency: Optional[float] = None, throttled: bool = False
+    ) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif (
+                latency is not None
+                and self.target_latency is not None
+                and latency > self.target_latency
+            ):
+                self.limit = max(self.minimum, self.limit * 0.75)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that embeds documents in concurrent batches.
+
+    Failed batches are retried with exponential backoff (honouring
+    ``Retry-After``) when the error is transient; so are queries, up to
+    ``query_retries`` times since a user is waiting. Texts longer than
+    ``max_input_tokens`` are truncated rather than failing their batch;
+    the count is approximate for models without a tiktoken encoding, so
+    set the limit with some margin. If a batch still fails,
+    no new batches are started, the running ones finish and the error is
+    raised; ``on_batch`` has been called for every completed batch, which
+    is how CachedEmbeddings persists progress so a rerun resumes.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = 512,
+        max_batch_tokens: int = 100_000,
+        max_concurrency: int = 8,
+        initial_concurrency: int = 2,
+        target_latency: Optional[float] = 30.0,
+        max_retries: int = 6,
+        query_retries: int = 2,
+        backoff: float = 1.0,
+        max_input_tokens: Optional[int] = None,
+        spec: Optional[EmbeddingsSpec] = None,
+    ) -> None:
+        """Initialize executor around an embeddings instance.
+
+        ``spec`` is the registry entry of the wrapped model, used for its
+        dimension and to estimate the cost of what was embedded.
+        """
+        self.embeddings = embeddings
+        self.spec = spec
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.query_retries = query_retries
+        self.backoff = backoff
+        self.max_input_tokens = max_input_tokens
+        self.limiter = AdaptiveLimiter(
+            initial=min(initial_concurrency, max_concurrency),
+            minimum=1,
+            maximum=max_concurrency,
+            target_latency=target_latency,
+        )
+        self.stats = {
+            "batches": 0,
+            "retries": 0,
+            "throttled": 0,
+            "tokens": 0,
+            "truncated": 0,
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        if self.spec is not None:
+            return resolve_dimension(self.spec, self.embeddings)
+        return getattr(self.embeddings, "dimension", None)
+
+    @property
+    def estimated_cost(self) -> float:
+        """Estimated spend in USD for the tokens embedded so far."""
+        if self.spec is None:
+            return 0.0
+        return self.stats["tokens"] / 1e6 * self.spec.cost_per_million_tokens
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+
+    def _retry(
+        self,
+        call: Callable[[], T],
+        max_retries: int,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ) -> T:
+        """Run ``call``, backing off and retrying on transient errors."""
+        for attempt in range(max_retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            start = time.perf_counter()
+            try:
+                result = call()
+            except Exception as e:
+                throttled = is_rate_limit(e)
+                if limiter is not None:
+                    limiter.release(throttled=throttled)
+                if not is_transient(e) or attempt == max_retries:
+                    raise
+                self._count("throttled" if throttled else "retries")
+                delay = _retry_after(e) or self.backoff * 2**attempt
+                time.sleep(delay * (1 + random.random() / 4))  # noqa: S311
+                continue
+            if limiter is not None:
+                limiter.release(latency=time.perf_counter() - start)
+            return result
+        raise AssertionError("unreachable")
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._retry(
+            lambda: self.embeddings.embed_documents(texts),
+            self.max_retries,
+            limiter=self.limiter,
+        )
+        self._count("batches")
+        return vectors
+
+    def _truncate(self, texts: list[str], sizes: list[int]) -> list[str]:
+        """Cut texts over ``max_input_tokens``, updating their ``sizes``."""
+        inputs = list(texts)
+        if not self.max_input_tokens:
+            return inputs
+        for i, size in enumerate(sizes):
+            if size > self.max_input_tokens:
+                inputs[i] = truncate_tokens(texts[i], self.max_input_tokens)
+                sizes[i] = self.max_input_tokens
+                self._count("truncated")
+        return inputs
+
+    def embed_documents(
+        self,
+        texts: list[str],
+        on_batch: Optional[
+            Callable[[list[str], list[list[float]]], None]
+        ] = None,
+    ) -> list[list[float]]:
+        """Embed documents; ``on_batch`` receives each completed batch.
+
+        ``on_batch`` gets the texts as they were passed, even if truncated.
+        """
+        sizes = [count_tokens(text) for text in texts]
+        inputs = self._truncate(texts, sizes)
+        batches = pack_batches(
+            sizes, self.max_batch_size, self.max_batch_tokens
+        )
+        vectors: list[Optional[list[float]]] = [None] * len(texts)
+
+        def run(indices: list[int]) -> None:
+            batch = [texts[i] for i in indices]
+            result = self._embed_batch([inputs[i] for i in indices])
+            self._count("tokens", sum(sizes[i] for i in indices))
+            for i, vector in zip(indices, result):
+                vectors[i] = vector
+            if on_batch is not None:
+                on_batch(batch, result)
+
+        if len(batches) == 1:
+            run(batches[0])
+            return vectors
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = [pool.submit(run, indices) for indices in batches]
+            _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled() and future.exception():
+                    raise future.exception()
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, retried but not queued behind bulk batches."""
+        if self.max_input_tokens:
+            text = truncate_tokens(text, self.max_input_tokens)
+        return self._retry(
+            lambda: self.embeddings.embed_query(text), self.query_retries
+        )
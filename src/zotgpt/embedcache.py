@@ -0,0 +1,264 @@
+"""Module for caching embeddings so unchanged text is never embedded twice."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from langchain.embeddings.base import Embeddings
+
+from zotgpt.embedbatch import BatchedEmbeddings
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK_SIZE = 500
+
+
+def text_hash(text: str) -> str:
+    """Return the sha256 hex digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by a local SQLite content-hash cache.
+
+    Document vectors are keyed by (provider, model, sha256 of the text) and
+    the least recently used entries are evicted once the stored vectors
+    exceed ``max_bytes``. Queries are passed through uncached.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        provider: str,
+        model: str,
+        cache_path: str,
+        max_bytes: int = 1 << 30,
+    ) -> None:
+        """Initialize cache around an embeddings instance."""
+        self.embeddings = embeddings
+        self.provider = provider
+        self.model = model
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT,
+                model TEXT,
+                text_hash TEXT,
+                vector BLOB,
+                last_used REAL,
+                PRIMARY KEY (provider, model, text_hash)
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+            "ON embeddings (last_used)"
+        )
+        conn.commit()
+        return conn
+
+    def _lookup(self, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        for i in range(0, len(hashes), _LOOKUP_CHUNK_SIZE):
+            chunk = hashes[i : i + _LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"""
+                SELECT text_hash, vector FROM embeddings
+                WHERE provider = ? AND model = ?
+                AND text_hash IN ({placeholders})
+                """,  # noqa: S608
+                (self.provider, self.model, *chunk),
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                """
+                UPDATE embeddings SET last_used = ?
+                WHERE provider = ? AND model = ? AND text_hash = ?
+                """,
+                [(now, self.provider, self.model, key) for key in found],
+            )
+        return found
+
+    def _store(self, vectors: dict[str, list[float]]) -> None:
+        now = time.time()
+        rows = [
+            (self.provider, self.model, key, array("f", vector).tobytes(), now)
+            for key, vector in vectors.items()
+        ]
+        for row in rows:
+            # Another thread may have stored the same miss; its vector is
+            # equally valid and is already counted in the total
+            cursor = self._conn.execute(
+                """
+                INSERT OR IGNORE INTO embeddings
+                (provider, model, text_hash, vector, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                row,
+            )
+            if cursor.rowcount == 1:
+                self._total_bytes += len(row[3])
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        # Trim to 90% of the budget so eviction does not run on every insert
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            """
+            SELECT rowid, LENGTH(vector) FROM embeddings
+            ORDER BY last_used ASC
+            """
+        )
+        evict = []
+        for rowid, size in rows:
+            if self._total_bytes <= target:
+                break
+            evict.append((rowid,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", evict)
+        print(f"* Evicted {len(evict)} cached embeddings")
+
+    def _store_batch(
+        self, texts: list[str], vectors: list[list[float]]
+    ) -> None:
+        computed = {
+            text_hash(text): vector for text, vector in zip(texts, vectors)
+        }
+        with self._lock:
+            self._store(computed)
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, calling the provider only for unseen texts."""
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(set(hashes)))
+            self._conn.commit()
+
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        if missing:
+            if isinstance(self.embeddings, BatchedEmbeddings):
+                # Persist every finished batch, so an interrupted bulk job
+                # resumes from the cache instead of starting over
+                vectors = self.embeddings.embed_documents(
+                    list(missing.values()), on_batch=self._store_batch
+                )
+            else:
+                vectors = self.embeddings.embed_documents(
+                    list(missing.values())
+                )
+                self._store_batch(list(missing.values()), vectors)
+            cached.update(zip(missing.keys(), vectors))
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query through the wrapped embeddings."""
+        return self.embeddings.embed_query(text)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return getattr(self.embeddings, "dimension", None)
+
+    @property
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current cache size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an in-process LRU + TTL cache for queries.
+
+    Queries are matched after collapsing whitespace, so trivially re-typed
+    questions reuse the previous vector. Documents are passed through.
+    """
+
+    def __init__(
+        self, embeddings: Embeddings, max_size: int = 1024, ttl: float = 3600
+    ) -> None:
+        """Initialize cache around an embeddings instance."""
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Vectors are kept as tuples and handed out as new lists, so callers
+        # cannot modify the cached copy
+        self._cache: OrderedDict[str, tuple[float, tuple[float, ...]]] = (
+            OrderedDict()
+        )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents through the wrapped embeddings."""
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, reusing a cached vector while it is fresh."""
+        key = " ".join(text.split())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._cache[key] = (now, tuple(vector))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return getattr(self.embeddings, "dimension", None)
+
+    @property
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of cached queries."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._cache),
+        }
@@ -0,0 +1,89 @@
+"""Module for keeping chat history within a bounded token budget."""
+
+from typing import Optional
+
+from zotgpt.tokens import count_tokens, truncate_tokens
+
+SUMMARY_PROMPT = (
+    "Progressively summarize the lines of conversation provided, adding onto "
+    "the previous summary and returning a new summary. Keep the paper "
+    "titles, methods and findings that were discussed.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New lines of conversation:\n{lines}\n\n"
+    "New summary:"
+)
+
+
+class ChatHistory:
+    """Chat history that keeps per-turn prompt size flat.
+
+    The most recent turns are kept verbatim as long as there are at most
+    ``max_turns`` of them and they fit in ``token_budget`` together with the
+    summary. Older turns are folded into a running summary, which is only
+    updated with the turns being evicted, never recomputed from the full
+    conversation, and is cut to ``summary_budget`` tokens (a quarter of
+    ``token_budget`` by default) so that it cannot grow without bound.
+    """
+
+    def __init__(
+        self,
+        llm=None,
+        max_turns: int = 6,
+        token_budget: int = 2000,
+        summary_budget: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_budget = (
+            token_budget // 4 if summary_budget is None else summary_budget
+        )
+        self.turns: list[tuple[str, str]] = []
+        self.summary = ""
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def _tokens(self) -> int:
+        turns = sum(count_tokens(q) + count_tokens(a) for q, a in self.turns)
+        return turns + (count_tokens(self.summary) if self.summary else 0)
+
+    def add_turn(self, question: str, answer: str) -> None:
+        self.turns.append((question, answer))
+        while True:
+            evicted = []
+            while len(self.turns) > 1 and (
+                len(self.turns) > self.max_turns
+                or self._tokens() > self.token_budget
+            ):
+                evicted.append(self.turns.pop(0))
+            if not evicted:
+                return
+            # A longer summary can push the turns over budget again
+            self.summary = truncate_tokens(
+                self.summarize(evicted), self.summary_budget
+            )
+
+    def summarize(self, turns: list[tuple[str, str]]) -> str:
+        if self.llm is None:
+            return self.summary
+        lines = "\n".join(
+            f"Human: {question}\nAI: {answer}" for question, answer in turns
+        )
+        response = self.llm.invoke(
+            SUMMARY_PROMPT.format(summary=self.summary or "(none)", lines=lines)
+        )
+        return response.content
+
+    def messages(self) -> list[tuple[str, str]]:
+        """Return the history in the (role, content) form the chains take."""
+        messages = []
+        if self.summary:
+            messages.append((
+                "system",
+                f"Summary of the earlier conversation: {self.summary}",
+            ))
+        for question, answer in self.turns:
+            messages.append(("human", question))
+            messages.append(("ai", answer))
+        return messages
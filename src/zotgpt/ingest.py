@@ -0,0 +1,396 @@
+"""Module for streaming Zotero PDFs into the vector store.
+
+Items flow through fetch, parse (load + chunk), embed and upsert stages that
+run in their own threads and are connected by bounded queues, so downloads,
+PDF parsing and embedding calls overlap while a slow stage holds back the
+ones feeding it. Parsing itself fans out to worker processes.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from langchain.embeddings.base import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from zotgpt.backend import PENDING, load_documents
+from zotgpt.lexical import BM25Index
+from zotgpt.metastore import MetaStore
+from zotgpt.vectorstore import get_item_documents, replace_item_documents
+from zotgpt.zotero import ZoteroItem, ZoteroWrapper
+
+# Marks the end of a stream; consumers put it back for their siblings
+_DONE = object()
+
+# Items whose chunks are read back from the vector store at once when
+# backfilling the lexical index
+BACKFILL_BATCH_SIZE = 50
+
+# How long the parse stage waits for the next item before it checks on
+# the files already being parsed
+PARSE_POLL_SECONDS = 0.1
+
+# How long a stage waits on a full queue before it checks whether the
+# pipeline is stopping
+PUT_POLL_SECONDS = 0.1
+
+
+@dataclass
+class StageStats:
+    """Counters for a single pipeline stage."""
+
+    name: str
+    items: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record(
+        self, seconds: float, failed: bool = False, items: int = 1
+    ) -> None:
+        with self.lock:
+            self.busy_seconds += seconds
+            if failed:
+                self.errors += items
+            else:
+                self.items += items
+
+    @property
+    def throughput(self) -> float:
+        """Items per busy second, summed over the stage's workers."""
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<7} items={self.items:<6} errors={self.errors:<4} "
+            f"busy={self.busy_seconds:8.2f}s "
+            f"throughput={self.throughput:8.2f}/s"
+        )
+
+
+class IngestPipeline:
+    """Streaming ingestion of a Zotero collection into a vector store."""
+
+    def __init__(
+        self,
+        zotero_wrapper: ZoteroWrapper,
+        embeddings: Embeddings,
+        vector_store: VectorStore,
+        metastore: Optional[MetaStore] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        queue_size: int = 8,
+        parse_workers: int = 2,
+        parse_timeout: float = 300,
+        embed_workers: int = 2,
+        embed_batch_chunks: int = 1000,
+        skip_embedded: bool = True,
+        lexical_index: Optional[BM25Index] = None,
+    ) -> None:
+        """Initialize pipeline with its sources, sinks and stage sizes.
+
+        An embed worker takes every parsed item that is waiting, up to
+        ``embed_batch_chunks`` chunks, into one ``embed_documents`` call, so
+        that batched embeddings pack chunks across papers and keep several
+        requests in flight. When ``lexical_index`` is given, upserted chunks
+        are also added to the BM25 index used by hybrid retrieval.
+        """
+        self.zotero_wrapper = zotero_wrapper
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.metastore = metastore
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.queue_size = queue_size
+        self.parse_workers = parse_workers
+        self.parse_timeout = parse_timeout
+        self.embed_workers = embed_workers
+        self.embed_batch_chunks = embed_batch_chunks
+        self.skip_embedded = skip_embedded
+        self.lexical_index = lexical_index
+        self.stats: dict[str, StageStats] = {}
+        self._stop = threading.Event()
+        self._failure: Optional[Exception] = None
+
+    def _put(self, outbox: queue.Queue, item) -> None:
+        """Put ``item`` on a bounded queue, unless the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=PUT_POLL_SECONDS)
+            except queue.Full:
+                continue
+            else:
+                return
+
+    def _embedded_keys(self) -> set:
+        if not (self.skip_embedded and self.metastore):
+            return set()
+        return {
+            row["key"]
+            for row in self.metastore.iter_items(["key"], where={"embedded": 1})
+        }
+
+    def _fetch(self, collection_key: str, outbox: queue.Queue) -> None:
+        stats = self.stats["fetch"]
+        skip_keys = self._embedded_keys()
+        batch = []
+
+        def flush() -> None:
+            start = time.perf_counter()
+            zot_items = ZoteroItem.from_items(self.zotero_wrapper.zot, batch)
+            stats.busy_seconds += time.perf_counter() - start
+            stats.items += len(zot_items)
+            batch.clear()
+            for zot_item in zot_items:
+                self._put(outbox, zot_item)
+
+        try:
+            for item in self.zotero_wrapper.iter_pdf_items_from_collection_key(
+                collection_key
+            ):
+                if self._stop.is_set():
+                    return
+                if item["data"]["key"] in skip_keys:
+                    continue
+                batch.append(item)
+                if len(batch) >= 50:
+                    flush()
+            if batch:
+                flush()
+        except Exception as e:
+            stats.errors += 1
+            print(f"* [fetch] failed: {e!r}")
+        finally:
+            self._put(outbox, _DONE)
+
+    def _parse(self, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        stats = self.stats["parse"]
+        start = time.perf_counter()
+        pending = {}
+        metadatas = {}
+
+        def paths():
+            # Polls, so that results are collected and timeouts enforced
+            # while the fetch stage is slow to deliver the next item
+            while True:
+                try:
+                    zot_item = inbox.get(timeout=PARSE_POLL_SECONDS)
+                except queue.Empty:
+                    yield PENDING
+                    continue
+                if zot_item is _DONE:
+                    return
+                path = zot_item.get_pdf_path()
+                pending[path] = zot_item
+                metadatas[path] = {
+                    "source": zot_item.get_url(),
+                    "id": zot_item.key,
+                    "title": zot_item.get_title(),
+                }
+                yield path
+
+        try:
+            for path, documents, error in load_documents(
+                paths(),
+                workers=self.parse_workers,
+                timeout=self.parse_timeout,
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                metadatas=metadatas,
+            ):
+                zot_item = pending.pop(path)
+                metadatas.pop(path)
+                if error:
+                    stats.errors += 1
+                    print(f"* [parse] failed {path}: {error}")
+                    continue
+                stats.items += 1
+                outbox.put((zot_item, documents))
+        except Exception as e:
+            # Nothing reads the fetch stage's queue any more: stop it, and
+            # let run() raise once every stage has wound down
+            stats.errors += 1
+            print(f"* [parse] failed: {e!r}")
+            self._failure = e
+            self._stop.set()
+        finally:
+            # Parsing happens in worker processes, so wall time is reported
+            stats.busy_seconds = time.perf_counter() - start
+            outbox.put(_DONE)
+
+    def _embed(self, tasks: list[tuple]) -> list[tuple]:
+        """Embed the chunks of several items at once, split back per item."""
+        vectors = self.embeddings.embed_documents([
+            doc.page_content for _, documents in tasks for doc in documents
+        ])
+        results, start = [], 0
+        for zot_item, documents in tasks:
+            end = start + len(documents)
+            results.append((zot_item, documents, vectors[start:end]))
+            start = end
+        return results
+
+    def _upsert(self, task: tuple) -> None:
+        zot_item, documents, vectors = task
+        replace_item_documents(
+            self.vector_store, zot_item.key, documents, vectors
+        )
+        if self.lexical_index is not None:
+            self.lexical_index.replace_item(zot_item.key, documents)
+        if self.metastore:
+            self.metastore.update_embedded_value_by_key(zot_item.key)
+
+    @staticmethod
+    def _waiting(inbox: queue.Queue, chunks: int) -> list[tuple]:
+        """Take the (item, documents) tasks already queued, up to ``chunks``."""
+        tasks = []
+        while chunks > 0:
+            try:
+                task = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if task is _DONE:
+                inbox.put(_DONE)
+                break
+            tasks.append(task)
+            chunks -= len(task[1])
+        return tasks
+
+    def _start_stage(
+        self,
+        name: str,
+        func: Callable,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        workers: int,
+        batch_chunks: int = 0,
+    ) -> list[threading.Thread]:
+        """Start ``workers`` threads applying ``func`` to tasks from ``inbox``.
+
+        With ``batch_chunks``, ``func`` takes and returns lists: the next
+        task plus those already waiting, up to that many chunks in total.
+        """
+        stats = self.stats[name] = StageStats(name)
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def work() -> None:
+            while True:
+                task = inbox.get()
+                if task is _DONE:
+                    inbox.put(_DONE)
+                    break
+                if batch_chunks:
+                    task = [
+                        task,
+                        *self._waiting(inbox, batch_chunks - len(task[1])),
+                    ]
+                items = len(task) if batch_chunks else 1
+                start = time.perf_counter()
+                try:
+                    result = func(task)
+                except Exception as e:
+                    stats.record(
+                        time.perf_counter() - start, failed=True, items=items
+                    )
+                    print(f"* [{name}] failed: {e!r}")
+                    continue
+                stats.record(time.perf_counter() - start, items=items)
+                if outbox is not None:
+                    for output in result if batch_chunks else [result]:
+                        outbox.put(output)
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished and outbox is not None:
+                outbox.put(_DONE)
+
+        threads = [
+            threading.Thread(target=work, name=f"ingest-{name}-{i}")
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def backfill_lexical_index(self) -> int:
+        """Index the chunks of embedded items missing from the BM25 index.
+
+        Items embedded before the lexical index was configured are skipped
+        by ``run``; their chunks are read back from the vector store rather
+        than parsed and embedded again. Returns the number of items indexed.
+        """
+        if self.lexical_index is None or self.metastore is None:
+            return 0
+        indexed = self.lexical_index.item_ids()
+        missing = [
+            row["key"]
+            for row in self.metastore.iter_items(["key"], where={"embedded": 1})
+            if row["key"] not in indexed
+        ]
+        for i in range(0, len(missing), BACKFILL_BATCH_SIZE):
+            self.lexical_index.add_documents(
+                get_item_documents(
+                    self.vector_store, missing[i : i + BACKFILL_BATCH_SIZE]
+                )
+            )
+        if missing:
+            print(f"* Backfilled the lexical index with {len(missing)} items")
+        return len(missing)
+
+    def run(self, collection_key: str) -> dict[str, StageStats]:
+        """Ingest every PDF of the collection and return per-stage stats.
+
+        Failures of single items are counted and skipped; a failure of the
+        parse stage itself stops the pipeline and is raised.
+        """
+        start = time.perf_counter()
+        self.stats = {
+            "fetch": StageStats("fetch"),
+            "parse": StageStats("parse"),
+        }
+        self._stop.clear()
+        self._failure = None
+        to_parse = queue.Queue(maxsize=self.queue_size)
+        to_embed = queue.Queue(maxsize=self.queue_size)
+        to_upsert = queue.Queue(maxsize=self.queue_size)
+
+        threads = [
+            threading.Thread(
+                target=self._fetch,
+                args=(collection_key, to_parse),
+                name="ingest-fetch",
+            ),
+            threading.Thread(
+                target=self._parse,
+                args=(to_parse, to_embed),
+                name="ingest-parse",
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+        threads += self._start_stage(
+            "embed",
+            self._embed,
+            to_embed,
+            to_upsert,
+            self.embed_workers,
+            batch_chunks=self.embed_batch_chunks,
+        )
+        threads += self._start_stage("upsert", self._upsert, to_upsert, None, 1)
+
+        for thread in threads:
+            thread.join()
+        if self._failure is not None:
+            raise self._failure
+
+        print(
+            f"Ingested {collection_key=} in {time.perf_counter() - start:.2f}s"
+        )
+        for stats in self.stats.values():
+            print(f"* {stats}")
+        return self.stats
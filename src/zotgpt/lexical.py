@@ -0,0 +1,280 @@
+"""Module for a persistent BM25 index over document chunks.
+
+The inverted index lives in SQLite: one posting per (term, chunk) with its
+term frequency, plus per-chunk lengths and a row of corpus totals that is
+kept up to date on every write, so chunks can be added and removed
+incrementally during ingestion and scoring only touches the postings of the
+query terms.
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from typing import Optional
+
+from langchain_core.documents import Document
+
+# Keeps identifiers such as "bert-base", "gpt-4" or "f1.5" in one token
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to",
+    "was", "were", "which", "with", "we", "our", "can", "not", "these",
+}  # fmt: skip
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens of a text, without stopwords."""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 index persisted in a SQLite file."""
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75) -> None:
+        """Open (or create) the index at ``path``."""
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Ingestion writes while the app searches: with WAL, readers never
+        # wait on a writer, and writers wait on each other for a while
+        # rather than failing with "database is locked"
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA busy_timeout = 30000")
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id INTEGER PRIMARY KEY,
+                item_id TEXT,
+                text TEXT,
+                metadata TEXT,
+                length INTEGER
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT,
+                chunk_id INTEGER,
+                tf INTEGER,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_item_id ON chunks (item_id)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id)"
+        )
+        # Corpus totals for the BM25 length normalization; filled from the
+        # chunks once for indexes created before the table existed
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                chunks INTEGER,
+                total_length INTEGER
+            )
+        """)
+        self._conn.execute("""
+            INSERT OR IGNORE INTO stats (id, chunks, total_length)
+            SELECT 0, COUNT(*), COALESCE(SUM(length), 0) FROM chunks
+        """)
+        self._conn.commit()
+
+    def _update_stats(self, chunks: int, total_length: int) -> None:
+        self._conn.execute(
+            """
+            UPDATE stats SET chunks = chunks + ?,
+                total_length = total_length + ?
+            """,
+            (chunks, total_length),
+        )
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT chunks FROM stats").fetchone()[0]
+
+    def item_ids(self) -> set[str]:
+        """Keys of the Zotero items that have chunks in the index."""
+        return {
+            item_id
+            for (item_id,) in self._conn.execute(
+                "SELECT DISTINCT item_id FROM chunks"
+            )
+        }
+
+    def add_documents(self, documents: Iterable[Document]) -> None:
+        """Index chunks; their ``id`` metadata is the Zotero item key."""
+        with self._lock:
+            added, added_length = 0, 0
+            for doc in documents:
+                counts = Counter(tokenize(doc.page_content))
+                length = sum(counts.values())
+                cursor = self._conn.execute(
+                    """
+                    INSERT INTO chunks (item_id, text, metadata, length)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (
+                        doc.metadata.get("id"),
+                        doc.page_content,
+                        json.dumps(doc.metadata),
+                        length,
+                    ),
+                )
+                added += 1
+                added_length += length
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [
+                        (term, cursor.lastrowid, tf)
+                        for term, tf in counts.items()
+                    ],
+                )
+            self._update_stats(added, added_length)
+            self._conn.commit()
+
+    def delete(self, item_ids: list[str]) -> None:
+        """Remove every chunk of the given Zotero items."""
+        with self._lock:
+            for i in range(0, len(item_ids), 500):
+                chunk = item_ids[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                removed, removed_length = self._conn.execute(
+                    f"""
+                    SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks
+                    WHERE item_id IN ({placeholders})
+                    """,  # noqa: S608
+                    chunk,
+                ).fetchone()
+                self._update_stats(-removed, -removed_length)
+                self._conn.execute(
+                    f"""
+                    DELETE FROM postings WHERE chunk_id IN (
+                        SELECT chunk_id FROM chunks
+                        WHERE item_id IN ({placeholders})
+                    )
+                    """,  # noqa: S608
+                    chunk,
+                )
+                self._conn.execute(
+                    f"DELETE FROM chunks WHERE item_id IN ({placeholders})",  # noqa: S608
+                    chunk,
+                )
+            self._conn.commit()
+
+    def replace_item(self, item_id: str, documents: list[Document]) -> None:
+        """Re-index an item so re-ingesting it does not duplicate chunks."""
+        self.delete([item_id])
+        self.add_documents(documents)
+
+    def _chunk_ids(self, item_ids: list[str]) -> list[int]:
+        """Chunks of the given items, looked up 500 keys at a time."""
+        chunk_ids = []
+        for i in range(0, len(item_ids), 500):
+            chunk = list(item_ids[i : i + 500])
+            chunk_ids.extend(
+                chunk_id
+                for (chunk_id,) in self._conn.execute(
+                    f"""
+                    SELECT chunk_id FROM chunks
+                    WHERE item_id IN ({",".join("?" * len(chunk))})
+                    """,  # noqa: S608
+                    chunk,
+                )
+            )
+        return chunk_ids
+
+    def _postings(
+        self, term: str, chunk_ids: Optional[list[int]]
+    ) -> Iterable[tuple[int, int, int]]:
+        """(chunk_id, tf, length) of a term, optionally within chunk_ids."""
+        query = """
+            SELECT p.chunk_id, p.tf, c.length FROM postings p
+            JOIN chunks c ON c.chunk_id = p.chunk_id
+            WHERE p.term = ?
+        """
+        if chunk_ids is None:
+            yield from self._conn.execute(query, (term,))
+            return
+        for i in range(0, len(chunk_ids), 500):
+            chunk = chunk_ids[i : i + 500]
+            yield from self._conn.execute(
+                f"{query} AND p.chunk_id IN ({','.join('?' * len(chunk))})",
+                (term, *chunk),
+            )
+
+    def _score(
+        self, terms: list[str], item_ids: Optional[list[str]]
+    ) -> dict[int, float]:
+        total, total_length = self._conn.execute(
+            "SELECT chunks, total_length FROM stats"
+        ).fetchone()
+        if not total:
+            return {}
+        avg_length = total_length / total
+
+        chunk_ids = self._chunk_ids(item_ids) if item_ids else None
+        if chunk_ids == []:
+            return {}
+
+        scores = defaultdict(float)
+        for term in terms:
+            (df,) = self._conn.execute(
+                "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)
+            ).fetchone()
+            if not df:
+                continue
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for chunk_id, tf, length in self._postings(term, chunk_ids):
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(
+        self, query: str, k: int = 4, item_ids: Optional[list[str]] = None
+    ) -> list[tuple[Document, float]]:
+        """Return the ``k`` best chunks for a query with their BM25 scores."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            scores = self._score(terms, item_ids)
+            top = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            rows = {
+                chunk_id: (text, metadata)
+                for chunk_id, text, metadata in self._conn.execute(
+                    f"""
+                    SELECT chunk_id, text, metadata FROM chunks
+                    WHERE chunk_id IN ({placeholders})
+                    """,  # noqa: S608
+                    [chunk_id for chunk_id, _ in top],
+                )
+            }
+        return [
+            (
+                Document(
+                    page_content=rows[chunk_id][0],
+                    metadata=json.loads(rows[chunk_id][1]),
+                ),
+                score,
+            )
+            for chunk_id, score in top
+        ]
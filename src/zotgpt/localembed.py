@@ -0,0 +1,77 @@
+"""Module for embedding text on the local CPU with sentence-transformers.
+
+Requires the optional ``sentence-transformers`` package (and ``onnxruntime``
+for the ONNX backend). The model is loaded on first use, so creating the
+embeddings object is free and nothing needs an API key or network access
+once the model is in the local Hugging Face cache.
+"""
+
+import threading
+from typing import Optional
+
+from langchain.embeddings.base import Embeddings
+
+DEFAULT_LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class LocalEmbeddings(Embeddings):
+    """Embeddings computed in-process by a sentence-transformers model."""
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_LOCAL_MODEL,
+        batch_size: int = 64,
+        num_threads: Optional[int] = None,
+        backend: str = "torch",
+        normalize: bool = True,
+    ) -> None:
+        """Initialize embeddings; ``backend`` is "torch" or "onnx"."""
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.backend = backend
+        self.normalize = normalize
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError(
+                        "Local embeddings require sentence-transformers: "
+                        "pip install sentence-transformers"
+                    ) from e
+                if self.num_threads:
+                    import torch
+
+                    torch.set_num_threads(self.num_threads)
+                print(f"* Loading embeddings model {self.model_name}")
+                self._model = SentenceTransformer(
+                    self.model_name, device="cpu", backend=self.backend
+                )
+            return self._model
+
+    @property
+    def dimension(self) -> int:
+        """Return the output dimension reported by the model."""
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents in batches of ``batch_size``."""
+        if not texts:
+            return []
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,872 @@
+"""Module for an embedded, memory-mapped vector store that runs offline.
+
+Vectors live in a flat binary file that is memory-mapped rather than loaded,
+so opening a store costs milliseconds regardless of its size. Texts and
+metadata live in a SQLite sidecar and are only read for the rows a search
+returns. Vectors are L2-normalized on the way in, so inner products are
+cosine similarities.
+
+Stores can optionally be compressed (see ``zotgpt.compress``): vectors are
+projected to fewer dimensions on the way in, and stored as int8 codes, or as
+sign bits that are scanned before the best candidates are rescored against
+a float16 copy.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections.abc import Iterable
+from typing import Any, Callable, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from zotgpt.compress import (
+    INT8_SCALE,
+    PROJECTIONS,
+    QUANTIZATIONS,
+    Projection,
+    coarse_scores,
+    code_size,
+    normalize,
+    quantize,
+)
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# The vectors kept by quantized stores: int8 codes take the place of the
+# float vectors, while binary codes are rescored against float16 ones
+QUANTIZED_DTYPES = {"int8": "int8", "binary": "float16"}
+
+# Rows scored per block, bounding the temporary float copies of the matrix
+BLOCK_SIZE = 65536
+
+# Rows of int8 vectors or quantized codes per block; their float copies
+# should fit in cache
+CODE_BLOCK_SIZE = 256
+
+
+def _grown(buffer: np.ndarray, rows: int) -> np.ndarray:
+    """Return ``buffer`` with room for ``rows`` rows, doubling as it grows.
+
+    Appending a document then does not copy the whole store's state.
+    """
+    if rows <= len(buffer):
+        return buffer
+    grown = np.zeros(
+        (max(rows, 2 * len(buffer)), *buffer.shape[1:]), dtype=buffer.dtype
+    )
+    grown[: len(buffer)] = buffer
+    return grown
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k largest scores per row, best first."""
+    k = min(k, scores.shape[-1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=-1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class IVFIndex:
+    """Inverted file index over the rows of a LocalVectorStore.
+
+    Rows are bucketed by their nearest centroid (spherical k-means), and a
+    search only scores the rows of the ``nprobe`` lists closest to the
+    query. Centroids and per-row list assignments are persisted next to
+    the vectors; new rows are assigned to the existing centroids.
+    """
+
+    def __init__(self, path: str, nlist: int = 1024, nprobe: int = 16):
+        self.centroids_path = os.path.join(path, "ivf_centroids.npy")
+        self.assignments_path = os.path.join(path, "ivf_assignments.bin")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = (
+            np.load(self.centroids_path)
+            if os.path.exists(self.centroids_path)
+            else None
+        )
+        if self.centroids is not None:
+            self.nlist = len(self.centroids)
+        self._lists = None
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def min_train_rows(self) -> int:
+        # Fewer than ~40 points per centroid gives poorly placed centroids
+        return self.nlist * 39
+
+    def __len__(self) -> int:
+        if not os.path.exists(self.assignments_path):
+            return 0
+        return os.path.getsize(self.assignments_path) // 4
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), BLOCK_SIZE):
+            block = vectors[start : start + BLOCK_SIZE]
+            labels[start : start + BLOCK_SIZE] = np.argmax(
+                block @ self.centroids.T, axis=1
+            )
+        return labels
+
+    def train(
+        self, sample: np.ndarray, iterations: int = 10, seed: int = 0
+    ) -> None:
+        """Fit the centroids on a sample of normalized vectors."""
+        rng = np.random.default_rng(seed)
+        nlist = min(self.nlist, len(sample))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=nlist)
+            order = np.argsort(labels, kind="stable")
+            nonempty = counts > 0
+            starts = (np.cumsum(counts) - counts)[nonempty]
+            centroids[nonempty] = np.add.reduceat(sample[order], starts)
+            # Re-seed empty lists so every centroid stays useful
+            empty = np.flatnonzero(~nonempty)
+            centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+            centroids = normalize(centroids)
+        self.nlist = nlist
+        self.centroids = centroids
+        np.save(self.centroids_path, centroids)
+        if os.path.exists(self.assignments_path):
+            os.remove(self.assignments_path)
+        self._lists = None
+
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        """Assign rows ``start, start + 1, ...`` to their nearest list."""
+        if len(self) != start:
+            raise ValueError(f"IVF index has {len(self)} rows, not {start}")
+        labels = self._assign(vectors)
+        with open(self.assignments_path, "ab") as f:
+            f.write(labels.tobytes())
+        if self._lists is not None:
+            rows = np.arange(start, start + len(vectors))
+            for label in np.unique(labels):
+                self._lists[label] = np.concatenate((
+                    self._lists[label],
+                    rows[labels == label],
+                ))
+
+    def _build_lists(self) -> list[np.ndarray]:
+        labels = np.fromfile(self.assignments_path, dtype=np.int32)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.cumsum(np.bincount(labels, minlength=self.nlist))[:-1]
+        return np.split(order, bounds)
+
+    def candidates(
+        self, query: np.ndarray, nprobe: Optional[int] = None
+    ) -> np.ndarray:
+        """Return the sorted rows of the lists closest to ``query``."""
+        if self._lists is None:
+            self._lists = self._build_lists()
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probe = _top_k((self.centroids @ query)[None], nprobe)[0]
+        return np.sort(np.concatenate([self._lists[i] for i in probe]))
+
+
+class LocalVectorStore(VectorStore):
+    """Vector store backed by a memory-mapped matrix and a SQLite sidecar."""
+
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        path: str,
+        dtype: Optional[str] = None,
+        index_type: Optional[str] = None,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        train_size: int = 100_000,
+        projection: Optional[str] = None,
+        projection_dim: Optional[int] = None,
+        quantization: Optional[str] = None,
+        rescore_factor: int = 64,
+    ) -> None:
+        """Open (or create) the store in the ``path`` directory.
+
+        ``index_type="ivf"`` searches an IVF index with ``nlist`` lists,
+        probing ``nprobe`` of them per query (overridable per search). The
+        index is trained on up to ``train_size`` rows once the store holds
+        enough of them, and searches are exact until then. The dtype is fixed
+        on first write. ``index_type`` and ``nlist`` are saved on every open,
+        so later opens that omit them reuse the last ones, while passing them
+        switches the store; a trained index keeps its lists until
+        ``build_index`` is called.
+
+        A "float16" store halves the vectors file but not memory: numpy has
+        no fast float16 arithmetic, so the vectors are converted to float32
+        once, when they are opened or added. "int8" vectors are scored in
+        place.
+
+        ``projection="truncate"`` keeps the first ``projection_dim``
+        dimensions of every vector (for Matryoshka models); a "pca"
+        projection has to be fitted on existing data, see ``compress``.
+        ``quantization="int8"`` stores int8 codes in place of the vectors
+        (the same as ``dtype="int8"``). ``quantization="binary"`` stores a
+        sign bit per dimension that unfiltered exact searches scan, and
+        rescores the best ``rescore_factor * k`` rows against a float16
+        copy of the vectors (or ``dtype``); fewer candidates lose recall
+        quickly. Both are fixed at creation.
+        """
+        self.embedding_function = embedding_function
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.bin")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, "meta.sqlite"), check_same_thread=False
+        )
+        self._create_tables()
+
+        settings = dict(self._conn.execute("SELECT name, value FROM settings"))
+        self.dimension = (
+            int(settings["dimension"]) if "dimension" in settings else None
+        )
+        self.quantization = settings.get("quantization", quantization)
+        if self.dimension is not None and "quantization" not in settings:
+            self.quantization = None
+        if self.quantization not in [None, *QUANTIZATIONS]:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+        self.dtype = settings.get("dtype") or (
+            dtype or QUANTIZED_DTYPES.get(self.quantization, "float32")
+        )
+        if self.dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {list(DTYPES)}")
+        if self.quantization == "int8" and self.dtype != "int8":
+            raise ValueError("quantization='int8' stores int8 vectors")
+        self.projection = Projection.load(os.path.join(path, "projection.npz"))
+        if self.projection is None and self.dimension is None:
+            if projection == "truncate" and projection_dim:
+                self.projection = Projection("truncate", projection_dim)
+                self.projection.save(os.path.join(path, "projection.npz"))
+            elif projection is not None:
+                raise ValueError(
+                    f"projection must be one of {PROJECTIONS}; 'truncate' "
+                    "needs projection_dim and 'pca' is fitted by compress()"
+                )
+        self.rescore_factor = rescore_factor
+        self.codes_path = os.path.join(path, "codes.bin")
+        self.index_type = index_type or settings.get("index_type", "flat")
+        if self.index_type not in ["flat", "ivf"]:
+            raise ValueError("index_type must be one of ['flat', 'ivf']")
+        nlist = nlist or int(settings.get("nlist", 1024))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)",
+            [("index_type", self.index_type), ("nlist", str(nlist))],
+        )
+        self._conn.commit()
+        self.index = (
+            IVFIndex(path, nlist=nlist, nprobe=nprobe)
+            if self.index_type == "ivf"
+            else None
+        )
+        self.train_size = train_size
+        self._matrix = None
+        self._codes = None
+        self._remap()
+
+    def _create_tables(self) -> None:
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                doc_id TEXT,
+                item_id TEXT,
+                text TEXT,
+                metadata TEXT,
+                deleted BOOL DEFAULT 0
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id)"
+        )
+        # Covers the row lookup of id-filtered searches
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_item_id ON chunks (item_id, row)"
+        )
+        # Tombstones are few, so loading them on open reads only this index
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_deleted ON chunks (row) "
+            "WHERE deleted = 1"
+        )
+        self._conn.commit()
+
+    def _row_bytes(self) -> list[tuple[str, int]]:
+        """The files holding a value per row, and their bytes per row."""
+        files = [
+            (
+                self.vectors_path,
+                np.dtype(DTYPES[self.dtype]).itemsize * self.dimension,
+            )
+        ]
+        if self.quantization == "binary":
+            files.append((self.codes_path, code_size(self.dimension, "binary")))
+        return files
+
+    def _remap(self) -> None:
+        """Map the committed rows and load the tombstones, on open.
+
+        Vectors are appended before their chunks are committed, so rows past
+        the last committed chunk belong to an add that was interrupted; they
+        are left out here and overwritten by the next add.
+        """
+        rows = 0
+        if self.dimension and os.path.exists(self.vectors_path):
+            (committed,) = self._conn.execute(
+                "SELECT COALESCE(MAX(row) + 1, 0) FROM chunks"
+            ).fetchone()
+            rows = min(
+                committed,
+                *(
+                    os.path.getsize(path) // size
+                    for path, size in self._row_bytes()
+                ),
+            )
+        self._map(rows)
+        self._deleted_buffer = np.zeros(rows, dtype=bool)
+        self._deleted = self._deleted_buffer[:rows]
+        self._sync_floats(0)
+        deleted = [
+            row
+            for (row,) in self._conn.execute(
+                "SELECT row FROM chunks WHERE deleted = 1 AND row < ?", (rows,)
+            )
+        ]
+        self._deleted[deleted] = True
+        self._sync_index()
+
+    def _grow(self, rows: int) -> None:
+        """Map rows appended to the files and extend the per-row state."""
+        old = len(self._deleted)
+        self._map(rows)
+        self._deleted_buffer = _grown(self._deleted_buffer, rows)
+        self._deleted = self._deleted_buffer[:rows]
+        self._sync_floats(old)
+        self._sync_index()
+
+    def _sync_floats(self, start: int) -> None:
+        """Point ``_float`` at float32 vectors, converting rows from ``start``.
+
+        float32 vectors are used as mapped and scanned float16 vectors are
+        kept converted in memory; other vectors are converted by ``_read``.
+        """
+        rows = 0 if self._matrix is None else self._matrix.shape[0]
+        self._float = self._matrix if self.dtype == "float32" else None
+        if self.dtype != "float16" or self.quantization == "binary" or not rows:
+            return
+        if start == 0:
+            self._float_buffer = np.zeros((0, self.dimension), np.float32)
+        self._float_buffer = _grown(self._float_buffer, rows)
+        self._float_buffer[start:rows] = self._matrix[start:rows]
+        self._float = self._float_buffer[:rows]
+
+    def _truncate(self, rows: int) -> None:
+        """Drop the rows an interrupted add appended past ``rows``."""
+        for path, size in self._row_bytes():
+            if os.path.exists(path) and os.path.getsize(path) > rows * size:
+                os.truncate(path, rows * size)
+
+    def _map(self, rows: int) -> None:
+        self._matrix = (
+            np.memmap(
+                self.vectors_path,
+                dtype=DTYPES[self.dtype],
+                mode="r",
+                shape=(rows, self.dimension),
+            )
+            if rows
+            else None
+        )
+        self._codes = (
+            np.memmap(
+                self.codes_path,
+                dtype=np.uint8,
+                mode="r",
+                shape=(rows, code_size(self.dimension, "binary")),
+            )
+            if rows and self.quantization == "binary"
+            else None
+        )
+
+    def _sync_index(self) -> None:
+        """Train the IVF index once there is enough data, or catch it up."""
+        if self.index is None or self._matrix is None:
+            return
+        rows = self._matrix.shape[0]
+        if not self.index.trained:
+            if rows >= self.index.min_train_rows:
+                self.build_index()
+            return
+        for start in range(len(self.index), rows, BLOCK_SIZE):
+            self.index.add(start, self._read(slice(start, start + BLOCK_SIZE)))
+
+    def build_index(self) -> None:
+        """(Re)train the IVF index on a sample of rows and reassign all rows."""
+        if self.index is None:
+            raise ValueError("build_index requires index_type='ivf'")
+        with self._lock:
+            rows = self._matrix.shape[0]
+            rng = np.random.default_rng(0)
+            sample = np.sort(
+                rng.choice(rows, min(rows, self.train_size), replace=False)
+            )
+            print(f"* Training IVF index with {self.index.nlist} lists")
+            self.index.train(self._read(sample))
+            self._sync_index()
+
+    def __len__(self) -> int:
+        return int((~self._deleted).sum())
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def _read(self, rows) -> np.ndarray:
+        """Float32 vectors of ``rows``, a slice or an array of row numbers."""
+        if self._float is not None:
+            return self._float[rows]
+        block = self._matrix[rows].astype(np.float32)
+        if self.dtype == "int8":
+            block /= INT8_SCALE
+        return block
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        """Map input vectors to the stored space and normalize them."""
+        if self.projection is not None:
+            vectors = self.projection.apply(vectors)
+        return normalize(vectors)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            return np.round(vectors * INT8_SCALE).astype(np.int8)
+        return vectors.astype(DTYPES[self.dtype])
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """Embed and add texts."""
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(
+            list(zip(texts, vectors)), metadatas=metadatas, ids=ids
+        )
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[tuple[str, list[float]]],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        """Append precomputed embeddings; existing ids are replaced.
+
+        When an id repeats within the batch, its last occurrence is kept.
+        """
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        ids = ids or [str(uuid.uuid4()) for _ in text_embeddings]
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            text_embeddings = [text_embeddings[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+        texts = [text for text, _ in text_embeddings]
+        vectors = np.asarray(
+            [vector for _, vector in text_embeddings], dtype=np.float32
+        )
+
+        vectors = self._project(vectors)
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                settings = [
+                    ("dimension", str(self.dimension)),
+                    ("dtype", self.dtype),
+                ]
+                if self.quantization:
+                    settings.append(("quantization", self.quantization))
+                self._conn.executemany(
+                    "INSERT INTO settings (name, value) VALUES (?, ?)",
+                    settings,
+                )
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Expected {self.dimension}-d vectors, "
+                    f"got {vectors.shape[1]}-d"
+                )
+
+            start = 0 if self._matrix is None else self._matrix.shape[0]
+            self._truncate(start)
+            self._delete_where("doc_id", ids)
+            self._conn.executemany(
+                """
+                INSERT INTO chunks (row, doc_id, item_id, text, metadata)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        start + i,
+                        doc_id,
+                        metadata.get("id"),
+                        text,
+                        json.dumps(metadata),
+                    )
+                    for i, (doc_id, text, metadata) in enumerate(
+                        zip(ids, texts, metadatas)
+                    )
+                ],
+            )
+            with open(self.vectors_path, "ab") as f:
+                f.write(self._encode(vectors).tobytes())
+            if self.quantization == "binary":
+                with open(self.codes_path, "ab") as f:
+                    f.write(quantize(vectors, "binary").tobytes())
+            self._conn.commit()
+            self._grow(start + len(vectors))
+        return ids
+
+    def _delete_where(self, column: str, values: list[str]) -> None:
+        """Tombstone the live rows whose ``column`` is in ``values``."""
+        for i in range(0, len(values), 500):
+            chunk = values[i : i + 500]
+            condition = f"{column} IN ({','.join('?' * len(chunk))})"
+            rows = [
+                row
+                for (row,) in self._conn.execute(
+                    f"SELECT row FROM chunks WHERE {condition} AND deleted = 0",  # noqa: S608
+                    chunk,
+                )
+            ]
+            self._conn.execute(
+                f"UPDATE chunks SET deleted = 1 WHERE {condition}",  # noqa: S608
+                chunk,
+            )
+            self._deleted[rows] = True
+
+    def delete(
+        self,
+        ids: Optional[list[str]] = None,
+        item_ids: Optional[list[str]] = None,
+        **kwargs: Any,
+    ) -> Optional[bool]:
+        """Delete chunks by document id and/or by Zotero item ``id``."""
+        with self._lock:
+            if ids:
+                self._delete_where("doc_id", list(ids))
+            if item_ids:
+                self._delete_where("item_id", list(item_ids))
+            self._conn.commit()
+        return True
+
+    def _filter_rows(self, where: dict) -> np.ndarray:
+        """Resolve an ``id`` filter to the sorted rows of those items."""
+        if set(where) != {"id"}:
+            raise ValueError("Only filters on the 'id' metadata are supported")
+        condition = where["id"]
+        item_ids = (
+            condition["$in"] if isinstance(condition, dict) else [condition]
+        )
+        rows = []
+        for i in range(0, len(item_ids), 500):
+            chunk = list(item_ids[i : i + 500])
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(
+                row
+                for (row,) in self._conn.execute(
+                    f"""
+                    SELECT row FROM chunks
+                    WHERE item_id IN ({placeholders}) AND deleted = 0
+                    """,  # noqa: S608
+                    chunk,
+                )
+            )
+        return np.sort(np.asarray(rows, dtype=np.int64))
+
+    def _score(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of every query against every row, block by block.
+
+        int8 vectors are converted in small blocks that stay in cache, and
+        the scale is applied to the scores rather than to every vector.
+        """
+        matrix = self._float if self._float is not None else self._matrix
+        step = BLOCK_SIZE if matrix.dtype == np.float32 else CODE_BLOCK_SIZE
+        rows = matrix.shape[0]
+        scores = np.empty((queries.shape[0], rows), dtype=np.float32)
+        for start in range(0, rows, step):
+            block = matrix[start : start + step].astype(np.float32, copy=False)
+            scores[:, start : start + step] = queries @ block.T
+        if matrix.dtype == np.int8:
+            scores /= INT8_SCALE
+        return scores
+
+    def _score_rows(
+        self, queries: np.ndarray, rows: np.ndarray, k: int
+    ) -> list[list[tuple[int, float]]]:
+        """Exact top-k of each query over a sorted subset of rows."""
+        rows = rows[~self._deleted[rows]]
+        if not len(rows):
+            return [[] for _ in queries]
+        scores = queries @ self._read(rows).T
+        top = _top_k(scores, k)
+        return [
+            [(int(rows[j]), float(scores[i, j])) for j in top[i]]
+            for i in range(len(queries))
+        ]
+
+    def _coarse_rows(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        """Approximate top-k rows of each query from the binary codes."""
+        rows = self._codes.shape[0]
+        scores = np.empty((queries.shape[0], rows), dtype=np.float32)
+        for start in range(0, rows, CODE_BLOCK_SIZE):
+            scores[:, start : start + CODE_BLOCK_SIZE] = coarse_scores(
+                queries, self._codes[start : start + CODE_BLOCK_SIZE], "binary"
+            )
+        scores[:, self._deleted] = -np.inf
+        top = _top_k(scores, k)
+        return [
+            np.sort(top[i][np.isfinite(scores[i, top[i]])])
+            for i in range(len(queries))
+        ]
+
+    def _search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        where: Optional[dict],
+        nprobe: Optional[int] = None,
+    ) -> list[list[tuple[int, float]]]:
+        if self._matrix is None:
+            return [[] for _ in queries]
+        queries = self._project(queries)
+
+        # Restricted searches gather just the selected items' rows through
+        # the item_id index and score them exactly, bypassing the IVF lists
+        if where:
+            return self._score_rows(queries, self._filter_rows(where), k)
+
+        if self.index is not None and self.index.trained:
+            return [
+                self._score_rows(
+                    query[None], self.index.candidates(query, nprobe), k
+                )[0]
+                for query in queries
+            ]
+
+        # Binary stores shortlist candidates from the sign bits and only
+        # read the float vectors of those rows
+        if self._codes is not None:
+            return [
+                self._score_rows(query[None], rows, k)[0]
+                for query, rows in zip(
+                    queries, self._coarse_rows(queries, k * self.rescore_factor)
+                )
+            ]
+
+        scores = self._score(queries)
+        scores[:, self._deleted] = -np.inf
+        top = _top_k(scores, k)
+        return [
+            [
+                (int(row), float(scores[i, row]))
+                for row in top[i]
+                if np.isfinite(scores[i, row])
+            ]
+            for i in range(len(queries))
+        ]
+
+    def _documents(self, rows: list[int]) -> dict[int, Document]:
+        """Read the documents of ``rows``, 500 rows per query."""
+        documents = {}
+        for i in range(0, len(rows), 500):
+            chunk = rows[i : i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            documents.update(
+                (
+                    row,
+                    Document(
+                        id=doc_id,
+                        page_content=text,
+                        metadata=json.loads(metadata),
+                    ),
+                )
+                for row, doc_id, text, metadata in self._conn.execute(
+                    f"""
+                    SELECT row, doc_id, text, metadata FROM chunks
+                    WHERE row IN ({placeholders})
+                    """,  # noqa: S608
+                    chunk,
+                )
+            )
+        return documents
+
+    def get_item_documents(self, item_ids: list[str]) -> list[Document]:
+        """Live chunks of the given Zotero items, in insertion order."""
+        with self._lock:
+            rows = self._filter_rows({"id": {"$in": list(item_ids)}}).tolist()
+            documents = self._documents(rows)
+        return [documents[row] for row in rows]
+
+    def similarity_search_with_score_by_vectors(
+        self,
+        embeddings: list[list[float]],
+        k: int = 4,
+        where: Optional[dict] = None,
+        nprobe: Optional[int] = None,
+    ) -> list[list[tuple[Document, float]]]:
+        """Batched top-k search for several query vectors at once."""
+        with self._lock:
+            hits = self._search(np.asarray(embeddings), k, where, nprobe)
+            documents = self._documents(
+                sorted({row for result in hits for row, _ in result})
+            )
+        return [
+            [(documents[row], score) for row, score in result]
+            for result in hits
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors(
+            [embedding],
+            k=k,
+            where=kwargs.get("filter"),
+            nprobe=kwargs.get("nprobe"),
+        )[0]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k=k, **kwargs
+            )
+        ]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding_function.embed_query(query), k=k, **kwargs
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any,
+    ) -> list[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score(
+                query, k=k, **kwargs
+            )
+        ]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda score: (score + 1.0) / 2.0
+
+    def compress(
+        self,
+        path: str,
+        projection: Optional[str] = None,
+        projection_dim: Optional[int] = None,
+        quantization: Optional[str] = None,
+        sample_size: int = 50_000,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        """Copy the live rows into a new, compressed store at ``path``.
+
+        This is how a "pca" projection is fitted: on a sample of up to
+        ``sample_size`` rows of this store. Other ``kwargs`` are passed to
+        the new store (e.g. ``dtype``, ``index_type``). The copy is smaller
+        but not faster to search, and can lose recall; ``zotgpt.compress``
+        lists measured costs.
+        """
+        if self.projection is not None and projection is not None:
+            raise ValueError("Cannot project an already projected store")
+        if self._matrix is None:
+            raise ValueError("Cannot compress an empty store")
+        os.makedirs(path, exist_ok=True)
+        rows = np.flatnonzero(~self._deleted)
+        if projection == "pca":
+            if not projection_dim:
+                raise ValueError("A 'pca' projection needs projection_dim")
+            rng = np.random.default_rng(0)
+            sample = np.sort(
+                rng.choice(rows, min(len(rows), sample_size), replace=False)
+            )
+            print(f"* Fitting PCA to {projection_dim} dimensions")
+            Projection.fit_pca(self._read(sample), projection_dim).save(
+                os.path.join(path, "projection.npz")
+            )
+            projection = None
+        store = LocalVectorStore(
+            self.embedding_function,
+            path,
+            projection=projection,
+            projection_dim=projection_dim,
+            quantization=quantization,
+            **kwargs,
+        )
+        for start in range(0, len(rows), BLOCK_SIZE):
+            block = rows[start : start + BLOCK_SIZE]
+            documents = self._documents(block.tolist())
+            store.add_embeddings(
+                [
+                    (documents[row].page_content, vector)
+                    for row, vector in zip(block, self._read(block))
+                ],
+                metadatas=[documents[row].metadata for row in block],
+                ids=[documents[row].id for row in block],
+            )
+        return store
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+        path: str = "localstore",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, path, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -1,48 +1,368 @@
+import json
 import os
 import pickle
 import shutil
 import sqlite3
-from typing import Union
+import threading
+from collections.abc import Iterator
+from typing import Optional, Union
 
 import pandas as pd
 from tqdm import tqdm
 
+from zotgpt.zotero import creator_names
+
+# Migrating to version N is done by MetaStore._migrate_vN
+SCHEMA_VERSION = 1
+
+# Keys per ``IN (...)`` clause, below SQLite's bound-parameter limit
+KEY_CHUNK_SIZE = 500
+
+# Items written per transaction by populate_database
+WRITE_BATCH_SIZE = 5000
+
+LINK_TABLES = ["item_tags", "item_creators", "item_collections"]
+
+# Columns MetaStore.query can select, as SQL expressions over ``items``
+QUERY_COLUMNS = {
+    "key": "items.key",
+    "title": "items.title",
+    "tags": """(
+        SELECT json_group_array(tags.name)
+        FROM item_tags JOIN tags ON tags.id = item_tags.tag_id
+        WHERE item_tags.item_key = items.key
+    )""",
+    "creators": """(
+        SELECT json_group_array(creators.name)
+        FROM item_creators
+        JOIN creators ON creators.id = item_creators.creator_id
+        WHERE item_creators.item_key = items.key
+    )""",
+    "collections": """(
+        SELECT json_group_array(collection_key)
+        FROM item_collections
+        WHERE item_collections.item_key = items.key
+    )""",
+    "url": "items.url",
+    "path": "items.path",
+    "parent_key": "items.parent_key",
+    "item": "items.item",
+    "parent_item": "items.parent_item",
+    "embedded": "items.embedded",
+}
+JSON_COLUMNS = {"tags", "creators", "collections", "item", "parent_item"}
+
+# Columns of ``items`` that ``where`` filters compare for equality
+FILTER_COLUMNS = ["key", "title", "url", "path", "parent_key", "embedded"]
+
+# Item keys linked to a tag, creator or collection, resolved by index seeks
+LINK_FILTERS = {
+    "tag": """
+        SELECT item_key FROM item_tags
+        WHERE tag_id = (SELECT id FROM tags WHERE name = ?)
+    """,
+    "creator": """
+        SELECT item_key FROM item_creators
+        WHERE creator_id = (SELECT id FROM creators WHERE name = ?)
+    """,
+    "collection": """
+        SELECT item_key FROM item_collections
+        WHERE collection_key IN (
+            SELECT key FROM collections WHERE key = ? OR name = ?
+        )
+    """,
+}
+
+SEARCH_CONDITION = """(
+    items.title LIKE ? ESCAPE '\\'
+    OR items.key LIKE ? ESCAPE '\\'
+    OR EXISTS (
+        SELECT 1 FROM item_tags JOIN tags ON tags.id = item_tags.tag_id
+        WHERE item_tags.item_key = items.key AND tags.name LIKE ? ESCAPE '\\'
+    )
+)"""
+
+
+def _chunks(values: list, size: int) -> Iterator[list]:
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
 
 class MetaStore:
+    """SQLite store of the library's items, tags, creators and collections.
+
+    The schema version is kept in ``PRAGMA user_version`` and databases
+    written by older versions are migrated when first opened. Zotero item
+    payloads are stored as JSON, so they can be queried with SQLite's JSON
+    functions, e.g. ``json_extract(parent_item, '$.data.DOI')``.
+
+    One connection is opened on first use and shared by all threads using
+    the store (the app caches one MetaStore for all its Streamlit sessions),
+    serialized by a lock. The database runs in WAL mode, so the ingest script
+    can write while the app reads.
+    """
+
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._conn = None
+        self._lock = threading.RLock()
 
-    def create_database(self) -> None:
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self) -> sqlite3.Connection:
+        """Return the shared connection, opening and migrating it once."""
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode = WAL")
+                # Durable at checkpoints; a crash can only lose the last
+                # commits, which the next sync re-fetches anyway
+                conn.execute("PRAGMA synchronous = NORMAL")
+                conn.execute("PRAGMA temp_store = MEMORY")
+                conn.execute("PRAGMA cache_size = -65536")
+                self.migrate(conn)
+                self._conn = conn
+            return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def migrate(self, conn: sqlite3.Connection) -> None:
+        """Apply the migrations newer than the database's schema version."""
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            print(f"Migrating {self.db_path} to schema version {target}")
+            getattr(self, f"_migrate_v{target}")(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+
+    def _migrate_v1(self, conn: sqlite3.Connection) -> None:
+        """Normalize tags, creators and collections; replace pickle by JSON."""
         cursor = conn.cursor()
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS library (
+            CREATE TABLE IF NOT EXISTS items (
                 key TEXT PRIMARY KEY,
                 title TEXT,
-                tags TEXT,
-                creators TEXT,
                 url TEXT,
                 path TEXT,
-                item BLOB,
-                parent_item BLOB,
+                parent_key TEXT,
+                item JSON,
+                parent_item JSON,
                 embedded BOOL DEFAULT 0
             )
         """)
-        conn.commit()
-        conn.close()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS creators (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS collections (
+                key TEXT PRIMARY KEY,
+                name TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_tags (
+                item_key TEXT,
+                tag_id INTEGER,
+                PRIMARY KEY (item_key, tag_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_creators (
+                item_key TEXT,
+                creator_id INTEGER,
+                PRIMARY KEY (item_key, creator_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS item_collections (
+                item_key TEXT,
+                collection_key TEXT,
+                PRIMARY KEY (item_key, collection_key)
+            ) WITHOUT ROWID
+        """)
+        # Reverse indexes turn lookups by tag/creator/collection into seeks
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS item_tags_tag "
+            "ON item_tags (tag_id, item_key)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS item_creators_creator "
+            "ON item_creators (creator_id, item_key)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS item_collections_collection "
+            "ON item_collections (collection_key, item_key)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS items_embedded ON items (embedded)"
+        )
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+
+        # Carry over the rows of the original pickled ``library`` table.
+        # Tags and creators are rebuilt from the parent item rather than
+        # split from the old comma-joined columns
+        legacy = cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'library'"
+        ).fetchone()
+        if legacy is None:
+            return
+        rows = cursor.execute(
+            "SELECT key, title, url, path, item, parent_item, embedded FROM library"
+        ).fetchall()
+        records = []
+        for key, title, url, path, item, parent_item, embedded in rows:
+            # Legacy rows were written by this application itself
+            item = pickle.loads(item)  # noqa: S301
+            parent_item = pickle.loads(parent_item)  # noqa: S301
+            parent_data = (parent_item or {}).get("data", {})
+            records.append({
+                "key": key,
+                "title": title,
+                "url": url,
+                "path": path,
+                "item": item,
+                "parent_item": parent_item,
+                "tags": [tag.get("tag") for tag in parent_data.get("tags", [])],
+                "creators": creator_names(parent_data.get("creators", [])),
+                "collections": parent_data.get("collections", []),
+                "embedded": embedded,
+            })
+        self._insert_items(cursor, records)
+        cursor.execute("DROP TABLE library")
+
+    def create_database(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._connect()
         print(f"Created database: {self.db_path}")
 
     def delete_database_and_folder(self) -> None:
+        self.close()
         if os.path.exists(self.db_path):
             os.remove(self.db_path)
         if os.path.exists(os.path.dirname(self.db_path)):
             shutil.rmtree(os.path.dirname(self.db_path))
 
-    def populate_database(self, items: list) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @staticmethod
+    def _delete_links(cursor: sqlite3.Cursor, keys: list[str]) -> None:
+        for chunk in _chunks(keys, KEY_CHUNK_SIZE):
+            placeholders = ",".join("?" * len(chunk))
+            for table in LINK_TABLES:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE item_key IN ({placeholders})",  # noqa: S608
+                    chunk,
+                )
+
+    @staticmethod
+    def _name_ids(cursor: sqlite3.Cursor, table: str, names: set) -> dict:
+        """Insert missing names into ``tags``/``creators``; map them to ids."""
+        names = list(names)
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {table} (name) VALUES (?)",  # noqa: S608
+            [(name,) for name in names],
+        )
+        ids = {}
+        for chunk in _chunks(names, KEY_CHUNK_SIZE):
+            placeholders = ",".join("?" * len(chunk))
+            ids.update(
+                (name, id_)
+                for id_, name in cursor.execute(
+                    f"SELECT id, name FROM {table} WHERE name IN ({placeholders})",  # noqa: S608
+                    chunk,
+                )
+            )
+        return ids
+
+    @classmethod
+    def _insert_items(cls, cursor: sqlite3.Cursor, records: list[dict]) -> None:
+        """Upsert items with their tags, creators and collections.
+
+        An item that is already stored keeps its ``embedded`` flag unless
+        its file changed (a new md5 or path), so metadata edits such as a
+        retagged parent do not trigger re-embedding.
+        """
+        cursor.executemany(
+            """
+            INSERT INTO items (key, title, url, path, parent_key, item, parent_item, embedded)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                title = excluded.title,
+                url = excluded.url,
+                path = excluded.path,
+                parent_key = excluded.parent_key,
+                item = excluded.item,
+                parent_item = excluded.parent_item,
+                embedded = CASE
+                    WHEN items.path IS excluded.path
+                        AND json_extract(items.item, '$.data.md5')
+                            IS json_extract(excluded.item, '$.data.md5')
+                    THEN items.embedded
+                    ELSE excluded.embedded
+                END
+            """,
+            [
+                (
+                    r["key"],
+                    r["title"],
+                    r["url"],
+                    r["path"],
+                    r["item"]["data"].get("parentItem"),
+                    json.dumps(r["item"]),
+                    json.dumps(r["parent_item"]),
+                    r.get("embedded", False),
+                )
+                for r in records
+            ],
+        )
+        cls._delete_links(cursor, [r["key"] for r in records])
+
+        tags = [
+            (r["key"], t) for r in records for t in set(filter(None, r["tags"]))
+        ]
+        creators = [(r["key"], c) for r in records for c in set(r["creators"])]
+        collections = [
+            (r["key"], c) for r in records for c in set(r["collections"])
+        ]
+        tag_ids = cls._name_ids(cursor, "tags", {tag for _, tag in tags})
+        cursor.executemany(
+            "INSERT INTO item_tags (item_key, tag_id) VALUES (?, ?)",
+            [(key, tag_ids[tag]) for key, tag in tags],
+        )
+        creator_ids = cls._name_ids(
+            cursor, "creators", {creator for _, creator in creators}
+        )
+        cursor.executemany(
+            "INSERT INTO item_creators (item_key, creator_id) VALUES (?, ?)",
+            [(key, creator_ids[creator]) for key, creator in creators],
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO collections (key) VALUES (?)",
+            [(key,) for key in {key for _, key in collections}],
+        )
+        cursor.executemany(
+            """
+            INSERT INTO item_collections (item_key, collection_key)
+            VALUES (?, ?)
+            """,
+            collections,
+        )
 
+    def populate_database(self, items: list) -> None:
         # Validate items
         for item in items:
             if not all(
@@ -52,6 +372,7 @@ class MetaStore:
                     "get_title",
                     "get_tags",
                     "get_creators",
+                    "get_collections",
                     "get_url",
                     "get_pdf_path",
                     "item",
@@ -62,54 +383,168 @@ class MetaStore:
                     f"Item {item} is missing one or more required attributes."
                 )
 
-        # Populate database
-        for item in tqdm(items):
-            cursor.execute(
-                """
-                INSERT OR REPLACE INTO library (key, title, tags, creators, url, path, item, parent_item)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    item.key,
-                    item.get_title(),
-                    ",".join(item.get_tags()),
-                    ",".join(item.get_creators()),
-                    item.get_url(),
-                    item.get_pdf_path(),
-                    sqlite3.Binary(pickle.dumps(item.item)),
-                    sqlite3.Binary(pickle.dumps(item.parent_item)),
-                ),
+        # Populate database, one transaction per batch
+        with tqdm(total=len(items)) as progress:
+            for batch in _chunks(items, WRITE_BATCH_SIZE):
+                records = [
+                    {
+                        "key": item.key,
+                        "title": item.get_title(),
+                        "url": item.get_url(),
+                        "path": item.get_pdf_path(),
+                        "item": item.item,
+                        "parent_item": item.parent_item,
+                        "tags": item.get_tags(),
+                        "creators": item.get_creators(),
+                        "collections": item.get_collections(),
+                    }
+                    for item in batch
+                ]
+                with self._lock, self._connect() as conn:
+                    self._insert_items(conn.cursor(), records)
+                progress.update(len(batch))
+
+    def set_collections(self, collections: list[dict]) -> None:
+        """Record collection names, as returned by ZoteroWrapper."""
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO collections (key, name) VALUES (?, ?)",
+                [(col["key"], col["name"]) for col in collections],
             )
 
-        conn.commit()
-        conn.close()
+    def _where(
+        self, where: Optional[dict], search: Optional[str]
+    ) -> tuple[list[str], list]:
+        """Translate filters to SQL conditions and their parameters."""
+        conditions, params = [], []
+        for name, value in (where or {}).items():
+            if name in FILTER_COLUMNS:
+                condition = f"items.{name} = ?"
+            elif name in LINK_FILTERS:
+                condition = f"items.key IN ({LINK_FILTERS[name]})"
+            else:
+                raise ValueError(
+                    f"Cannot filter on {name!r}. Must be one of: "
+                    f"{FILTER_COLUMNS + list(LINK_FILTERS)}"
+                )
+            conditions.append(condition)
+            params.extend([value] * condition.count("?"))
+        if search:
+            escaped = search.replace("\\", "\\\\")
+            escaped = escaped.replace("%", "\\%").replace("_", "\\_")
+            pattern = f"%{escaped}%"
+            conditions.append(SEARCH_CONDITION)
+            params.extend([pattern] * 3)
+        return conditions, params
+
+    def query(
+        self,
+        columns: Optional[list[str]] = None,
+        where: Optional[dict] = None,
+        search: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after: Optional[str] = None,
+    ) -> list[dict]:
+        """Read items ordered by key, selecting only ``columns``.
+
+        ``where`` maps item columns (e.g. ``embedded``) or ``tag``,
+        ``creator`` and ``collection`` to the value they must equal.
+        ``search`` keeps items whose title, key or a tag contains the text
+        (case-insensitively). Pages are taken with ``limit`` and either
+        ``offset`` or, cheaper for deep pages, ``after`` the last key seen.
+        """
+        columns = columns or list(QUERY_COLUMNS)
+        unknown = set(columns) - set(QUERY_COLUMNS)
+        if unknown:
+            raise ValueError(
+                f"Unknown columns {sorted(unknown)}. "
+                f"Must be among: {list(QUERY_COLUMNS)}"
+            )
+        conditions, params = self._where(where, search)
+        if after is not None:
+            conditions.append("items.key > ?")
+            params.append(after)
+        sql = "SELECT {} FROM items".format(  # noqa: S608
+            ", ".join(QUERY_COLUMNS[column] for column in columns)
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY items.key"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset])
+
+        with self._lock:
+            cursor = self._connect().cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        json_columns = [column in JSON_COLUMNS for column in columns]
+        return [
+            {
+                column: json.loads(value) if is_json else value
+                for column, value, is_json in zip(columns, row, json_columns)
+            }
+            for row in rows
+        ]
+
+    def iter_items(
+        self,
+        columns: Optional[list[str]] = None,
+        where: Optional[dict] = None,
+        search: Optional[str] = None,
+        page_size: int = 1000,
+    ) -> Iterator[dict]:
+        """Stream matching items, one keyset-paginated query per page."""
+        columns = columns or list(QUERY_COLUMNS)
+        # The key is needed to resume after the last row of a page
+        select = columns if "key" in columns else ["key", *columns]
+        after = None
+        while True:
+            page = self.query(
+                select, where, search, limit=page_size, after=after
+            )
+            for row in page:
+                yield {column: row[column] for column in columns}
+            if len(page) < page_size:
+                return
+            after = page[-1]["key"]
+
+    def count(
+        self, where: Optional[dict] = None, search: Optional[str] = None
+    ) -> int:
+        conditions, params = self._where(where, search)
+        sql = "SELECT COUNT(*) FROM items"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            cursor = self._connect().cursor()
+            cursor.execute(sql, params)
+            (count,) = cursor.fetchone()
+        return count
 
     def read_database(
         self, as_dataframe: bool = True
     ) -> Union[list | pd.DataFrame]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        results = list(self.iter_items())
+        return pd.DataFrame(results) if as_dataframe else results
 
-        cursor.execute("SELECT * FROM library")
-        rows = cursor.fetchall()
-
-        results = []
-        for row in rows:
-            item = {
-                "key": row[0],
-                "title": row[1],
-                "tags": row[2].split(","),
-                "creators": row[3].split(","),
-                "url": row[4],
-                "path": row[5],
-                "item": pickle.loads(row[6]),
-                "parent_item": pickle.loads(row[7]),
-                "embedded": row[8],
-            }
-            results.append(item)
+    def get_keys_by_tag(self, tag: str) -> list[str]:
+        return [row["key"] for row in self.query(["key"], where={"tag": tag})]
 
-        conn.close()
-        return pd.DataFrame(results) if as_dataframe else results
+    def get_keys_by_creator(self, creator: str) -> list[str]:
+        return [
+            row["key"]
+            for row in self.query(["key"], where={"creator": creator})
+        ]
+
+    def get_keys_by_collection(self, collection: str) -> list[str]:
+        """Keys of the items in a collection, given its key or name."""
+        return [
+            row["key"]
+            for row in self.query(["key"], where={"collection": collection})
+        ]
 
     def update_embedded_value_by_key(
         self, keys: Union[list[str] | str]
@@ -117,18 +552,48 @@ class MetaStore:
         if isinstance(keys, str):
             keys = [keys]
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._lock, self._connect() as conn:
+            for chunk in _chunks(list(keys), KEY_CHUNK_SIZE):
+                placeholders = ",".join("?" * len(chunk))
+                conn.execute(
+                    f"""
+                    UPDATE items
+                    SET embedded = 1
+                    WHERE key IN ({placeholders})
+                    """,  # noqa: S608
+                    chunk,
+                )
+
+    def delete_items_by_key(self, keys: Union[list[str] | str]) -> None:
+        if isinstance(keys, str):
+            keys = [keys]
 
-        for key in keys:
+        with self._lock, self._connect() as conn:
+            cursor = conn.cursor()
+            for chunk in _chunks(list(keys), KEY_CHUNK_SIZE):
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(
+                    f"DELETE FROM items WHERE key IN ({placeholders})",  # noqa: S608
+                    chunk,
+                )
+            self._delete_links(cursor, list(keys))
+
+    def get_library_version(self, collection_key: str) -> Union[int | None]:
+        with self._lock:
+            cursor = self._connect().cursor()
             cursor.execute(
+                "SELECT value FROM sync_state WHERE name = ?",
+                (f"library_version:{collection_key}",),
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    def set_library_version(self, collection_key: str, version: int) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
                 """
-                UPDATE library
-                SET embedded = 1
-                WHERE key = ?
+                INSERT OR REPLACE INTO sync_state (name, value)
+                VALUES (?, ?)
                 """,
-                (key,),
+                (f"library_version:{collection_key}", str(version)),
             )
-
-        conn.commit()
-        conn.close()
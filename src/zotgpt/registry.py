@@ -0,0 +1,189 @@
+"""Module for the registry of embedding providers and models.
+
+Each entry declares what the factories need to size batches and indexes.
+A model registered without a dimension has it measured with one embedding
+call the first time it is needed, and the result is cached on disk.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from langchain.embeddings.base import Embeddings
+
+DIMENSIONS_CACHE_PATH = os.getenv(
+    "ZOTGPT_DIMENSIONS_CACHE",
+    os.path.join(
+        os.path.expanduser("~"), ".cache", "zotgpt", "dimensions.json"
+    ),
+)
+
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class EmbeddingsSpec:
+    """Limits and properties of one embeddings model."""
+
+    provider: str
+    model: str
+    dimension: Optional[int] = None
+    max_batch_size: int = 512
+    max_batch_tokens: int = 100_000
+    # Longer texts are truncated by BatchedEmbeddings (API models) or by
+    # the model itself (sentence-transformers)
+    max_input_tokens: int = 8191
+    cost_per_million_tokens: float = 0.0
+    requires_api_key: bool = True
+    # Trained so that leading dimensions form a usable smaller embedding
+    matryoshka: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+
+EMBEDDINGS_REGISTRY: dict[tuple[str, str], EmbeddingsSpec] = {}
+
+
+def register_embeddings(spec: EmbeddingsSpec) -> EmbeddingsSpec:
+    """Add (or replace) a model in the registry."""
+    EMBEDDINGS_REGISTRY[spec.provider, spec.model] = spec
+    return spec
+
+
+def get_embeddings_spec(provider: str, model: str) -> EmbeddingsSpec:
+    """Return the registered spec of a model.
+
+    Local models need no registration: any sentence-transformers model gets
+    a default spec whose dimension is measured.
+    """
+    spec = EMBEDDINGS_REGISTRY.get((provider, model))
+    if spec is not None:
+        return spec
+    if provider == "local":
+        return EmbeddingsSpec(
+            provider="local",
+            model=model,
+            max_batch_size=256,
+            max_batch_tokens=1_000_000,
+            max_input_tokens=512,
+            requires_api_key=False,
+        )
+    models = registered_models(provider)
+    if not models:
+        raise ValueError(
+            f"embeddings_type must be one of {registered_providers()}"
+        )
+    raise ValueError(
+        f"Invalid model for {provider} embeddings. Must be one of: {models}"
+    )
+
+
+def registered_providers() -> list[str]:
+    providers = {provider for provider, _ in EMBEDDINGS_REGISTRY}
+    return sorted(providers | {"local"})
+
+
+def registered_models(provider: str) -> list[str]:
+    return [model for p, model in EMBEDDINGS_REGISTRY if p == provider]
+
+
+def _read_cache(path: str) -> dict:
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def resolve_dimension(
+    spec: EmbeddingsSpec,
+    embeddings: Embeddings,
+    cache_path: str = DIMENSIONS_CACHE_PATH,
+) -> int:
+    """Return the declared dimension, or measure it once and cache it."""
+    if spec.dimension:
+        return spec.dimension
+    with _cache_lock:
+        cache = _read_cache(cache_path)
+        if spec.key in cache:
+            return cache[spec.key]
+        dimension = getattr(embeddings, "dimension", None) or len(
+            embeddings.embed_query("dimension probe")
+        )
+        cache[spec.key] = dimension
+        path = Path(cache_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(cache, indent=2, sort_keys=True))
+    print(f"* Measured {dimension=} for {spec.key}")
+    return dimension
+
+
+for _spec in [
+    EmbeddingsSpec(
+        "openai",
+        "text-embedding-ada-002",
+        dimension=1536,
+        max_batch_size=2048,
+        max_batch_tokens=250_000,
+        cost_per_million_tokens=0.10,
+    ),
+    EmbeddingsSpec(
+        "openai",
+        "text-embedding-3-small",
+        dimension=1536,
+        max_batch_size=2048,
+        max_batch_tokens=250_000,
+        cost_per_million_tokens=0.02,
+        matryoshka=True,
+    ),
+    EmbeddingsSpec(
+        "openai",
+        "text-embedding-3-large",
+        dimension=3072,
+        max_batch_size=2048,
+        max_batch_tokens=250_000,
+        cost_per_million_tokens=0.13,
+        matryoshka=True,
+    ),
+    EmbeddingsSpec(
+        "cohere",
+        "embed-english-v3.0",
+        dimension=1024,
+        max_batch_size=96,
+        max_batch_tokens=50_000,
+        max_input_tokens=512,
+        cost_per_million_tokens=0.10,
+    ),
+    EmbeddingsSpec(
+        "cohere",
+        "embed-english-light-v3.0",
+        dimension=384,
+        max_batch_size=96,
+        max_batch_tokens=50_000,
+        max_input_tokens=512,
+        cost_per_million_tokens=0.10,
+    ),
+    EmbeddingsSpec(
+        "local",
+        "sentence-transformers/all-MiniLM-L6-v2",
+        dimension=384,
+        max_batch_size=256,
+        max_batch_tokens=1_000_000,
+        max_input_tokens=256,
+        requires_api_key=False,
+    ),
+    EmbeddingsSpec(
+        "local",
+        "BAAI/bge-small-en-v1.5",
+        dimension=384,
+        max_batch_size=256,
+        max_batch_tokens=1_000_000,
+        max_input_tokens=512,
+        requires_api_key=False,
+    ),
+]:
+    register_embeddings(_spec)
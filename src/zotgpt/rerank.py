@@ -0,0 +1,153 @@
+"""Module for reranking retrieved chunks with a local cross-encoder.
+
+Requires the optional ``sentence-transformers`` package, which is only
+imported when the first query is reranked.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from zotgpt.embedcache import text_hash
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """Rerank candidates with a CPU cross-encoder under a latency budget.
+
+    Scores are cached per (query, chunk hash), so follow-ups that retrieve
+    the same chunks only score the new ones. The cost per scored pair is
+    tracked as a moving average; when scoring all uncached pairs is
+    expected to exceed ``latency_budget`` seconds, only the longest prefix
+    of the candidates that fits is reranked and the rest follow in
+    retrieval order. That prefix always scores at least ``min_pairs``
+    pairs, so the estimate keeps being measured and recovers after a slow
+    spell. When ``max_in_flight`` reranks are already running, the
+    candidates are returned in retrieval order.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        top_n: int = 50,
+        batch_size: int = 32,
+        cache_size: int = 10_000,
+        latency_budget: Optional[float] = 1.0,
+        max_in_flight: int = 2,
+        min_pairs: int = 2,
+    ) -> None:
+        """Initialize reranker; the model is loaded lazily."""
+        self.model_name = model_name
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.latency_budget = latency_budget
+        self.min_pairs = min_pairs
+        self.seconds_per_pair: Optional[float] = None
+        self.stats = {
+            "reranked": 0,
+            "cached_pairs": 0,
+            "scored_pairs": 0,
+            "skipped_load": 0,
+            "truncated": 0,
+        }
+        self._model = None
+        self._cache: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise ImportError(
+                        "Reranking requires sentence-transformers: "
+                        "pip install sentence-transformers"
+                    ) from e
+                print(f"* Loading cross-encoder {self.model_name}")
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+
+    def _affordable_pairs(self) -> Optional[int]:
+        """Pairs that fit in the latency budget, or None if unbounded."""
+        if self.latency_budget is None or not self.seconds_per_pair:
+            return None
+        return max(
+            self.min_pairs, int(self.latency_budget / self.seconds_per_pair)
+        )
+
+    def _predict(self, query: str, texts: list[str]) -> list[float]:
+        model = self.model
+        start = time.perf_counter()
+        scores = model.predict(
+            [(query, text) for text in texts], batch_size=self.batch_size
+        )
+        per_pair = (time.perf_counter() - start) / len(texts)
+        with self._lock:
+            self.seconds_per_pair = (
+                per_pair
+                if self.seconds_per_pair is None
+                else 0.8 * self.seconds_per_pair + 0.2 * per_pair
+            )
+        return [float(score) for score in scores]
+
+    def rerank(
+        self, query: str, documents: list[Document], k: int
+    ) -> list[Document]:
+        """Return the ``k`` best documents, reranking as many as fit."""
+        if len(documents) <= 1:
+            return documents[:k]
+        if not self._in_flight.acquire(blocking=False):
+            self._count("skipped_load")
+            return documents[:k]
+        try:
+            keys = [(query, text_hash(doc.page_content)) for doc in documents]
+            with self._lock:
+                scores = {
+                    key: self._cache[key] for key in keys if key in self._cache
+                }
+                for key in scores:
+                    self._cache.move_to_end(key)
+            # Rerank the longest prefix whose uncached pairs fit the budget
+            affordable = self._affordable_pairs()
+            missing = {}
+            prefix = 0
+            for key, doc in zip(keys, documents):
+                if key not in scores and key not in missing:
+                    if affordable is not None and len(missing) == affordable:
+                        break
+                    missing[key] = doc.page_content
+                prefix += 1
+            if prefix < len(documents):
+                self._count("truncated")
+
+            if missing:
+                computed = dict(
+                    zip(missing, self._predict(query, list(missing.values())))
+                )
+                scores.update(computed)
+                with self._lock:
+                    self._cache.update(computed)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+            self._count("reranked")
+            self._count("cached_pairs", len(keys) - len(missing))
+            self._count("scored_pairs", len(missing))
+            order = sorted(
+                range(prefix), key=lambda i: scores[keys[i]], reverse=True
+            )
+            return [documents[i] for i in order[:k]] + documents[prefix:k]
+        finally:
+            self._in_flight.release()
@@ -1,16 +1,91 @@
+import asyncio
+import hashlib
 import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
 
 from dotenv import load_dotenv
 from langchain import hub
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.history_aware_retriever import (
-    create_history_aware_retriever,
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
 )
-from langchain.chains.retrieval import create_retrieval_chain
+from langchain_core.documents import Document
+from langchain_core.load import dumps, loads
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    PromptTemplate,
+)
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import (
+    ConfigurableField,
+    RunnableLambda,
+    RunnablePassthrough,
+)
+from langchain_core.vectorstores import VectorStore
 from langchain_openai import ChatOpenAI
+from pydantic import Field
+
+from zotgpt.lexical import BM25Index
+from zotgpt.rerank import CrossEncoderReranker
 
 load_dotenv()
 
+RETRIEVAL_QA_CHAT_PROMPT = "langchain-ai/retrieval-qa-chat"
+REPHRASE_PROMPT = "langchain-ai/chat-langchain-rephrase"
+
+PROMPTS_CACHE_DIR = os.getenv(
+    "ZOTGPT_PROMPTS_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "zotgpt", "prompts"),
+)
+
+# Local copies of the hub prompts, used when the hub cannot be reached
+FALLBACK_PROMPTS = {
+    RETRIEVAL_QA_CHAT_PROMPT: ChatPromptTemplate.from_messages([
+        (
+            "system",
+            "Answer any use questions based solely on the context below:"
+            "\n\n<context>\n{context}\n</context>",
+        ),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("human", "{input}"),
+    ]),
+    REPHRASE_PROMPT: PromptTemplate.from_template(
+        "Given the following conversation and a follow up question, "
+        "rephrase the follow up question to be a standalone question."
+        "\n\nChat History:\n{chat_history}\nFollow Up Input: {input}"
+        "\nStandalone Question:"
+    ),
+}
+
+
+def load_prompt(name: str, cache_dir: str = PROMPTS_CACHE_DIR):
+    """Load a hub prompt from the local cache, pulling it only once.
+
+    Falls back to the bundled copy when the prompt is neither cached nor
+    reachable on the hub.
+    """
+    path = Path(cache_dir) / f"{name.replace('/', '__')}.json"
+    if path.exists():
+        return loads(path.read_text())
+
+    try:
+        prompt = hub.pull(name)
+    except Exception as e:
+        print(f"Could not pull {name} ({e!r}), using bundled prompt")
+        return FALLBACK_PROMPTS[name]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(dumps(prompt))
+    return prompt
+
 
 def format_answer(result, wrap_text=True, unique_references=True):
     # Initialize response string
@@ -50,42 +125,282 @@ def format_answer(result, wrap_text=True, unique_references=True):
     return response
 
 
+# Words that point back into the conversation ("it", "that paper", ...)
+ANAPHORA = {
+    "it", "its", "they", "them", "their", "theirs", "this", "that", "these",
+    "those", "he", "him", "his", "she", "her", "hers", "above", "previous",
+    "earlier", "former", "latter", "same", "aforementioned", "else",
+}  # fmt: skip
+FOLLOW_UP_OPENERS = ("and ", "but ", "also ", "what about", "how about", "why")
+
+
+class RephrasePolicy:
+    """Decide whether a question needs an LLM rephrase before retrieval.
+
+    The rephrase call is skipped when there is no history and when the
+    question already looks self-contained; otherwise results are cached by
+    (history hash, question). Each decision is returned with its reason and
+    counted in ``stats``.
+    """
+
+    def __init__(self, llm, prompt, cache_size=256, min_words=6):
+        self.chain = prompt | llm | StrOutputParser()
+        self.cache_size = cache_size
+        self.min_words = min_words
+        self.cache = OrderedDict()
+        self.stats = {
+            "empty_history": 0,
+            "standalone": 0,
+            "cached": 0,
+            "llm": 0,
+        }
+        self._lock = threading.Lock()
+
+    def is_standalone(self, question):
+        text = question.strip().lower()
+        words = re.findall(r"[a-z0-9']+", text)
+        return (
+            len(words) >= self.min_words
+            and not text.startswith(FOLLOW_UP_OPENERS)
+            and not ANAPHORA.intersection(words)
+        )
+
+    @staticmethod
+    def cache_key(inputs):
+        history = repr(list(inputs["chat_history"])).encode("utf-8")
+        return hashlib.sha256(history).hexdigest(), inputs["input"]
+
+    def _decide(self, inputs):
+        if not inputs.get("chat_history"):
+            return {"question": inputs["input"], "reason": "empty_history"}
+        if self.is_standalone(inputs["input"]):
+            return {"question": inputs["input"], "reason": "standalone"}
+        with self._lock:
+            question = self.cache.get(self.cache_key(inputs))
+            if question is not None:
+                self.cache.move_to_end(self.cache_key(inputs))
+                return {"question": question, "reason": "cached"}
+        return None
+
+    def _record(self, inputs, decision):
+        with self._lock:
+            self.stats[decision["reason"]] += 1
+            if decision["reason"] == "llm":
+                self.cache[self.cache_key(inputs)] = decision["question"]
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return decision
+
+    def contextualize(self, inputs, config):
+        decision = self._decide(inputs) or {
+            "question": self.chain.invoke(inputs, config=config),
+            "reason": "llm",
+        }
+        return self._record(inputs, decision)
+
+    async def acontextualize(self, inputs, config):
+        decision = self._decide(inputs) or {
+            "question": await self.chain.ainvoke(inputs, config=config),
+            "reason": "llm",
+        }
+        return self._record(inputs, decision)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked document lists by summing 1 / (k + rank) per document.
+
+    Documents are matched across lists by item id and chunk text, since each
+    index assigns its own chunk ids.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = (doc.metadata.get("id"), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    return [
+        documents[key] for key in sorted(scores, key=scores.get, reverse=True)
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense + BM25 retriever fused with reciprocal rank fusion.
+
+    Both legs fetch ``fetch_multiplier * k`` candidates and run concurrently,
+    so latency is that of the slower leg. ``search_kwargs`` takes the same
+    ``k`` and ``{"id": {"$in": ids}}`` filter as a vector store retriever.
+    """
+
+    vector_store: VectorStore
+    lexical_index: BM25Index
+    search_kwargs: dict = Field(default_factory=dict)
+    fetch_multiplier: int = 4
+    rrf_k: int = 60
+
+    def _legs(self):
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = k * self.fetch_multiplier
+        where = self.search_kwargs.get("filter")
+        item_ids = where["id"]["$in"] if where else None
+        vector_kwargs = {"k": fetch_k}
+        if where:
+            vector_kwargs["filter"] = where
+        return k, vector_kwargs, {"k": fetch_k, "item_ids": item_ids}
+
+    def _fuse(self, k, dense, lexical):
+        lexical = [doc for doc, _ in lexical]
+        return reciprocal_rank_fusion([dense, lexical], k=self.rrf_k)[:k]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        k, vector_kwargs, lexical_kwargs = self._legs()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            lexical = pool.submit(
+                self.lexical_index.search, query, **lexical_kwargs
+            )
+            dense = self.vector_store.similarity_search(query, **vector_kwargs)
+            return self._fuse(k, dense, lexical.result())
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        k, vector_kwargs, lexical_kwargs = self._legs()
+        dense, lexical = await asyncio.gather(
+            self.vector_store.asimilarity_search(query, **vector_kwargs),
+            asyncio.to_thread(
+                self.lexical_index.search, query, **lexical_kwargs
+            ),
+        )
+        return self._fuse(k, dense, lexical)
+
+
 class Retriever:
-    def __init__(self, vector_store):
-        self.llm = self.make_llm()
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        llm: Optional[Any] = None,
+        lexical_index: Optional[BM25Index] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+    ):
+        """Retrieval chain; passing ``lexical_index`` enables hybrid search.
+
+        With a ``reranker``, ``reranker.top_n`` candidates are retrieved and
+        the best ``k`` of them after reranking are passed to the LLM.
+        """
+        self.llm = llm or self.make_llm()
         self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.reranker = reranker
+        self.rephrase_policy = RephrasePolicy(
+            self.llm, load_prompt(REPHRASE_PROMPT)
+        )
+        self.retrieval_chain = self.make_chain()
 
     def make_llm(self):
         return ChatOpenAI(
             verbose=True, temperature=0.0, model=os.environ["LLM_MODEL"]
         )
 
-    def retrieve(self, query, chat_history, k=5, ids=None):
-        search_kwargs = {"k": k}
-        if ids:
-            search_kwargs["filter"] = {"id": {"$in": ids}}
+    def make_retriever(self):
+        # search_kwargs (k, id filter) are supplied per call through the run
+        # config, so a single chain serves every query shape
+        if self.lexical_index is not None:
+            retriever = HybridRetriever(
+                vector_store=self.vector_store,
+                lexical_index=self.lexical_index,
+            )
+        else:
+            retriever = self.vector_store.as_retriever()
+        return retriever.configurable_fields(
+            search_kwargs=ConfigurableField(id="search_kwargs")
+        )
 
-        retrieval_qa_chat_prompt = hub.pull("langchain-ai/retrieval-qa-chat")
-        rephrase_prompt = hub.pull("langchain-ai/chat-langchain-rephrase")
+    def make_chain(self):
+        retrieval_qa_chat_prompt = load_prompt(RETRIEVAL_QA_CHAT_PROMPT)
 
         stuff_documents_chain = create_stuff_documents_chain(
             self.llm, retrieval_qa_chat_prompt
         )
 
-        history_aware_retriever = create_history_aware_retriever(
-            llm=self.llm,
-            retriever=self.vector_store.as_retriever(
-                search_kwargs=search_kwargs
-            ),
-            prompt=rephrase_prompt,
+        rephrase = RunnableLambda(
+            self.rephrase_policy.contextualize,
+            afunc=self.rephrase_policy.acontextualize,
+        )
+        retrieve_documents = (
+            RunnableLambda(lambda x: x["rephrase"]["question"])
+            | self.make_retriever()
         )
+        if self.reranker is not None:
+            retrieve_documents = RunnablePassthrough.assign(
+                candidates=retrieve_documents
+            ) | RunnableLambda(self.rerank, afunc=self.arerank)
+
+        chain = RunnablePassthrough.assign(rephrase=rephrase)
+        chain = chain.assign(context=retrieve_documents)
+        return chain.assign(answer=stuff_documents_chain)
+
+    def rerank(self, inputs, config):
+        return self.reranker.rerank(
+            inputs["rephrase"]["question"],
+            inputs["candidates"],
+            config.get("configurable", {}).get("k", 5),
+        )
+
+    async def arerank(self, inputs, config):
+        return await asyncio.to_thread(self.rerank, inputs, config)
+
+    def make_config(self, k=5, ids=None):
+        # The final k travels in the config for the rerank step, while the
+        # retriever fetches the larger candidate set
+        fetch_k = max(k, self.reranker.top_n) if self.reranker else k
+        search_kwargs = {"k": fetch_k}
+        if ids:
+            search_kwargs["filter"] = {"id": {"$in": ids}}
+        return {"configurable": {"search_kwargs": search_kwargs, "k": k}}
 
-        retrieval_chain = create_retrieval_chain(
-            retriever=history_aware_retriever,
-            combine_docs_chain=stuff_documents_chain,
+    def retrieve(self, query, chat_history, k=5, ids=None):
+        response = self.retrieval_chain.invoke(
+            input={"input": query, "chat_history": chat_history},
+            config=self.make_config(k, ids),
         )
+        return response
 
-        response = retrieval_chain.invoke(
-            input={"input": query, "chat_history": chat_history}
+    def stream(self, query, chat_history, k=5, ids=None):
+        """Stream a response for a query.
+
+        Yields ``{"rephrase": decision}`` and ``{"context": documents}`` as
+        soon as they are known, then ``{"answer": token}`` chunks as the LLM
+        produces them.
+        """
+        for chunk in self.retrieval_chain.stream(
+            input={"input": query, "chat_history": chat_history},
+            config=self.make_config(k, ids),
+        ):
+            if "rephrase" in chunk:
+                yield {"rephrase": chunk["rephrase"]}
+            if "context" in chunk:
+                yield {"context": chunk["context"]}
+            if "answer" in chunk:
+                yield {"answer": chunk["answer"]}
+
+    async def aretrieve(self, query, chat_history, k=5, ids=None):
+        response = await self.retrieval_chain.ainvoke(
+            input={"input": query, "chat_history": chat_history},
+            config=self.make_config(k, ids),
         )
         return response
+
+    async def astream(self, query, chat_history, k=5, ids=None):
+        """Async counterpart of ``stream``."""
+        async for chunk in self.retrieval_chain.astream(
+            input={"input": query, "chat_history": chat_history},
+            config=self.make_config(k, ids),
+        ):
+            if "rephrase" in chunk:
+                yield {"rephrase": chunk["rephrase"]}
+            if "context" in chunk:
+                yield {"context": chunk["context"]}
+            if "answer" in chunk:
+                yield {"answer": chunk["answer"]}
@@ -0,0 +1,116 @@
+"""Module exposing the Retriever over a local HTTP API.
+
+Requests are served through the Retriever's async interface, so a single
+process holds many in-flight questions while they wait on the LLM.
+
+    uv run python -m zotgpt.server
+"""
+
+import json
+import os
+from typing import Optional
+
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from langchain_core.documents import Document
+from pydantic import BaseModel
+
+from zotgpt.embed import EmbeddingsFactory
+from zotgpt.lexical import BM25Index
+from zotgpt.rerank import CrossEncoderReranker
+from zotgpt.retrieval import Retriever
+from zotgpt.vectorstore import VectorStoreFactory, store_options_from_env
+
+
+class Question(BaseModel):
+    query: str
+    chat_history: list[tuple[str, str]] = []
+    k: int = 5
+    ids: Optional[list[str]] = None
+
+
+def serialize_documents(documents: list[Document]) -> list[dict]:
+    return [
+        {"page_content": doc.page_content, "metadata": doc.metadata}
+        for doc in documents
+    ]
+
+
+def create_app(retriever: Retriever) -> FastAPI:
+    app = FastAPI(title="ZotGPT")
+
+    @app.post("/retrieve")
+    async def retrieve(question: Question) -> dict:
+        response = await retriever.aretrieve(
+            question.query,
+            question.chat_history,
+            k=question.k,
+            ids=question.ids,
+        )
+        return {
+            "answer": response["answer"],
+            "context": serialize_documents(response["context"]),
+        }
+
+    @app.post("/stream")
+    async def stream(question: Question) -> StreamingResponse:
+        async def chunks():
+            async for chunk in retriever.astream(
+                question.query,
+                question.chat_history,
+                k=question.k,
+                ids=question.ids,
+            ):
+                if "context" in chunk:
+                    chunk = {"context": serialize_documents(chunk["context"])}
+                yield json.dumps(chunk) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    load_dotenv()
+
+    dimensions = os.getenv("EMBEDDINGS_DIMENSIONS")
+    ef = EmbeddingsFactory(
+        embeddings_type=os.environ["EMBEDDINGS_TYPE"],
+        embeddings_model=os.environ["EMBEDDINGS_MODEL"],
+        cache_path=os.getenv("EMBEDDINGS_CACHE_PATH"),
+        dimensions=int(dimensions) if dimensions else None,
+    )
+    vsf = VectorStoreFactory(
+        embeddings=ef.create(),
+        store_type=os.environ["VECTOR_STORE_TYPE"],
+        collection_name=os.environ["VECTOR_STORE_INDEX"],
+        persist_directory=os.getenv("VECTOR_STORE_DIRECTORY"),
+        store_options=store_options_from_env(),
+    )
+    lexical_index_path = os.getenv("LEXICAL_INDEX_PATH")
+    app = create_app(
+        Retriever(
+            vector_store=vsf.create(),
+            lexical_index=BM25Index(lexical_index_path)
+            if lexical_index_path
+            else None,
+            reranker=CrossEncoderReranker(
+                os.environ["RERANK_MODEL"],
+                top_n=int(os.getenv("RERANK_TOP_N", "50")),
+                latency_budget=float(os.getenv("RERANK_BUDGET", "1.0")),
+            )
+            if os.getenv("RERANK_MODEL")
+            else None,
+        )
+    )
+    uvicorn.run(
+        app,
+        host=os.getenv("ZOTGPT_HOST", "127.0.0.1"),
+        port=int(os.getenv("ZOTGPT_PORT", "8000")),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Module for keeping the MetaStore in sync with a Zotero collection."""
+
+import os
+from typing import Optional
+
+from langchain_core.vectorstores import VectorStore
+
+from zotgpt.lexical import BM25Index
+from zotgpt.metastore import MetaStore
+from zotgpt.vectorstore import delete_item_documents
+from zotgpt.zotero import ZoteroItem, ZoteroWrapper, is_pdf_item
+
+# Item types whose changes never affect a PDF row on their own
+NON_PARENT_ITEM_TYPES = ["attachment", "note", "annotation"]
+
+
+def full_sync(
+    zotero_wrapper: ZoteroWrapper, metastore: MetaStore, collection_key: str
+) -> dict:
+    """Rebuild the MetaStore from scratch for the given collection."""
+    version = zotero_wrapper.get_library_version()
+
+    metastore.delete_database_and_folder()
+    metastore.create_database()
+
+    pdf_items = zotero_wrapper.get_pdf_items_from_collection_key(collection_key)
+    pdf_zot_items = ZoteroItem.from_items(zotero_wrapper.zot, pdf_items)
+    metastore.populate_database(pdf_zot_items)
+    metastore.set_collections(zotero_wrapper.get_collections())
+    metastore.set_library_version(collection_key, version)
+
+    return {"version": version, "upserted": len(pdf_zot_items), "deleted": 0}
+
+
+def incremental_sync(
+    zotero_wrapper: ZoteroWrapper,
+    metastore: MetaStore,
+    collection_key: str,
+    vector_store: Optional[VectorStore] = None,
+    lexical_index: Optional[BM25Index] = None,
+) -> dict:
+    """Apply only the changes made since the last synced library version.
+
+    Falls back to a full sync when no version has been recorded yet. Changed
+    attachments are upserted, and attachments of changed parents are
+    re-fetched so that title/tag/creator edits reach their rows. Deleted
+    items are also removed from ``vector_store`` and ``lexical_index`` when
+    given. Items removed from the collection without being deleted are not
+    detected.
+    """
+    metastore.create_database()
+    last_version = metastore.get_library_version(collection_key)
+    if last_version is None:
+        print(f"No synced version for {collection_key=}, running full sync")
+        return full_sync(zotero_wrapper, metastore, collection_key)
+
+    # Read the version before fetching so changes made meanwhile are
+    # picked up by the next run rather than lost
+    version = zotero_wrapper.get_library_version()
+    if version == last_version:
+        print(f"Library is up to date at {version=}")
+        return {"version": version, "upserted": 0, "deleted": 0}
+
+    changed_items = zotero_wrapper.get_items_from_collection_key(
+        collection_key, since=last_version
+    )
+    pdf_items = {
+        item["data"]["key"]: item for item in changed_items if is_pdf_item(item)
+    }
+    changed_parent_keys = [
+        item["data"]["key"]
+        for item in changed_items
+        if item["data"].get("itemType") not in NON_PARENT_ITEM_TYPES
+    ]
+    for item in zotero_wrapper.get_pdf_items_from_parent_keys(
+        changed_parent_keys
+    ):
+        pdf_items.setdefault(item["data"]["key"], item)
+
+    pdf_zot_items = ZoteroItem.from_items(
+        zotero_wrapper.zot, list(pdf_items.values())
+    )
+    metastore.populate_database(pdf_zot_items)
+
+    deleted_keys = zotero_wrapper.get_deleted_item_keys(since=last_version)
+    metastore.delete_items_by_key(deleted_keys)
+    if vector_store is not None:
+        delete_item_documents(vector_store, deleted_keys)
+    if lexical_index is not None:
+        lexical_index.delete(deleted_keys)
+    metastore.set_collections(zotero_wrapper.get_collections())
+
+    metastore.set_library_version(collection_key, version)
+    print(
+        f"Synced {last_version=} -> {version=}: "
+        f"{len(pdf_zot_items)} upserted, {len(deleted_keys)} deleted keys"
+    )
+    return {
+        "version": version,
+        "upserted": len(pdf_zot_items),
+        "deleted": len(deleted_keys),
+    }
+
+
+def sync_library(
+    zotero_wrapper: ZoteroWrapper,
+    metastore: MetaStore,
+    collection_key: Optional[str] = None,
+    full: bool = False,
+    vector_store: Optional[VectorStore] = None,
+    lexical_index: Optional[BM25Index] = None,
+) -> dict:
+    collection_key = collection_key or os.environ["ZOTERO_DEFAULT_COLLECTION"]
+    if full:
+        return full_sync(zotero_wrapper, metastore, collection_key)
+    return incremental_sync(
+        zotero_wrapper,
+        metastore,
+        collection_key,
+        vector_store=vector_store,
+        lexical_index=lexical_index,
+    )
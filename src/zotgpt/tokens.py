@@ -0,0 +1,32 @@
+"""Module for counting tokens, shared by chat history and batch embedding."""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate ~4 characters per token."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to at most ``max_tokens`` tokens, as counted above."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max(0, max_tokens - 1) * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
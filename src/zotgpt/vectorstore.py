@@ -1,15 +1,19 @@
-"""Module for managing vector stores (Chroma and Pinecone) for document embeddings."""
+"""Module for managing vector stores (Chroma, Pinecone and local) for document embeddings."""
 
 import os
+import uuid
 from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
 from langchain.embeddings.base import Embeddings
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStore
 from langchain_pinecone import PineconeVectorStore
 
+from zotgpt.localstore import LocalVectorStore
+
 
 class VectorStoreFactory:
     """Factory class for creating vector store instances."""
@@ -20,12 +24,19 @@ class VectorStoreFactory:
         embeddings: Embeddings,
         collection_name: str,
         persist_directory: Optional[str] = None,
+        store_options: Optional[dict] = None,
     ) -> None:
-        """Initialize factory with store configuration."""
+        """Initialize factory with store configuration.
+
+        ``store_options`` are passed to the local store, e.g. ``dtype``,
+        ``index_type``, ``nlist``, ``nprobe``, ``projection`` and
+        ``quantization``.
+        """
         self.store_type = store_type
         self.embeddings = embeddings
         self.collection_name = collection_name
         self.persist_directory = persist_directory
+        self.store_options = store_options or {}
         # Validate inputs immediately to fail fast
         self.validate_inputs()
 
@@ -37,17 +48,17 @@ class VectorStoreFactory:
         """Validate initialization parameters and environment variables."""
         load_dotenv()
 
-        valid_store_types = ["chroma", "pinecone"]
+        valid_store_types = ["chroma", "pinecone", "local"]
         if self.store_type not in valid_store_types:
             raise ValueError(f"store_type must be one of {valid_store_types}")
 
         if not self.collection_name:
             raise ValueError("collection_name must be provided")
 
-        if self.store_type == "chroma":
+        if self.store_type in ["chroma", "local"]:
             if not self.persist_directory:
                 raise ValueError(
-                    "persist_directory must be provided for Chroma"
+                    f"persist_directory must be provided for {self.store_type}"
                 )
 
         elif self.store_type == "pinecone":
@@ -79,20 +90,9 @@ class VectorStoreFactory:
                 environment=os.getenv("PINECONE_ENVIRONMENT", "gcp-starter"),
             )
 
-            # Get embedding dimension if available
-            dimension = getattr(self.embeddings, "dimension", None)
-            if (
-                not dimension
-                and self.collection_name not in pc.list_indexes().names()
-            ):
-                raise ValueError(
-                    "Embedding dimension is required for creating new "
-                    "Pinecone index. Use EmbeddingsFactory to create "
-                    "embeddings with dimension info."
-                )
-
             # Check if index exists, create if it doesn't
             if self.collection_name not in pc.list_indexes().names():
+                dimension = embeddings_dimension(self.embeddings)
                 print(f"Creating Pinecone index: {self.collection_name}")
                 pc.create_index(
                     name=self.collection_name,
@@ -108,4 +108,195 @@ class VectorStoreFactory:
                 index_name=self.collection_name,
             )
 
+        elif self.store_type == "local":
+            return LocalVectorStore(
+                embedding_function=self.embeddings,
+                path=os.path.join(self.persist_directory, self.collection_name),
+                **self.store_options,
+            )
+
         raise ValueError(f"Unsupported store type: {self.store_type}")
+
+
+# Environment variables read by store_options_from_env, and the local
+# store option each one sets
+STORE_OPTIONS_ENV = {
+    "VECTOR_STORE_DTYPE": ("dtype", str),
+    "VECTOR_STORE_INDEX_TYPE": ("index_type", str),
+    "VECTOR_STORE_NLIST": ("nlist", int),
+    "VECTOR_STORE_NPROBE": ("nprobe", int),
+    "VECTOR_STORE_PROJECTION": ("projection", str),
+    "VECTOR_STORE_PROJECTION_DIM": ("projection_dim", int),
+    "VECTOR_STORE_QUANTIZATION": ("quantization", str),
+    "VECTOR_STORE_RESCORE_FACTOR": ("rescore_factor", int),
+}
+
+
+def store_options_from_env() -> dict:
+    """Local store options set in the environment (``VECTOR_STORE_*``).
+
+    Compression options only take effect when a store is created; see
+    ``zotgpt.compress`` for what they cost.
+    """
+    options = {}
+    for name, (option, parse) in STORE_OPTIONS_ENV.items():
+        value = os.getenv(name)
+        if value:
+            options[option] = parse(value)
+    return options
+
+
+def embeddings_dimension(embeddings: Embeddings) -> int:
+    """Return the dimension of an embeddings instance.
+
+    Embeddings from EmbeddingsFactory report it through their wrappers;
+    anything else is measured with a single query embedding.
+    """
+    dimension = getattr(embeddings, "dimension", None)
+    if dimension:
+        return dimension
+    return len(embeddings.embed_query("dimension probe"))
+
+
+# Vectors per Pinecone upsert request, below its 2MB request limit
+PINECONE_UPSERT_BATCH_SIZE = 100
+
+# Ids per Pinecone delete request, the API's limit
+PINECONE_DELETE_BATCH_SIZE = 1000
+
+
+def add_embedded_documents(
+    vector_store: VectorStore,
+    documents: list[Document],
+    embeddings: list[list[float]],
+    ids: Optional[list[str]] = None,
+) -> list[str]:
+    """Add documents whose embeddings were already computed upstream.
+
+    The vectors are written as they are to the local store, Chroma and
+    Pinecone; documents with existing ``ids`` are replaced. Any other store
+    is refused, since adding through it would embed every chunk again.
+    """
+    texts = [doc.page_content for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    ids = ids or [str(uuid.uuid4()) for _ in documents]
+
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.add_embeddings(
+            text_embeddings=list(zip(texts, embeddings)),
+            metadatas=metadatas,
+            ids=ids,
+        )
+
+    if isinstance(vector_store, Chroma):
+        vector_store._collection.upsert(
+            ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts
+        )
+        return ids
+
+    if isinstance(vector_store, PineconeVectorStore):
+        vectors = [
+            (id_, vector, {**metadata, vector_store._text_key: text})
+            for id_, vector, metadata, text in zip(
+                ids, embeddings, metadatas, texts
+            )
+        ]
+        for i in range(0, len(vectors), PINECONE_UPSERT_BATCH_SIZE):
+            vector_store.index.upsert(
+                vectors=vectors[i : i + PINECONE_UPSERT_BATCH_SIZE],
+                namespace=vector_store._namespace,
+            )
+        return ids
+
+    raise ValueError(
+        f"Cannot add precomputed embeddings to {type(vector_store).__name__}"
+    )
+
+
+def replace_item_documents(
+    vector_store: VectorStore,
+    item_key: str,
+    documents: list[Document],
+    embeddings: list[list[float]],
+) -> list[str]:
+    """Replace the chunks of a Zotero item with freshly embedded ones.
+
+    The item's old chunks are deleted first, and the new ones get the ids
+    ``{item_key}:{i}``, so re-ingesting an item never duplicates chunks.
+    """
+    delete_item_documents(vector_store, [item_key])
+    if not documents:
+        return []
+    return add_embedded_documents(
+        vector_store,
+        documents,
+        embeddings,
+        ids=[f"{item_key}:{i}" for i in range(len(documents))],
+    )
+
+
+def delete_item_documents(
+    vector_store: VectorStore, item_keys: list[str]
+) -> None:
+    """Delete every chunk whose ``id`` metadata is one of ``item_keys``.
+
+    Pinecone serverless and starter indexes cannot delete by metadata, so
+    there the chunks are found by their ``{item_key}:`` id prefix instead.
+    """
+    item_keys = list(item_keys)
+    if not item_keys:
+        return
+
+    if isinstance(vector_store, LocalVectorStore):
+        vector_store.delete(item_ids=item_keys)
+        return
+    if isinstance(vector_store, Chroma):
+        vector_store.delete(where={"id": {"$in": item_keys}})
+        return
+    if isinstance(vector_store, PineconeVectorStore):
+        namespace = vector_store._namespace
+        ids = [
+            id_
+            for key in item_keys
+            for page in vector_store.index.list(
+                prefix=f"{key}:", namespace=namespace
+            )
+            for id_ in page
+        ]
+        for i in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+            vector_store.index.delete(
+                ids=ids[i : i + PINECONE_DELETE_BATCH_SIZE], namespace=namespace
+            )
+        return
+    raise ValueError(
+        f"Cannot delete by item key from {type(vector_store).__name__}"
+    )
+
+
+def get_item_documents(
+    vector_store: VectorStore, item_keys: list[str]
+) -> list[Document]:
+    """Read back the stored chunks whose ``id`` metadata is in ``item_keys``.
+
+    Only the local store and Chroma can list documents by metadata.
+    """
+    item_keys = list(item_keys)
+    if not item_keys:
+        return []
+
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.get_item_documents(item_keys)
+    if isinstance(vector_store, Chroma):
+        result = vector_store.get(
+            where={"id": {"$in": item_keys}},
+            include=["documents", "metadatas"],
+        )
+        return [
+            Document(id=id_, page_content=text, metadata=metadata)
+            for id_, text, metadata in zip(
+                result["ids"], result["documents"], result["metadatas"]
+            )
+        ]
+    raise ValueError(
+        f"Cannot list documents by item key in {type(vector_store).__name__}"
+    )
@@ -1,8 +1,15 @@
+import copy
 import os
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 
 from dotenv import load_dotenv
 from pyzotero import zotero
 
+# The Zotero API accepts at most 50 keys per multi-item request
+ITEM_KEY_CHUNK_SIZE = 50
+
 
 def make_zotero_client():
     load_dotenv()
@@ -12,6 +19,63 @@ def make_zotero_client():
     return zotero.Zotero(library_id, library_type, api_key)
 
 
+def is_pdf_item(item: dict) -> bool:
+    """Client-side PDF check, applied after any server-side filtering."""
+    return (
+        item.get("data", {}).get("contentType") == "application/pdf"
+        or item.get("contentType") == "application/pdf"
+        or item.get("links", {}).get("enclosure", {}).get("type")
+        == "application/pdf"
+        or item.get("attachment", {}).get("attachmentType") == "application/pdf"
+    )
+
+
+def _fork_client(zotero_client):
+    # pyzotero keeps the last request/url params on the instance, so every
+    # concurrent call gets its own shallow copy sharing the HTTP session
+    return copy.copy(zotero_client)
+
+
+def _fetch_items_by_key(zotero_client, keys: list) -> list:
+    return _fork_client(zotero_client).items(
+        itemKey=",".join(keys), limit=len(keys)
+    )
+
+
+def fetch_items_by_keys(
+    zotero_client, keys: list, max_workers: int = 8
+) -> dict:
+    """Fetch items in chunks of 50 keys, issuing the chunks concurrently."""
+    keys = list(dict.fromkeys(key for key in keys if key))
+    chunks = [
+        keys[i : i + ITEM_KEY_CHUNK_SIZE]
+        for i in range(0, len(keys), ITEM_KEY_CHUNK_SIZE)
+    ]
+    items = {}
+    if not chunks:
+        return items
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(
+            lambda chunk: _fetch_items_by_key(zotero_client, chunk), chunks
+        ):
+            for item in result:
+                items[item["data"]["key"]] = item
+    return items
+
+
+def creator_names(creators: list) -> list:
+    """Display names of a Zotero creators list, without duplicates."""
+    names = []
+    for x in creators:
+        if "name" in x:
+            names.append(x["name"])
+        elif ("lastName" in x) and ("firstName" in x):
+            names.append(" ".join([x["firstName"], x["lastName"]]))
+        else:
+            continue
+    return list(set(names))
+
+
 class ZoteroWrapper:
     def __init__(self, zotero_client=None):
         self.zot = zotero_client
@@ -34,58 +98,143 @@ class ZoteroWrapper:
 
     def get_pdf_item_from_item_key(self, item_key: str) -> dict:
         item = self.zot.item(item_key)
-        if (
-            item.get("contentType") == "application/pdf"
-            or item.get("links", {}).get("enclosure", {}).get("type")
-            == "application/pdf"
-            or item.get("attachment", {}).get("attachmentType")
-            == "application/pdf"
-        ):
+        if is_pdf_item(item):
             return item
         else:
             raise ValueError(f"Item with key {item_key} is not a PDF")
 
-    def get_pdf_items_from_collection_key(self, collection_key: str) -> list:
-        start = 0
-        limit = 100
-        iteration = 1
-        pdf_items = []
-
-        while True:
-            print(
-                f"{iteration=} - querying {collection_key=} items w/ pagination : {start=} - end {start + limit}"
-            )
-            items = self.zot.collection_items(
-                collection_key, start=start, limit=limit
+    def get_library_version(self) -> int:
+        return self.zot.last_modified_version()
+
+    def get_deleted_item_keys(self, since: int) -> list:
+        return self.zot.deleted(since=since).get("items", [])
+
+    def _get_collection_page(
+        self, collection_key: str, start: int, limit: int, params: dict
+    ) -> list:
+        print(
+            f"querying {collection_key=} items w/ pagination : {start=} - end {start + limit}"
+        )
+        return _fork_client(self.zot).collection_items(
+            collection_key, start=start, limit=limit, **params
+        )
+
+    def iter_items_from_collection_key(
+        self,
+        collection_key: str,
+        since: Optional[int] = None,
+        item_type: Optional[str] = None,
+        limit: int = 100,
+        max_workers: int = 4,
+    ) -> Iterator[dict]:
+        """Yield collection items page by page as the pages arrive.
+
+        The first page reports Total-Results, after which the remaining
+        offsets are requested concurrently; pages are yielded in completion
+        order rather than offset order. All requests are submitted before
+        the first page is yielded, so a slow consumer does not hold up the
+        prefetching.
+        """
+        params = {}
+        if since is not None:
+            params["since"] = since
+        if item_type is not None:
+            params["itemType"] = item_type
+        items = self.zot.collection_items(
+            collection_key, start=0, limit=limit, **params
+        )
+        total = getattr(self.zot.request, "headers", {}).get("Total-Results")
+        print(f"retrieved {len(items)} items, {total=}")
+
+        if total is None:
+            # No total to plan with: walk the pages until a short one
+            yield from items
+            start = limit
+            while len(items) == limit:
+                items = self._get_collection_page(
+                    collection_key, start, limit, params
+                )
+                yield from items
+                start += limit
+            return
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = [
+                executor.submit(
+                    self._get_collection_page,
+                    collection_key,
+                    start,
+                    limit,
+                    params,
+                )
+                for start in range(limit, int(total), limit)
+            ]
+            yield from items
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        print(f"Finished retrieving {total} items from {collection_key}")
+
+    def get_items_from_collection_key(
+        self, collection_key: str, since: Optional[int] = None
+    ) -> list:
+        return list(
+            self.iter_items_from_collection_key(collection_key, since=since)
+        )
+
+    def iter_pdf_items_from_collection_key(
+        self,
+        collection_key: str,
+        since: Optional[int] = None,
+        attachments_only: bool = True,
+        max_workers: int = 4,
+    ) -> Iterator[dict]:
+        """Yield the PDF attachments of a collection.
+
+        With attachments_only, Zotero is asked for attachments only so that
+        notes, parents and snapshots never leave the server. The API cannot
+        filter on content type, so is_pdf_item still drops non-PDF files.
+        """
+        for item in self.iter_items_from_collection_key(
+            collection_key,
+            since=since,
+            item_type="attachment" if attachments_only else None,
+            max_workers=max_workers,
+        ):
+            if is_pdf_item(item):
+                yield item
+
+    def get_pdf_items_from_collection_key(
+        self,
+        collection_key: str,
+        since: Optional[int] = None,
+        attachments_only: bool = True,
+    ) -> list:
+        pdf_items = list(
+            self.iter_pdf_items_from_collection_key(
+                collection_key, since=since, attachments_only=attachments_only
             )
-            print(f"{iteration=} - retrieved {len(items)} items")
-            iteration += 1
-
-            if not items:
-                print(f"Finished retrieving items from {collection_key}")
-                print(f"Total items retrieved: {len(pdf_items)}")
-                break
-
-            for item in items:
-                if (
-                    item.get("contentType") == "application/pdf"
-                    or item.get("links", {}).get("enclosure", {}).get("type")
-                    == "application/pdf"
-                    or item.get("attachment", {}).get("attachmentType")
-                    == "application/pdf"
-                ):
-                    pdf_items.append(item)
-
-            print(f"end {iteration=} contains {len(pdf_items)} PDF items\n")
-            start += limit
+        )
+        print(f"{collection_key=} contains {len(pdf_items)} PDF items\n")
+        return pdf_items
 
+    def get_pdf_items_from_parent_keys(self, parent_keys: list) -> list:
+        pdf_items = []
+        for parent_key in parent_keys:
+            pdf_items.extend(
+                item
+                for item in self.zot.children(parent_key, itemType="attachment")
+                if is_pdf_item(item)
+            )
         return pdf_items
 
 
 class ZoteroItem:
     __ROOT_PATH__ = os.environ.get("ZOTERO_PDF_ROOT_PATH", "pdfs")
 
-    def __init__(self, zotero_client, item):
+    def __init__(self, zotero_client, item, parent_item: Optional[dict] = None):
         self.zotero_client = zotero_client
         self.item: dict = item
         self.key: str = item["data"]["key"]
@@ -97,10 +246,11 @@ class ZoteroItem:
         self.date_added: str = item["data"]["dateAdded"]
         self.date_modified: str = item["data"]["dateModified"]
         self.has_parent: bool = False
-        self.parent_item: dict = None
+        self.parent_item: dict = parent_item
         self.parent_item_type: str = None
         self.parent_item_date: str = None
         self.parent_item_title: str = None
+        self.parent_item_url: str = None
         self.parent_item_abstract: str = None
         self.parent_item_doi: str = None
         self.parent_item_creators: list = None
@@ -109,15 +259,40 @@ class ZoteroItem:
         self.__post_init__()
 
     def __post_init__(self):
-        self._get_parent_item()
+        if self.parent_item is None:
+            self._get_parent_item()
+        else:
+            self._set_parent_item(self.parent_item)
+
+    @classmethod
+    def from_items(
+        cls, zotero_client, items: list, max_workers: int = 8
+    ) -> list:
+        """Build ZoteroItems in bulk, resolving each distinct parent once.
+
+        Parents are fetched through the multi-key endpoint in chunks of 50,
+        with the chunks requested concurrently. Items whose parent is not
+        returned fall back to the per-item lookup.
+        """
+        parent_keys = [item["data"].get("parentItem") for item in items]
+        parents = fetch_items_by_keys(
+            zotero_client, parent_keys, max_workers=max_workers
+        )
+        return [
+            cls(zotero_client, item, parents.get(parent_key))
+            for item, parent_key in zip(items, parent_keys)
+        ]
 
     def _get_parent_item(self):
         try:
-            self.parent_item = self.zotero_client.item(self.parent)
-            self.has_parent = True
+            parent_item = self.zotero_client.item(self.parent)
         except Exception:
-            self.parent_item = None
-            self.has_parent = False
+            parent_item = None
+        self._set_parent_item(parent_item)
+
+    def _set_parent_item(self, parent_item: dict):
+        self.parent_item = parent_item
+        self.has_parent = parent_item is not None
         if self.has_parent:
             self.parent_item_type = self.parent_item["data"]["itemType"]
             self.parent_item_date = self.parent_item["data"]["date"]
@@ -132,19 +307,14 @@ class ZoteroItem:
             ]
 
     def get_creators(self) -> list:
-        creators = []
-        for x in self.parent_item_creators:
-            if "name" in x:
-                creators.append(x["name"])
-            elif ("lastName" in x) and ("firstName" in x):
-                creators.append(" ".join([x["firstName"], x["lastName"]]))
-            else:
-                continue
-        return list(set(creators))
+        return creator_names(self.parent_item_creators)
 
     def get_tags(self) -> list:
         return [tag.get("tag") for tag in self.parent_item_tags]
 
+    def get_collections(self) -> list:
+        return self.parent_item_collections or []
+
     def get_title(self) -> str:
         return self.parent_item_title if self.parent_item_title else self.title
 
@@ -0,0 +1,164 @@
+import copy
+import os
+from pathlib import Path
+
+import pytest
+
+# The PDF worker processes are forked from a fresh forkserver process, which
+# only sees the package through the environment, not pytest's pythonpath
+SRC_PATH = str(Path(__file__).parents[1] / "src")
+os.environ["PYTHONPATH"] = os.pathsep.join(
+    filter(None, [SRC_PATH, os.environ.get("PYTHONPATH")])
+)
+
+
+def make_parent(key: str, **data) -> dict:
+    return {
+        "key": key,
+        "data": {
+            "key": key,
+            "version": 1,
+            "itemType": "journalArticle",
+            "date": "2024",
+            "title": f"Paper {key}",
+            "url": f"https://example.org/{key}",
+            "abstractNote": "",
+            "DOI": "",
+            "creators": [{"firstName": "Ada", "lastName": "Lovelace"}],
+            "tags": [{"tag": "maths"}],
+            "collections": ["COL1"],
+            **data,
+        },
+    }
+
+
+def make_attachment(key: str, parent_key: str, **data) -> dict:
+    return {
+        "key": key,
+        "data": {
+            "key": key,
+            "version": 1,
+            "itemType": "attachment",
+            "parentItem": parent_key,
+            "title": "Full Text PDF",
+            "filename": f"{key}.pdf",
+            "url": "",
+            "accessDate": "",
+            "dateAdded": "",
+            "dateModified": "",
+            "contentType": "application/pdf",
+            "collections": ["COL1"],
+            **data,
+        },
+    }
+
+
+def write_pdf(path, text: str) -> None:
+    """Write a one-page PDF whose extracted text is ``text``."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(pdf))
+
+
+class FakeResponse:
+    def __init__(self, headers: dict) -> None:
+        self.headers = headers
+
+
+class FakeZotero:
+    """In-memory stand-in for pyzotero.zotero.Zotero.
+
+    Copies made by ``copy.copy`` (as the wrapper does per request) share the
+    items and the request log.
+    """
+
+    def __init__(self) -> None:
+        self.items_by_key = {}
+        self.deleted_keys = []
+        self.version = 1
+        self.calls = []
+        self.request = FakeResponse({})
+
+    def add(self, item: dict) -> dict:
+        self.version += 1
+        item = copy.deepcopy(item)
+        item["data"]["version"] = self.version
+        self.items_by_key[item["data"]["key"]] = item
+        return item
+
+    def delete(self, key: str) -> None:
+        self.version += 1
+        self.items_by_key.pop(key)
+        self.deleted_keys.append((self.version, key))
+
+    def collections(self) -> list:
+        return [
+            {"data": {"key": "COL1", "name": "Papers"}, "meta": {"numItems": 0}}
+        ]
+
+    def last_modified_version(self) -> int:
+        return self.version
+
+    def deleted(self, since: int) -> dict:
+        return {"items": [k for v, k in self.deleted_keys if v > since]}
+
+    def item(self, key: str) -> dict:
+        self.calls.append(("item", key))
+        return copy.deepcopy(self.items_by_key[key])
+
+    def items(self, itemKey: str, limit: int) -> list:
+        keys = itemKey.split(",")
+        self.calls.append(("items", tuple(keys)))
+        return [
+            copy.deepcopy(self.items_by_key[key])
+            for key in keys
+            if key in self.items_by_key
+        ][:limit]
+
+    def children(self, parent_key: str, itemType=None) -> list:
+        self.calls.append(("children", parent_key))
+        return [
+            copy.deepcopy(item)
+            for item in self.items_by_key.values()
+            if item["data"].get("parentItem") == parent_key
+            and itemType in (None, item["data"]["itemType"])
+        ]
+
+    def collection_items(
+        self, collection_key, start=0, limit=100, since=None, itemType=None
+    ) -> list:
+        self.calls.append(("collection_items", start, since, itemType))
+        matches = [
+            item
+            for item in sorted(
+                self.items_by_key.values(), key=lambda x: x["key"]
+            )
+            if collection_key in item["data"].get("collections", [])
+            and (since is None or item["data"]["version"] > since)
+            and itemType in (None, item["data"]["itemType"])
+        ]
+        self.request = FakeResponse({"Total-Results": str(len(matches))})
+        return copy.deepcopy(matches[start : start + limit])
+
+
+@pytest.fixture
+def zot() -> FakeZotero:
+    return FakeZotero()
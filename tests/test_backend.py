@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+from conftest import write_pdf
+
+from zotgpt.backend import PENDING, _expired, load_documents
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"paper{i}.pdf"
+        write_pdf(path, f"paper number {i}")
+        paths.append(str(path))
+    return paths
+
+
+def test_load_documents_yields_every_path(pdfs, tmp_path):
+    missing = str(tmp_path / "missing.pdf")
+
+    results = {
+        path: (documents, error)
+        for path, documents, error in load_documents(
+            [*pdfs, missing],
+            workers=2,
+            metadatas={pdfs[0]: {"id": "A0"}},
+        )
+    }
+
+    assert set(results) == {*pdfs, missing}
+    documents, error = results[pdfs[0]]
+    assert error is None
+    assert documents[0].page_content == "paper number 0"
+    assert documents[0].metadata["id"] == "A0"
+    assert results[missing][0] is None
+    assert results[missing][1]
+
+
+def test_pending_source_does_not_hold_back_results(pdfs):
+    first_done = threading.Event()
+
+    def paths():
+        yield pdfs[0]
+        deadline = time.monotonic() + 30
+        while not first_done.is_set() and time.monotonic() < deadline:
+            time.sleep(0.01)
+            yield PENDING
+        yield pdfs[1]
+
+    order = []
+    for path, _, error in load_documents(paths(), workers=2):
+        assert error is None
+        order.append(path)
+        first_done.set()
+
+    assert order == pdfs[:2]
+
+
+class FakeWorker:
+    def __init__(self, started: float) -> None:
+        self.started = started
+        self.killed = False
+
+    def kill(self) -> None:
+        self.killed = True
+
+
+def test_expired_kills_only_timed_out_workers():
+    now = time.monotonic()
+    busy = {"old": FakeWorker(now - 10), "new": FakeWorker(now)}
+    old = busy["old"]
+
+    assert _expired(busy, timeout=5) == [old]
+    assert old.killed
+    assert list(busy) == ["new"]
+    assert _expired(busy, timeout=None) == []
@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.compress import (
+    Projection,
+    coarse_scores,
+    code_size,
+    normalize,
+    quantize,
+)
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.vectorstore import VectorStoreFactory, store_options_from_env
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=32)
+
+
+def random_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Decaying variance, so the leading dimensions carry most of it
+    scale = 1 / np.sqrt(1 + np.arange(dim))
+    return rng.standard_normal((n, dim)) * scale
+
+
+@pytest.fixture
+def base(tmp_path):
+    store = LocalVectorStore(EMBEDDINGS, str(tmp_path / "base"))
+    vectors = random_vectors(1200)
+    store.add_embeddings(
+        [(f"chunk {i}", vector.tolist()) for i, vector in enumerate(vectors)],
+        metadatas=[{"id": f"K{i % 10}", "n": i} for i in range(len(vectors))],
+        ids=[f"doc{i}" for i in range(len(vectors))],
+    )
+    store.delete(ids=["doc3"])
+    return store
+
+
+def top_ids(store, queries: np.ndarray, k: int = 10) -> list[set[str]]:
+    return [
+        {doc.id for doc in store.similarity_search_by_vector(q.tolist(), k=k)}
+        for q in queries
+    ]
+
+
+def test_projections_apply_and_round_trip(tmp_path):
+    vectors = random_vectors(200)
+
+    truncate = Projection("truncate", 8)
+    assert truncate.apply(vectors).shape == (200, 8)
+
+    pca = Projection.fit_pca(vectors, 8)
+    pca.save(str(tmp_path / "projection.npz"))
+    loaded = Projection.load(str(tmp_path / "projection.npz"))
+    np.testing.assert_allclose(loaded.apply(vectors), pca.apply(vectors))
+
+    with pytest.raises(ValueError, match="32-d"):
+        pca.apply(vectors[:, :16])
+    with pytest.raises(ValueError, match="projection must be one of"):
+        Projection("random", 8)
+
+
+def test_codes_approximate_inner_products():
+    vectors = normalize(random_vectors(50))
+    queries = normalize(random_vectors(5, seed=1))
+    exact = queries @ vectors.T
+
+    int8 = coarse_scores(queries, quantize(vectors, "int8"), "int8")
+    np.testing.assert_allclose(int8, exact, atol=0.02)
+
+    codes = quantize(vectors, "binary")
+    assert codes.shape == (50, code_size(32, "binary"))
+    binary = coarse_scores(queries, codes, "binary")
+    assert np.corrcoef(binary.ravel(), exact.ravel())[0, 1] > 0.7
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"quantization": "int8"},
+        {"quantization": "binary"},
+        {"dtype": "float16"},
+        {"projection": "pca", "projection_dim": 16},
+    ],
+)
+def test_compress_copies_live_rows(base, tmp_path, options):
+    compressed = base.compress(str(tmp_path / "small"), **options)
+
+    assert len(compressed) == len(base) == 1199
+    doc = compressed.get_item_documents(["K7"])[0]
+    assert (doc.id, doc.page_content, doc.metadata) == (
+        "doc7",
+        "chunk 7",
+        {"id": "K7", "n": 7},
+    )
+    queries = random_vectors(20, seed=2)
+    recall = np.mean([
+        len(a & b) / 10
+        for a, b in zip(top_ids(compressed, queries), top_ids(base, queries))
+    ])
+    assert recall >= 0.6
+    assert all("doc3" not in ids for ids in top_ids(compressed, queries))
+
+
+def test_quantized_stores_do_not_keep_float32_vectors(base, tmp_path):
+    int8 = base.compress(str(tmp_path / "int8"), quantization="int8")
+    binary = base.compress(str(tmp_path / "binary"), quantization="binary")
+
+    assert int8.dtype == "int8"
+    assert not (tmp_path / "int8" / "codes.bin").exists()
+    assert (tmp_path / "int8" / "vectors.bin").stat().st_size == 1199 * 32
+    assert binary.dtype == "float16"
+    assert (tmp_path / "binary" / "codes.bin").stat().st_size == 1199 * 4
+    assert (tmp_path / "binary" / "vectors.bin").stat().st_size == 1199 * 64
+    with pytest.raises(ValueError, match="stores int8 vectors"):
+        LocalVectorStore(
+            EMBEDDINGS,
+            str(tmp_path / "other"),
+            quantization="int8",
+            dtype="float32",
+        )
+
+
+def test_compress_keeps_the_projection_when_reopened(base, tmp_path):
+    base.compress(str(tmp_path / "small"), projection="pca", projection_dim=16)
+
+    reopened = LocalVectorStore(EMBEDDINGS, str(tmp_path / "small"))
+
+    assert reopened.projection.kind == "pca"
+    assert reopened.dimension == 16
+    with pytest.raises(ValueError, match="already projected"):
+        reopened.compress(
+            str(tmp_path / "smaller"), projection="truncate", projection_dim=8
+        )
+
+
+def test_compress_refuses_an_empty_store(tmp_path):
+    store = LocalVectorStore(EMBEDDINGS, str(tmp_path / "empty"))
+
+    with pytest.raises(ValueError, match="empty store"):
+        store.compress(str(tmp_path / "small"), quantization="int8")
+
+
+def test_store_options_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("VECTOR_STORE_QUANTIZATION", "binary")
+    monkeypatch.setenv("VECTOR_STORE_RESCORE_FACTOR", "16")
+    monkeypatch.setenv("VECTOR_STORE_DTYPE", "")
+
+    options = store_options_from_env()
+    store = VectorStoreFactory(
+        "local",
+        EMBEDDINGS,
+        "library",
+        persist_directory=str(tmp_path),
+        store_options=options,
+    ).create()
+
+    assert options == {"quantization": "binary", "rescore_factor": 16}
+    assert (store.quantization, store.rescore_factor) == ("binary", 16)
@@ -0,0 +1,147 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from zotgpt.embedbatch import (
+    AdaptiveLimiter,
+    BatchedEmbeddings,
+    is_rate_limit,
+    is_transient,
+    pack_batches,
+)
+from zotgpt.tokens import count_tokens
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class FlakyEmbeddings(Embeddings):
+    """Fails the first ``failures`` calls with ``error``, then embeds."""
+
+    def __init__(self, failures=0, error=None):
+        self.failures = failures
+        self.error = error or RateLimitError("rate limit exceeded")
+        self.calls = []
+        self.fake = DeterministicFakeEmbedding(size=4)
+
+    def _call(self, method, arg):
+        self.calls.append(arg)
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return method(arg)
+
+    def embed_documents(self, texts):
+        return self._call(self.fake.embed_documents, texts)
+
+    def embed_query(self, text):
+        return self._call(self.fake.embed_query, text)
+
+
+def batched(embeddings, **kwargs) -> BatchedEmbeddings:
+    return BatchedEmbeddings(embeddings, backoff=0, **kwargs)
+
+
+def test_pack_batches_respects_both_limits():
+    assert pack_batches([1, 1, 1, 1, 1], 2, 100) == [[0, 1], [2, 3], [4]]
+    assert pack_batches([40, 40, 40, 90, 5], 10, 100) == [
+        [0, 1],
+        [2],
+        [3, 4],
+    ]
+    # A text over the token limit still gets a batch of its own
+    assert pack_batches([500, 1], 10, 100) == [[0], [1]]
+
+
+def test_error_classification():
+    assert is_rate_limit(RateLimitError("slow down"))
+    assert is_transient(RateLimitError("slow down"))
+    assert is_transient(TimeoutError())
+    assert not is_transient(ValueError("bad input"))
+
+
+def test_limiter_grows_on_fast_calls_and_shrinks_on_throttling():
+    limiter = AdaptiveLimiter(2, 1, 4, target_latency=1.0)
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(latency=0.1)
+    assert limiter.limit == 4
+
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+
+    limiter.acquire()
+    limiter.release(latency=5.0)
+    assert limiter.limit == 1.5
+
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == 1
+
+
+def test_embed_documents_keeps_order_across_batches():
+    embeddings = DeterministicFakeEmbedding(size=4)
+    texts = [f"text {i}" for i in range(25)]
+    done = []
+
+    vectors = batched(
+        embeddings, max_batch_size=4, max_concurrency=3
+    ).embed_documents(texts, on_batch=lambda batch, _: done.extend(batch))
+
+    assert vectors == embeddings.embed_documents(texts)
+    assert sorted(done) == sorted(texts)
+
+
+def test_transient_errors_are_retried():
+    embeddings = FlakyEmbeddings(failures=2)
+    wrapper = batched(embeddings)
+
+    vectors = wrapper.embed_documents(["a", "b"])
+
+    assert len(vectors) == 2
+    assert len(embeddings.calls) == 3
+    assert wrapper.stats["throttled"] == 2
+    assert wrapper.stats["batches"] == 1
+
+
+def test_permanent_errors_are_raised_at_once():
+    embeddings = FlakyEmbeddings(failures=1, error=ValueError("bad input"))
+
+    with pytest.raises(ValueError, match="bad input"):
+        batched(embeddings).embed_documents(["a"])
+    assert len(embeddings.calls) == 1
+
+
+def test_queries_are_retried_up_to_query_retries():
+    embeddings = FlakyEmbeddings(failures=2, error=TimeoutError())
+    assert len(batched(embeddings, query_retries=2).embed_query("q")) == 4
+
+    embeddings = FlakyEmbeddings(failures=3, error=TimeoutError())
+    with pytest.raises(TimeoutError):
+        batched(embeddings, query_retries=2).embed_query("q")
+    assert embeddings.calls == ["q", "q", "q"]
+
+
+def test_texts_over_the_input_limit_are_truncated():
+    embeddings = FlakyEmbeddings()
+    wrapper = batched(embeddings, max_input_tokens=10)
+    long_text = "word " * 100
+    done = []
+
+    vectors = wrapper.embed_documents(
+        ["short", long_text], on_batch=lambda batch, _: done.extend(batch)
+    )
+
+    sent = embeddings.calls[0]
+    assert sent[0] == "short"
+    assert count_tokens(sent[1]) <= 10
+    assert long_text.startswith(sent[1])
+    assert done == ["short", long_text]
+    assert len(vectors) == 2
+    assert wrapper.stats["truncated"] == 1
+    assert wrapper.stats["tokens"] <= count_tokens("short") + 10
+
+    wrapper.embed_query(long_text)
+    assert count_tokens(embeddings.calls[-1]) <= 10
@@ -0,0 +1,122 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from zotgpt.embedcache import CachedEmbeddings, QueryCachedEmbeddings
+
+DIM = 8
+VECTOR_BYTES = DIM * 4
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic embeddings that record the texts they are asked for."""
+
+    def __init__(self) -> None:
+        self.inner = DeterministicFakeEmbedding(size=DIM)
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.documents.extend(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return self.inner.embed_query(text)
+
+
+@pytest.fixture
+def provider():
+    return CountingEmbeddings()
+
+
+def make_cache(provider, tmp_path, **kwargs) -> CachedEmbeddings:
+    return CachedEmbeddings(
+        provider,
+        provider="fake",
+        model="fake-8",
+        cache_path=str(tmp_path / "cache.sqlite"),
+        **kwargs,
+    )
+
+
+def test_only_unseen_texts_reach_the_provider(provider, tmp_path):
+    cache = make_cache(provider, tmp_path)
+
+    first = cache.embed_documents(["a", "b", "a"])
+    second = cache.embed_documents(["b", "c"])
+
+    assert provider.documents == ["a", "b", "c"]
+    assert second[0] == pytest.approx(first[1], rel=1e-6)
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 3
+
+
+def test_cache_persists_across_instances(provider, tmp_path):
+    make_cache(provider, tmp_path).embed_documents(["a", "b"])
+
+    cache = make_cache(provider, tmp_path)
+    cache.embed_documents(["a", "b"])
+
+    assert provider.documents == ["a", "b"]
+    assert cache.stats["bytes"] == 2 * VECTOR_BYTES
+
+
+def test_storing_a_cached_text_again_is_counted_once(provider, tmp_path):
+    cache = make_cache(provider, tmp_path)
+    vectors = provider.embed_documents(["a"])
+
+    # Two threads that both missed on "a" store it one after the other
+    cache._store_batch(["a"], vectors)
+    cache._store_batch(["a"], vectors)
+
+    assert cache.stats["bytes"] == VECTOR_BYTES
+
+
+def test_least_recently_used_entries_are_evicted(provider, tmp_path):
+    cache = make_cache(provider, tmp_path, max_bytes=3 * VECTOR_BYTES)
+    cache.embed_documents(["a", "b", "c"])
+    cache.embed_documents(["a"])
+
+    cache.embed_documents(["d"])
+    provider.documents.clear()
+    cache.embed_documents(["a", "b", "c", "d"])
+
+    assert cache.stats["bytes"] <= 3 * VECTOR_BYTES
+    assert "a" not in provider.documents
+    assert "b" in provider.documents
+
+
+def test_query_cache_matches_normalized_text(provider):
+    embeddings = QueryCachedEmbeddings(provider)
+
+    first = embeddings.embed_query("what is  attention?")
+    second = embeddings.embed_query(" what is attention? ")
+
+    assert first == second
+    assert provider.queries == ["what is  attention?"]
+    assert embeddings.stats["hits"] == 1
+
+
+def test_query_cache_returns_copies(provider):
+    embeddings = QueryCachedEmbeddings(provider)
+    expected = list(embeddings.embed_query("attention"))
+
+    embeddings.embed_query("attention").append(1.0)
+    embeddings.embed_query("attention")[0] = 99.0
+
+    assert embeddings.embed_query("attention") == expected
+
+
+def test_query_cache_expires_and_evicts(provider):
+    embeddings = QueryCachedEmbeddings(provider, max_size=2, ttl=0)
+    embeddings.embed_query("a")
+    embeddings.embed_query("a")
+    assert provider.queries == ["a", "a"]
+
+    embeddings.ttl = 3600
+    for text in ["b", "c", "a"]:
+        embeddings.embed_query(text)
+
+    assert embeddings.stats["size"] == 2
+    embeddings.embed_query("b")
+    assert provider.queries[-1] == "b"
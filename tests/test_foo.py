@@ -1,5 +0,0 @@
-from src.foo import foo
-
-
-def test_foo():
-    assert foo("foo") == "foo"
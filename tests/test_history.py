@@ -0,0 +1,76 @@
+from langchain_core.messages import AIMessage
+
+from zotgpt.history import ChatHistory
+from zotgpt.tokens import count_tokens
+
+
+class SummaryLLM:
+    """Records the summary prompts and numbers its summaries."""
+
+    def __init__(self) -> None:
+        self.prompts = []
+
+    def invoke(self, prompt: str) -> AIMessage:
+        self.prompts.append(prompt)
+        return AIMessage(content=f"summary {len(self.prompts)}")
+
+
+def test_count_tokens_grows_with_the_text():
+    assert count_tokens("word " * 100) > count_tokens("word " * 10) > 0
+
+
+def test_turns_are_bounded_and_folded_into_a_summary():
+    llm = SummaryLLM()
+    history = ChatHistory(llm=llm, max_turns=2, token_budget=10_000)
+
+    for i in range(4):
+        history.add_turn(f"question {i}", f"answer {i}")
+
+    assert history.turns == [
+        ("question 2", "answer 2"),
+        ("question 3", "answer 3"),
+    ]
+    assert history.summary == "summary 2"
+    # Each summary only sees the turn being evicted and the previous summary
+    assert "question 0" in llm.prompts[0]
+    assert "question 0" not in llm.prompts[1]
+    assert "summary 1" in llm.prompts[1]
+
+
+def test_token_budget_evicts_old_turns_but_keeps_the_last():
+    history = ChatHistory(max_turns=10, token_budget=50)
+    long_answer = "tokens " * 40
+
+    history.add_turn("first", long_answer)
+    history.add_turn("second", long_answer)
+
+    assert [question for question, _ in history.turns] == ["second"]
+
+
+def test_summary_counts_against_the_budget_and_is_truncated():
+    class VerboseLLM:
+        def invoke(self, prompt: str) -> AIMessage:
+            return AIMessage(content="summary " * 200)
+
+    history = ChatHistory(llm=VerboseLLM(), token_budget=100)
+
+    for i in range(6):
+        history.add_turn(f"question {i}", "answer " * 20)
+
+    summary = count_tokens(history.summary)
+    turns = sum(count_tokens(q) + count_tokens(a) for q, a in history.turns)
+    assert summary <= history.summary_budget == 25
+    assert summary + turns <= 100
+    assert history.turns[-1][0] == "question 5"
+
+
+def test_messages_start_with_the_summary():
+    history = ChatHistory(llm=SummaryLLM(), max_turns=1)
+    history.add_turn("q0", "a0")
+    history.add_turn("q1", "a1")
+
+    assert history.messages() == [
+        ("system", "Summary of the earlier conversation: summary 1"),
+        ("human", "q1"),
+        ("ai", "a1"),
+    ]
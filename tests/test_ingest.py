@@ -0,0 +1,180 @@
+import queue
+
+import pytest
+from conftest import make_attachment, make_parent, write_pdf
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.ingest import _DONE, IngestPipeline
+from zotgpt.lexical import BM25Index
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.metastore import MetaStore
+from zotgpt.sync import sync_library
+from zotgpt.zotero import ZoteroItem, ZoteroWrapper
+
+
+@pytest.fixture
+def wrapper(zot, tmp_path, monkeypatch):
+    for i in range(4):
+        zot.add(make_parent(f"P{i}"))
+        zot.add(make_attachment(f"A{i}", f"P{i}"))
+        write_pdf(tmp_path / "pdfs" / f"A{i}" / f"A{i}.pdf", f"paper {i}")
+    monkeypatch.setattr(
+        ZoteroItem,
+        "get_pdf_path",
+        lambda self: str(tmp_path / "pdfs" / self.key / self.filename),
+    )
+    return ZoteroWrapper(zot)
+
+
+@pytest.fixture
+def metastore(wrapper, tmp_path):
+    store = MetaStore(str(tmp_path / "db" / "meta.sqlite"))
+    sync_library(wrapper, store, "COL1")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    return LocalVectorStore(
+        DeterministicFakeEmbedding(size=16), str(tmp_path / "vectors")
+    )
+
+
+def make_pipeline(wrapper, vector_store, metastore, **kwargs):
+    return IngestPipeline(
+        wrapper,
+        vector_store.embeddings,
+        vector_store,
+        metastore=metastore,
+        parse_workers=2,
+        **kwargs,
+    )
+
+
+def embedded_keys(metastore: MetaStore) -> list[str]:
+    return [row["key"] for row in metastore.query(["key"], {"embedded": 1})]
+
+
+def test_run_ingests_and_marks_every_pdf(wrapper, vector_store, metastore):
+    stats = make_pipeline(wrapper, vector_store, metastore).run("COL1")
+
+    assert {name: s.items for name, s in stats.items()} == {
+        "fetch": 4,
+        "parse": 4,
+        "embed": 4,
+        "upsert": 4,
+    }
+    assert len(vector_store) == 4
+    assert embedded_keys(metastore) == ["A0", "A1", "A2", "A3"]
+    found = vector_store.similarity_search("paper 2", k=4)
+    assert {doc.metadata["id"] for doc in found} == {"A0", "A1", "A2", "A3"}
+
+
+def test_embedded_items_are_skipped(wrapper, vector_store, metastore):
+    make_pipeline(wrapper, vector_store, metastore).run("COL1")
+
+    stats = make_pipeline(wrapper, vector_store, metastore).run("COL1")
+
+    assert stats["fetch"].items == 0
+    assert len(vector_store) == 4
+
+
+def test_reingesting_replaces_chunks(
+    wrapper, vector_store, metastore, tmp_path
+):
+    lexical_index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    for _ in range(2):
+        make_pipeline(
+            wrapper,
+            vector_store,
+            metastore,
+            skip_embedded=False,
+            lexical_index=lexical_index,
+        ).run("COL1")
+
+    assert len(vector_store) == 4
+    assert len(lexical_index) == 4
+    found = vector_store.similarity_search("paper 1", k=10)
+    assert sorted(doc.id for doc in found) == ["A0:0", "A1:0", "A2:0", "A3:0"]
+
+
+def test_unparseable_items_are_not_marked(wrapper, vector_store, metastore):
+    wrapper.zot.items_by_key["A1"]["data"]["filename"] = "missing.pdf"
+
+    stats = make_pipeline(wrapper, vector_store, metastore).run("COL1")
+
+    assert stats["parse"].errors == 1
+    assert len(vector_store) == 3
+    assert embedded_keys(metastore) == ["A0", "A2", "A3"]
+
+
+def test_backfill_indexes_items_embedded_without_lexical_index(
+    wrapper, vector_store, metastore, tmp_path
+):
+    make_pipeline(wrapper, vector_store, metastore).run("COL1")
+    lexical_index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    pipeline = make_pipeline(
+        wrapper, vector_store, metastore, lexical_index=lexical_index
+    )
+
+    assert pipeline.backfill_lexical_index() == 4
+    assert pipeline.backfill_lexical_index() == 0
+
+    assert lexical_index.item_ids() == {"A0", "A1", "A2", "A3"}
+    assert len(lexical_index) == 4
+    doc, _ = lexical_index.search("paper 2", k=1)[0]
+    assert doc.metadata["id"] == "A2"
+
+
+def test_parse_stage_failure_is_raised(
+    wrapper, vector_store, metastore, monkeypatch
+):
+    def broken_loader(paths, **kwargs):
+        next(iter(paths))
+        raise RuntimeError("worker pool died")
+        yield
+
+    monkeypatch.setattr("zotgpt.ingest.load_documents", broken_loader)
+    pipeline = make_pipeline(wrapper, vector_store, metastore, queue_size=1)
+
+    with pytest.raises(RuntimeError, match="worker pool died"):
+        pipeline.run("COL1")
+    assert pipeline.stats["parse"].errors == 1
+    assert embedded_keys(metastore) == []
+
+
+def test_embed_stage_packs_waiting_items_into_one_call(
+    wrapper, vector_store, metastore
+):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    calls = []
+
+    class RecordingEmbeddings:
+        def embed_documents(self, texts):
+            calls.append(texts)
+            return embeddings.embed_documents(texts)
+
+    pipeline = make_pipeline(wrapper, vector_store, metastore)
+    pipeline.embeddings = RecordingEmbeddings()
+    inbox, outbox = queue.Queue(), queue.Queue()
+    for key, count in [("A0", 2), ("A1", 3), ("A2", 2), ("A3", 1)]:
+        documents = [Document(f"{key} chunk {i}") for i in range(count)]
+        inbox.put((key, documents))
+    inbox.put(_DONE)
+
+    for thread in pipeline._start_stage(
+        "embed", pipeline._embed, inbox, outbox, 1, batch_chunks=6
+    ):
+        thread.join()
+
+    results = [outbox.get() for _ in range(4)]
+    assert [len(texts) for texts in calls] == [7, 1]
+    assert [key for key, _, _ in results] == ["A0", "A1", "A2", "A3"]
+    for _, documents, vectors in results:
+        assert vectors == embeddings.embed_documents([
+            doc.page_content for doc in documents
+        ])
+    assert outbox.get() is _DONE
+    assert pipeline.stats["embed"].items == 4
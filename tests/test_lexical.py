@@ -0,0 +1,128 @@
+import sqlite3
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.lexical import BM25Index, tokenize
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.retrieval import HybridRetriever, reciprocal_rank_fusion
+
+
+def doc(item_id: str, text: str) -> Document:
+    return Document(page_content=text, metadata={"id": item_id})
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    index.add_documents([
+        doc("A", "BERT-base fine-tuning on GLUE"),
+        doc("A", "The results of the ablation"),
+        doc("B", "GPT-4 evaluation on reasoning benchmarks"),
+        doc("C", "Protein folding with attention"),
+    ])
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_drops_stopwords():
+    assert tokenize("The BERT-base and GPT-4 of f1.5") == [
+        "bert-base",
+        "gpt-4",
+        "f1.5",
+    ]
+
+
+def test_search_ranks_matching_chunks(index):
+    results = index.search("gpt-4 benchmarks", k=2)
+
+    assert [d.metadata["id"] for d, _ in results] == ["B"]
+    assert results[0][1] > 0
+
+
+def test_search_restricted_to_items(index):
+    assert index.search("attention", item_ids=["A", "B"]) == []
+    assert index.search("attention", item_ids=["Z"]) == []
+    found = index.search("attention", item_ids=["C"])
+    assert [d.page_content for d, _ in found] == [
+        "Protein folding with attention"
+    ]
+
+
+def test_restriction_to_many_items(index):
+    item_ids = [f"X{i}" for i in range(1200)] + ["B"]
+
+    found = index.search("reasoning", item_ids=item_ids)
+
+    assert [d.metadata["id"] for d, _ in found] == ["B"]
+
+
+def test_stats_follow_adds_and_deletes(index):
+    assert len(index) == 4
+
+    index.replace_item("A", [doc("A", "a single new chunk")])
+    index.delete(["C", "missing"])
+
+    assert len(index) == 2
+    assert index.item_ids() == {"A", "B"}
+    assert (
+        index._conn.execute("SELECT chunks, total_length FROM stats").fetchone()
+        == index._conn.execute(
+            "SELECT COUNT(*), SUM(length) FROM chunks"
+        ).fetchone()
+    )
+
+
+def test_stats_are_filled_for_existing_indexes(index):
+    conn = sqlite3.connect(index.path)
+    conn.execute("DROP TABLE stats")
+    conn.commit()
+    conn.close()
+
+    reopened = BM25Index(index.path)
+
+    assert len(reopened) == 4
+    assert reopened.search("ablation")[0][0].metadata["id"] == "A"
+
+
+def test_writes_are_not_blocked_by_open_reads(index):
+    reader = sqlite3.connect(index.path)
+    reader.execute("BEGIN")
+    assert reader.execute("SELECT COUNT(*) FROM chunks").fetchone() == (4,)
+
+    index.replace_item("C", [])
+
+    assert reader.execute("SELECT COUNT(*) FROM chunks").fetchone() == (4,)
+    reader.rollback()
+    assert reader.execute("SELECT COUNT(*) FROM chunks").fetchone() == (3,)
+    reader.close()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = doc("A", "a"), doc("B", "b"), doc("C", "c")
+
+    fused = reciprocal_rank_fusion([[a, b, c], [b, doc("C", "c")]])
+
+    assert [d.metadata["id"] for d in fused] == ["B", "C", "A"]
+    assert fused[1] is c
+
+
+def test_hybrid_retriever_fuses_both_legs(index, tmp_path):
+    vector_store = LocalVectorStore(
+        DeterministicFakeEmbedding(size=16), str(tmp_path / "vectors")
+    )
+    vector_store.add_documents([
+        doc("A", "BERT-base fine-tuning on GLUE"),
+        doc("D", "only in the vector store"),
+    ])
+    retriever = HybridRetriever(
+        vector_store=vector_store,
+        lexical_index=index,
+        search_kwargs={"k": 3, "filter": {"id": {"$in": ["A", "B", "D"]}}},
+    )
+
+    found = retriever.invoke("GPT-4 reasoning")
+
+    assert len(found) == 3
+    assert {d.metadata["id"] for d in found} <= {"A", "B", "D"}
+    assert "B" in {d.metadata["id"] for d in found}
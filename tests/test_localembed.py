@@ -0,0 +1,81 @@
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import ClassVar
+
+import numpy as np
+import pytest
+
+from zotgpt.embed import EmbeddingsFactory
+from zotgpt.localembed import LocalEmbeddings
+
+
+class FakeSentenceTransformer:
+    """Embeds a text as [len(text), 1, 0] and records how it was called."""
+
+    loaded: ClassVar[list] = []
+
+    def __init__(self, model_name, device, backend):
+        self.loaded.append((model_name, device, backend))
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(kwargs)
+        return np.array([[len(text), 1.0, 0.0] for text in texts])
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    FakeSentenceTransformer.loaded = []
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    return FakeSentenceTransformer
+
+
+def test_model_is_loaded_once_on_first_use(fake_model):
+    embeddings = LocalEmbeddings("some/model", batch_size=8, backend="onnx")
+    assert fake_model.loaded == []
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        vectors = list(pool.map(embeddings.embed_query, ["a", "bb", "ccc"]))
+
+    assert fake_model.loaded == [("some/model", "cpu", "onnx")]
+    assert vectors == [[1.0, 1.0, 0.0], [2.0, 1.0, 0.0], [3.0, 1.0, 0.0]]
+    assert embeddings.dimension == 3
+
+
+def test_embed_documents_batches_and_normalizes(fake_model):
+    embeddings = LocalEmbeddings(batch_size=16, normalize=False)
+
+    assert embeddings.embed_documents([]) == []
+    assert fake_model.loaded == []
+    assert embeddings.embed_documents(["x", "yy"]) == [
+        [1.0, 1.0, 0.0],
+        [2.0, 1.0, 0.0],
+    ]
+    (call,) = embeddings.model.calls
+    assert call["batch_size"] == 16
+    assert call["normalize_embeddings"] is False
+
+
+def test_missing_package_raises_with_install_hint(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+
+    with pytest.raises(ImportError, match="pip install sentence-transformers"):
+        LocalEmbeddings().embed_query("text")
+
+
+def test_factory_creates_local_embeddings_without_api_key(
+    fake_model, monkeypatch
+):
+    monkeypatch.setenv("EMBEDDINGS_BATCH_SIZE", "32")
+
+    embeddings = EmbeddingsFactory("local", "BAAI/bge-small-en-v1.5").create()
+
+    assert isinstance(embeddings, LocalEmbeddings)
+    assert embeddings.batch_size == 32
+    assert fake_model.loaded == []
@@ -0,0 +1,234 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.localstore import LocalVectorStore
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+
+def add(store, key: str, count: int, **kwargs) -> list[str]:
+    texts = [f"{key} chunk {i}" for i in range(count)]
+    return store.add_texts(
+        texts,
+        metadatas=[{"id": key} for _ in texts],
+        ids=[f"{key}:{i}" for i in range(count)],
+        **kwargs,
+    )
+
+
+def stored_ids(store, **kwargs) -> list[str]:
+    docs = store.similarity_search("chunk", k=100, **kwargs)
+    return sorted(doc.id for doc in docs)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(EMBEDDINGS, str(tmp_path / "store"))
+
+
+def test_search_finds_exact_match(store):
+    add(store, "A", 3)
+    add(store, "B", 3)
+
+    doc, score = store.similarity_search_with_score("B chunk 1", k=1)[0]
+
+    assert doc.id == "B:1"
+    assert doc.metadata == {"id": "B"}
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_existing_ids_are_replaced(store):
+    add(store, "A", 3)
+
+    store.add_texts(["new text"], metadatas=[{"id": "A"}], ids=["A:1"])
+
+    assert len(store) == 3
+    assert stored_ids(store) == ["A:0", "A:1", "A:2"]
+    doc = store.similarity_search("new text", k=1)[0]
+    assert (doc.id, doc.page_content) == ("A:1", "new text")
+
+
+def test_duplicate_ids_in_one_batch_keep_the_last(store):
+    ids = store.add_texts(["first", "other", "second"], ids=["x", "y", "x"])
+
+    assert ids == ["y", "x"]
+    assert len(store) == 2
+    texts = sorted(doc.page_content for doc in store.similarity_search("x"))
+    assert texts == ["other", "second"]
+
+
+def test_delete_by_id_and_item(store):
+    add(store, "A", 2)
+    add(store, "B", 2)
+    add(store, "C", 2)
+
+    store.delete(ids=["A:0"])
+    store.delete(item_ids=["B"])
+
+    assert len(store) == 3
+    assert stored_ids(store) == ["A:1", "C:0", "C:1"]
+
+
+def test_tombstones_are_kept_without_rescanning(store):
+    add(store, "A", 2)
+    store.delete(item_ids=["A"])
+    add(store, "B", 2)
+
+    assert store._deleted.tolist() == [True, True, False, False]
+    assert len(store._deleted_buffer) >= 4
+
+
+def test_reopen_keeps_rows_and_tombstones(store):
+    add(store, "A", 2)
+    add(store, "B", 2)
+    store.delete(ids=["B:0"])
+
+    reopened = LocalVectorStore(EMBEDDINGS, store.path)
+
+    assert len(reopened) == 3
+    assert stored_ids(reopened) == ["A:0", "A:1", "B:1"]
+    assert reopened._deleted.tolist() == [False, False, True, False]
+
+
+def test_vectors_of_an_interrupted_add_are_dropped(store):
+    add(store, "A", 2)
+    # An add that wrote its vectors but crashed before committing its chunks
+    with open(store.vectors_path, "ab") as f:
+        f.write(np.ones((3, 16), dtype=np.float32).tobytes())
+
+    reopened = LocalVectorStore(EMBEDDINGS, store.path)
+    assert len(reopened) == 2
+    assert stored_ids(reopened) == ["A:0", "A:1"]
+
+    add(reopened, "B", 1)
+    assert stored_ids(reopened) == ["A:0", "A:1", "B:0"]
+    assert stored_ids(LocalVectorStore(EMBEDDINGS, store.path)) == [
+        "A:0",
+        "A:1",
+        "B:0",
+    ]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_dtypes_score_like_float32(tmp_path, dtype):
+    exact = LocalVectorStore(EMBEDDINGS, str(tmp_path / "exact"))
+    compact = LocalVectorStore(EMBEDDINGS, str(tmp_path / dtype), dtype=dtype)
+    for target in (exact, compact):
+        add(target, "A", 5)
+        add(target, "B", 5)
+    reopened = LocalVectorStore(EMBEDDINGS, compact.path)
+
+    for found in (compact, reopened):
+        hits = found.similarity_search_with_score("B chunk 3", k=3)
+        expected = exact.similarity_search_with_score("B chunk 3", k=3)
+        assert [doc.id for doc, _ in hits] == [doc.id for doc, _ in expected]
+        np.testing.assert_allclose(
+            [score for _, score in hits],
+            [score for _, score in expected],
+            atol=0.02,
+        )
+
+
+def test_rejects_vectors_of_another_dimension(store):
+    add(store, "A", 1)
+
+    with pytest.raises(ValueError, match="16-d"):
+        store.add_embeddings([("x", np.ones(8).tolist())])
+
+
+def clustered(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((8, dim))
+    return centres[rng.integers(0, 8, n)] + 0.3 * rng.standard_normal((n, dim))
+
+
+def add_vectors(store, vectors: np.ndarray, offset: int = 0) -> None:
+    store.add_embeddings(
+        [
+            (f"chunk {offset + i}", vector.tolist())
+            for i, vector in enumerate(vectors)
+        ],
+        ids=[str(offset + i) for i in range(len(vectors))],
+    )
+
+
+def search_ids(store, query: np.ndarray, k: int, **kwargs) -> set[str]:
+    docs = store.similarity_search_by_vector(query.tolist(), k=k, **kwargs)
+    return {doc.id for doc in docs}
+
+
+def test_ivf_trains_once_enough_rows_and_keeps_up(tmp_path):
+    store = LocalVectorStore(
+        EMBEDDINGS, str(tmp_path / "ivf"), index_type="ivf", nlist=4
+    )
+    vectors = clustered(300)
+
+    add_vectors(store, vectors[:100])
+    assert not store.index.trained
+
+    add_vectors(store, vectors[100:200], offset=100)
+    assert store.index.trained
+    add_vectors(store, vectors[200:], offset=200)
+    assert len(store.index) == 300
+
+    reopened = LocalVectorStore(EMBEDDINGS, store.path)
+    assert reopened.index_type == "ivf"
+    assert reopened.index.trained
+
+
+def test_ivf_recall_against_exact_search(tmp_path):
+    vectors = clustered(400)
+    queries = clustered(20, seed=1)
+    exact = LocalVectorStore(EMBEDDINGS, str(tmp_path / "exact"))
+    ivf = LocalVectorStore(
+        EMBEDDINGS, str(tmp_path / "ivf"), index_type="ivf", nlist=4
+    )
+    add_vectors(exact, vectors)
+    add_vectors(ivf, vectors)
+
+    truth = [search_ids(exact, query, 10) for query in queries]
+    full = [search_ids(ivf, query, 10, nprobe=4) for query in queries]
+    one = [search_ids(ivf, query, 10, nprobe=1) for query in queries]
+
+    assert full == truth
+    recall = np.mean([len(a & b) / 10 for a, b in zip(one, truth)])
+    assert recall >= 0.5
+
+
+def test_ivf_skips_deleted_rows(tmp_path):
+    store = LocalVectorStore(
+        EMBEDDINGS, str(tmp_path / "ivf"), index_type="ivf", nlist=2
+    )
+    vectors = clustered(100)
+    add_vectors(store, vectors)
+    assert store.index.trained
+
+    store.delete(ids=["7"])
+
+    assert "7" not in search_ids(store, vectors[7], 5, nprobe=2)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf"])
+def test_id_filter_restricts_search(tmp_path, index_type):
+    store = LocalVectorStore(
+        EMBEDDINGS, str(tmp_path / "store"), index_type=index_type, nlist=2
+    )
+    for key in "ABCD":
+        add(store, key, 30)
+    store.delete(ids=["B:0"])
+
+    only_b = stored_ids(store, filter={"id": "B"})
+    b_or_c = stored_ids(store, filter={"id": {"$in": ["B", "C", "Z"]}})
+
+    assert only_b == sorted(f"B:{i}" for i in range(1, 30))
+    assert {doc_id[0] for doc_id in b_or_c} == {"B", "C"}
+    assert len(b_or_c) == 59
+    assert stored_ids(store, filter={"id": "Z"}) == []
+
+
+def test_filter_on_other_metadata_is_refused(store):
+    add(store, "A", 1)
+
+    with pytest.raises(ValueError, match="'id'"):
+        store.similarity_search("chunk", filter={"title": "x"})
@@ -0,0 +1,317 @@
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from conftest import make_attachment, make_parent
+
+from zotgpt.metastore import SCHEMA_VERSION, MetaStore
+
+
+class Item:
+    """The ZoteroItem interface that MetaStore.populate_database reads."""
+
+    def __init__(self, key: str, tags=("maths",), collections=("COL1",)):
+        self.key = key
+        self.item = make_attachment(key, f"P{key}")
+        self.parent_item = make_parent(
+            f"P{key}",
+            tags=[{"tag": tag} for tag in tags],
+            collections=list(collections),
+        )
+
+    def get_title(self) -> str:
+        return self.parent_item["data"]["title"]
+
+    def get_tags(self) -> list:
+        return [tag["tag"] for tag in self.parent_item["data"]["tags"]]
+
+    def get_creators(self) -> list:
+        return ["Ada Lovelace"]
+
+    def get_collections(self) -> list:
+        return self.parent_item["data"]["collections"]
+
+    def get_url(self) -> str:
+        return self.parent_item["data"]["url"]
+
+    def get_pdf_path(self) -> str:
+        return f"pdfs/{self.key}/{self.key}.pdf"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "db" / "meta.sqlite")
+
+
+@pytest.fixture
+def metastore(db_path):
+    store = MetaStore(db_path)
+    store.create_database()
+    yield store
+    store.close()
+
+
+def write_legacy_database(path: str, items: list[Item]) -> None:
+    """The single pickled ``library`` table of schema version 0."""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE library (
+            key TEXT PRIMARY KEY,
+            title TEXT,
+            tags TEXT,
+            creators TEXT,
+            url TEXT,
+            path TEXT,
+            item BLOB,
+            parent_item BLOB,
+            embedded BOOL DEFAULT 0
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO library VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                item.key,
+                item.get_title(),
+                ",".join(item.get_tags()),
+                ",".join(item.get_creators()),
+                item.get_url(),
+                item.get_pdf_path(),
+                pickle.dumps(item.item),
+                pickle.dumps(item.parent_item),
+                item.key == "A1",
+            )
+            for item in items
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_new_database_has_the_current_schema(metastore, db_path):
+    conn = sqlite3.connect(db_path)
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    (journal,) = conn.execute("PRAGMA journal_mode").fetchone()
+
+    assert version == SCHEMA_VERSION
+    assert journal == "wal"
+    assert metastore.count() == 0
+
+
+def test_legacy_library_is_migrated(tmp_path, db_path):
+    (tmp_path / "db").mkdir()
+    write_legacy_database(
+        db_path,
+        [
+            Item("A0", tags=("maths", "logic, sets")),
+            Item("A1", collections=("COL1", "COL2")),
+        ],
+    )
+
+    store = MetaStore(db_path)
+    rows = store.query(["key", "tags", "collections", "item", "embedded"])
+
+    assert [row["key"] for row in rows] == ["A0", "A1"]
+    # Tags are rebuilt from the parent item, so commas inside tags survive
+    assert sorted(rows[0]["tags"]) == ["logic, sets", "maths"]
+    assert sorted(rows[1]["collections"]) == ["COL1", "COL2"]
+    assert rows[0]["item"]["data"]["parentItem"] == "PA0"
+    assert [row["embedded"] for row in rows] == [0, 1]
+    assert store.get_keys_by_creator("Ada Lovelace") == ["A0", "A1"]
+    assert store.get_keys_by_collection("COL2") == ["A1"]
+    tables = {
+        name
+        for (name,) in sqlite3.connect(db_path).execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    }
+    assert "library" not in tables
+    store.close()
+
+
+def test_migration_runs_once(tmp_path, db_path, capsys):
+    (tmp_path / "db").mkdir()
+    write_legacy_database(db_path, [Item("A0")])
+
+    MetaStore(db_path).count()
+    first = capsys.readouterr().out
+    MetaStore(db_path).count()
+    second = capsys.readouterr().out
+
+    assert "Migrating" in first
+    assert "Migrating" not in second
+
+
+def test_items_are_stored_as_queryable_json(metastore, db_path):
+    metastore.populate_database([Item("A0"), Item("A1")])
+
+    conn = sqlite3.connect(db_path)
+    titles = conn.execute(
+        "SELECT json_extract(parent_item, '$.data.title') FROM items"
+    ).fetchall()
+
+    assert titles == [("Paper PA0",), ("Paper PA1",)]
+
+
+def test_one_connection_is_shared_and_reopened_after_close(metastore):
+    conn = metastore._connect()
+
+    metastore.populate_database([Item("A0")])
+    assert metastore._connect() is conn
+
+    metastore.close()
+    assert metastore.count() == 1
+    assert metastore._connect() is not conn
+
+
+def test_bulk_writes_cross_chunk_and_batch_sizes(metastore, monkeypatch):
+    monkeypatch.setattr("zotgpt.metastore.WRITE_BATCH_SIZE", 7)
+    monkeypatch.setattr("zotgpt.metastore.KEY_CHUNK_SIZE", 5)
+    items = [Item(f"A{i:02d}") for i in range(23)]
+
+    metastore.populate_database(items)
+    metastore.update_embedded_value_by_key([item.key for item in items[:12]])
+    metastore.delete_items_by_key([item.key for item in items[::2]])
+
+    assert metastore.count() == 11
+    assert metastore.count(where={"embedded": 1}) == 6
+    assert metastore.get_keys_by_tag("maths") == [
+        item.key for item in items[1::2]
+    ]
+    # Links of deleted items are removed with them
+    conn = metastore._connect()
+    (links,) = conn.execute("SELECT COUNT(*) FROM item_tags").fetchone()
+    assert links == 11
+
+
+def test_single_key_calls_accept_a_string(metastore):
+    metastore.populate_database([Item("A0"), Item("A1")])
+
+    metastore.update_embedded_value_by_key("A1")
+    metastore.delete_items_by_key("A0")
+
+    assert metastore.query(["key", "embedded"]) == [
+        {"key": "A1", "embedded": 1}
+    ]
+
+
+def test_concurrent_reads_and_writes(metastore):
+    metastore.populate_database([Item(f"A{i:03d}") for i in range(200)])
+    keys = [f"A{i:03d}" for i in range(200)]
+
+    def mark(chunk):
+        for key in chunk:
+            metastore.update_embedded_value_by_key(key)
+        return metastore.count()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = list(pool.map(mark, [keys[i::8] for i in range(8)]))
+
+    assert counts == [200] * 8
+    assert metastore.count(where={"embedded": 1}) == 200
+
+
+def test_other_connections_read_while_writing(metastore, db_path):
+    metastore.populate_database([Item("A0")])
+    reader = sqlite3.connect(db_path)
+    reader.execute("BEGIN")
+    assert reader.execute("SELECT COUNT(*) FROM items").fetchone() == (1,)
+
+    # WAL: the write is not blocked by the open read transaction
+    metastore.populate_database([Item("A1")])
+
+    assert reader.execute("SELECT COUNT(*) FROM items").fetchone() == (1,)
+    reader.rollback()
+    assert reader.execute("SELECT COUNT(*) FROM items").fetchone() == (2,)
+    reader.close()
+
+
+def test_library_version_round_trip(metastore):
+    assert metastore.get_library_version("COL1") is None
+
+    metastore.set_library_version("COL1", 41)
+    metastore.set_library_version("COL1", 42)
+
+    assert metastore.get_library_version("COL1") == 42
+    assert metastore.get_library_version("COL2") is None
+
+
+@pytest.fixture
+def library(metastore):
+    metastore.populate_database([
+        Item("A0", tags=("maths", "100%_sure")),
+        Item("A1", tags=("biology",), collections=("COL2",)),
+        Item("A2", tags=("maths",)),
+        Item("B0", tags=()),
+    ])
+    metastore.set_collections([
+        {"key": "COL1", "name": "Reading list"},
+        {"key": "COL2", "name": "Archive"},
+    ])
+    metastore.update_embedded_value_by_key(["A2"])
+    return metastore
+
+
+def test_query_selects_only_the_requested_columns(library):
+    rows = library.query(["key", "tags"], where={"key": "A0"})
+
+    assert [set(row) for row in rows] == [{"key", "tags"}]
+    assert sorted(rows[0]["tags"]) == ["100%_sure", "maths"]
+    with pytest.raises(ValueError, match="Unknown columns"):
+        library.query(["key", "abstract"])
+
+
+def test_filters_on_columns_and_links(library):
+    def keys(**where):
+        return [row["key"] for row in library.query(["key"], where=where)]
+
+    assert keys(embedded=1) == ["A2"]
+    assert keys(tag="maths") == ["A0", "A2"]
+    assert keys(tag="maths", embedded=0) == ["A0"]
+    assert keys(creator="Ada Lovelace") == ["A0", "A1", "A2", "B0"]
+    assert keys(collection="COL2") == keys(collection="Archive") == ["A1"]
+    with pytest.raises(ValueError, match="Cannot filter on 'abstract'"):
+        keys(abstract="x")
+
+
+def test_search_matches_title_key_or_tag_literally(library):
+    def found(search):
+        return [row["key"] for row in library.query(["key"], search=search)]
+
+    assert found("BIOLOGY") == ["A1"]
+    assert found("paper pb0") == ["B0"]
+    assert found("a") == ["A0", "A1", "A2", "B0"]
+    # LIKE wildcards in the search text are matched as characters
+    assert found("100%_") == ["A0"]
+    assert found("%") == ["A0"]
+    assert found("_") == ["A0"]
+    assert library.count(search="maths") == 2
+
+
+def test_offset_and_keyset_pagination(library):
+    pages = [
+        [row["key"] for row in library.query(["key"], limit=3, offset=offset)]
+        for offset in (0, 3)
+    ]
+    after = library.query(["key"], limit=2, after="A1")
+
+    assert pages == [["A0", "A1", "A2"], ["B0"]]
+    assert [row["key"] for row in after] == ["A2", "B0"]
+    assert library.count() == 4
+    assert library.count(where={"tag": "maths"}) == 2
+
+
+def test_iter_items_streams_every_page(library):
+    rows = list(library.iter_items(["title"], page_size=3))
+    embedded = list(library.iter_items(["key"], where={"embedded": 1}))
+
+    assert [row["title"] for row in rows] == [
+        "Paper PA0",
+        "Paper PA1",
+        "Paper PA2",
+        "Paper PB0",
+    ]
+    assert all(set(row) == {"title"} for row in rows)
+    assert embedded == [{"key": "A2"}]
+    assert list(library.read_database()["key"]) == ["A0", "A1", "A2", "B0"]
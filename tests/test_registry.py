@@ -0,0 +1,123 @@
+import functools
+import json
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.embed import EmbeddingsFactory
+from zotgpt.embedbatch import BatchedEmbeddings
+from zotgpt.registry import (
+    EMBEDDINGS_REGISTRY,
+    EmbeddingsSpec,
+    get_embeddings_spec,
+    registered_models,
+    registered_providers,
+    resolve_dimension,
+)
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    queries: int = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def test_registered_and_local_specs():
+    spec = get_embeddings_spec("openai", "text-embedding-3-small")
+    assert (spec.dimension, spec.matryoshka) == (1536, True)
+    assert "local" in registered_providers()
+    assert "embed-english-v3.0" in registered_models("cohere")
+
+    local = get_embeddings_spec("local", "any/sentence-model")
+    assert local.dimension is None
+    assert not local.requires_api_key
+
+
+def test_unknown_provider_or_model_is_refused():
+    with pytest.raises(ValueError, match="embeddings_type must be one of"):
+        get_embeddings_spec("acme", "model")
+    with pytest.raises(ValueError, match="Invalid model for openai"):
+        get_embeddings_spec("openai", "text-embedding-4")
+
+
+def test_resolve_dimension_measures_once_and_caches(tmp_path):
+    cache_path = str(tmp_path / "dimensions.json")
+    spec = EmbeddingsSpec("local", "unsized/model", requires_api_key=False)
+    embeddings = CountingEmbeddings(size=12)
+
+    assert resolve_dimension(spec, embeddings, cache_path) == 12
+    assert resolve_dimension(spec, embeddings, cache_path) == 12
+
+    assert embeddings.queries == 1
+    assert json.loads((tmp_path / "dimensions.json").read_text()) == {
+        "local/unsized/model": 12
+    }
+
+
+def test_factory_dimension_is_read_from_the_spec(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    factory = EmbeddingsFactory("openai", "text-embedding-3-large")
+    monkeypatch.setattr(
+        factory, "create_provider", lambda: pytest.fail("provider created")
+    )
+
+    assert factory.dimension == 3072
+
+
+def test_factory_measures_an_undeclared_dimension_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        "zotgpt.embed.resolve_dimension",
+        functools.partial(
+            resolve_dimension, cache_path=str(tmp_path / "dims.json")
+        ),
+    )
+    monkeypatch.setitem(
+        EMBEDDINGS_REGISTRY,
+        ("local", "test/unsized"),
+        EmbeddingsSpec("local", "test/unsized", requires_api_key=False),
+    )
+    factory = EmbeddingsFactory("local", "test/unsized")
+    created = []
+
+    def create_provider():
+        created.append(1)
+        return DeterministicFakeEmbedding(size=24)
+
+    monkeypatch.setattr(factory, "create_provider", create_provider)
+
+    assert factory.dimension == 24
+    assert factory.dimension == 24
+    assert len(created) == 1
+
+
+def test_factory_validates_shortened_dimensions(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    factory = EmbeddingsFactory(
+        "openai", "text-embedding-3-small", dimensions=256
+    )
+    assert factory.dimension == 256
+
+    with pytest.raises(ValueError, match="does not support"):
+        EmbeddingsFactory("openai", "text-embedding-ada-002", dimensions=256)
+    with pytest.raises(ValueError, match="between 1 and 1536"):
+        EmbeddingsFactory("openai", "text-embedding-3-small", dimensions=4096)
+
+
+def test_factory_requires_the_api_key(monkeypatch):
+    monkeypatch.delenv("COHERE_API_KEY", raising=False)
+    monkeypatch.setattr("zotgpt.embed.load_dotenv", lambda: None)
+
+    with pytest.raises(ValueError, match="COHERE_API_KEY"):
+        EmbeddingsFactory("cohere", "embed-english-v3.0")
+
+
+def test_factory_enforces_the_input_limit(monkeypatch):
+    monkeypatch.setenv("COHERE_API_KEY", "test")
+
+    embeddings = EmbeddingsFactory("cohere", "embed-english-v3.0").create()
+
+    assert isinstance(embeddings, BatchedEmbeddings)
+    assert embeddings.max_input_tokens == 512
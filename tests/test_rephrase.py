@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from zotgpt.retrieval import FALLBACK_PROMPTS, REPHRASE_PROMPT, RephrasePolicy
+
+HISTORY = [("human", "Tell me about BERT"), ("ai", "BERT is an encoder.")]
+
+
+@pytest.fixture
+def llm():
+    return FakeListChatModel(responses=["What is the size of BERT?"])
+
+
+@pytest.fixture
+def policy(llm):
+    return RephrasePolicy(llm, FALLBACK_PROMPTS[REPHRASE_PROMPT])
+
+
+def ask(policy, question, history=HISTORY):
+    return policy.contextualize(
+        {"input": question, "chat_history": history}, config={}
+    )
+
+
+def test_empty_history_skips_the_llm(policy, llm):
+    decision = ask(policy, "how big is it?", history=[])
+
+    assert decision == {"question": "how big is it?", "reason": "empty_history"}
+    assert llm.i == 0
+
+
+@pytest.mark.parametrize(
+    ("question", "standalone"),
+    [
+        ("What datasets were used to pretrain RoBERTa models?", True),
+        ("how big is it?", False),
+        ("What datasets were used to pretrain these models?", False),
+        ("and what datasets were used to pretrain RoBERTa?", False),
+    ],
+)
+def test_is_standalone(policy, question, standalone):
+    assert policy.is_standalone(question) is standalone
+
+
+def test_follow_ups_are_rephrased_once_then_cached(policy, llm):
+    first = ask(policy, "how big is it?")
+    second = ask(policy, "how big is it?")
+    other_history = ask(policy, "how big is it?", history=HISTORY[:1])
+
+    assert first == {"question": "What is the size of BERT?", "reason": "llm"}
+    assert second == {
+        "question": "What is the size of BERT?",
+        "reason": "cached",
+    }
+    assert other_history["reason"] == "llm"
+    assert policy.stats == {
+        "empty_history": 0,
+        "standalone": 0,
+        "cached": 1,
+        "llm": 2,
+    }
+
+
+def test_async_path_shares_the_cache(policy):
+    ask(policy, "how big is it?")
+
+    decision = asyncio.run(
+        policy.acontextualize(
+            {"input": "how big is it?", "chat_history": HISTORY}, config={}
+        )
+    )
+
+    assert decision["reason"] == "cached"
+
+
+def test_cache_is_bounded(llm):
+    policy = RephrasePolicy(
+        llm, FALLBACK_PROMPTS[REPHRASE_PROMPT], cache_size=2
+    )
+
+    for question in ["why?", "and it?", "what else?"]:
+        ask(policy, question)
+
+    assert len(policy.cache) == 2
+    assert ask(policy, "why?")["reason"] == "llm"
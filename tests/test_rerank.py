@@ -0,0 +1,106 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+
+from zotgpt import retrieval
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.rerank import CrossEncoderReranker
+from zotgpt.retrieval import FALLBACK_PROMPTS, Retriever
+
+
+class FakeCrossEncoder:
+    """Scores a pair by the number in its text: "doc 7" scores 7."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32):
+        self.calls.append(pairs)
+        return [float(text.split()[-1]) for _, text in pairs]
+
+
+def make_reranker(**kwargs) -> CrossEncoderReranker:
+    reranker = CrossEncoderReranker(**kwargs)
+    reranker._model = FakeCrossEncoder()
+    return reranker
+
+
+def docs(*scores: int) -> list[Document]:
+    return [Document(page_content=f"doc {score}") for score in scores]
+
+
+def texts(documents: list[Document]) -> list[str]:
+    return [doc.page_content for doc in documents]
+
+
+def test_rerank_orders_by_score_and_caches_pairs():
+    reranker = make_reranker()
+
+    first = reranker.rerank("query", docs(1, 3, 2), k=2)
+    second = reranker.rerank("query", docs(3, 4, 2), k=3)
+
+    assert texts(first) == ["doc 3", "doc 2"]
+    assert texts(second) == ["doc 4", "doc 3", "doc 2"]
+    assert len(reranker.model.calls[-1]) == 1
+    assert reranker.stats["cached_pairs"] == 2
+    assert reranker.stats["scored_pairs"] == 4
+
+
+def test_over_budget_reranks_the_prefix_that_fits():
+    reranker = make_reranker(latency_budget=0.375)
+    reranker.seconds_per_pair = 0.125
+
+    found = reranker.rerank("query", docs(1, 2, 3, 9, 8), k=4)
+
+    assert texts(found) == ["doc 3", "doc 2", "doc 1", "doc 9"]
+    assert [len(pairs) for pairs in reranker.model.calls] == [3]
+    assert reranker.stats["truncated"] == 1
+
+
+def test_budget_estimate_recovers_after_a_slow_spell():
+    reranker = make_reranker(latency_budget=1.0)
+    reranker.seconds_per_pair = 10.0
+
+    for i in range(30):
+        found = reranker.rerank(f"query {i}", docs(1, 2, 3, 4, 5, 6), k=6)
+
+    assert len(reranker.model.calls[0]) == 2
+    assert texts(found) == [
+        "doc 6",
+        "doc 5",
+        "doc 4",
+        "doc 3",
+        "doc 2",
+        "doc 1",
+    ]
+    assert len(reranker.model.calls[-1]) == 6
+
+
+def test_busy_reranker_returns_retrieval_order():
+    reranker = make_reranker(max_in_flight=1)
+    reranker._in_flight.acquire()
+
+    found = reranker.rerank("query", docs(1, 2, 3), k=2)
+
+    assert texts(found) == ["doc 1", "doc 2"]
+    assert reranker.stats["skipped_load"] == 1
+    assert reranker.model.calls == []
+
+
+def test_retriever_reranks_with_the_configured_or_default_k(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(retrieval, "load_prompt", FALLBACK_PROMPTS.get)
+    vector_store = LocalVectorStore(
+        DeterministicFakeEmbedding(size=8), str(tmp_path / "vectors")
+    )
+    vector_store.add_documents(docs(*range(10)))
+    retriever = Retriever(
+        vector_store,
+        llm=FakeListChatModel(responses=["answer"]),
+        reranker=make_reranker(top_n=10),
+    )
+    inputs = {"rephrase": {"question": "query"}, "candidates": docs(*range(8))}
+
+    assert texts(retriever.rerank(inputs, {})) == texts(docs(7, 6, 5, 4, 3))
+    assert len(retriever.rerank(inputs, {"configurable": {"k": 2}})) == 2
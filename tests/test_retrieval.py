@@ -0,0 +1,99 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import PromptTemplate
+
+from zotgpt import retrieval
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.retrieval import (
+    FALLBACK_PROMPTS,
+    REPHRASE_PROMPT,
+    Retriever,
+    load_prompt,
+)
+
+
+@pytest.fixture(autouse=True)
+def offline_prompts(monkeypatch):
+    monkeypatch.setattr(retrieval, "load_prompt", FALLBACK_PROMPTS.get)
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    store = LocalVectorStore(
+        DeterministicFakeEmbedding(size=16), str(tmp_path / "vectors")
+    )
+    store.add_documents([
+        Document(
+            page_content=f"chunk {i} of paper {key}",
+            metadata={"id": key, "title": key, "source": "", "page": i},
+        )
+        for key in ["A", "B", "C"]
+        for i in range(3)
+    ])
+    return store
+
+
+def make_retriever(vector_store, responses=("the answer",), **kwargs):
+    llm = FakeListChatModel(responses=list(responses))
+    return Retriever(vector_store, llm=llm, **kwargs)
+
+
+def test_load_prompt_pulls_once_then_reads_the_cache(monkeypatch, tmp_path):
+    pulls = []
+
+    def pull(name):
+        pulls.append(name)
+        return PromptTemplate.from_template("Rephrase {input}")
+
+    monkeypatch.setattr(retrieval.hub, "pull", pull)
+
+    first = load_prompt(REPHRASE_PROMPT, cache_dir=str(tmp_path))
+    second = load_prompt(REPHRASE_PROMPT, cache_dir=str(tmp_path))
+
+    assert pulls == [REPHRASE_PROMPT]
+    assert second.template == first.template == "Rephrase {input}"
+
+
+def test_load_prompt_falls_back_to_the_bundled_copy(monkeypatch, tmp_path):
+    def pull(name):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(retrieval.hub, "pull", pull)
+
+    prompt = load_prompt(REPHRASE_PROMPT, cache_dir=str(tmp_path))
+
+    assert prompt is FALLBACK_PROMPTS[REPHRASE_PROMPT]
+    assert not list(tmp_path.iterdir())
+
+
+def test_chain_is_built_once_and_configured_per_call(vector_store, monkeypatch):
+    retriever = make_retriever(vector_store, responses=["one", "two"])
+    monkeypatch.setattr(
+        retriever, "make_chain", lambda: pytest.fail("chain rebuilt")
+    )
+
+    first = retriever.retrieve("chunk 1", [], k=2)
+    second = retriever.retrieve("chunk 1", [], k=4, ids=["B"])
+
+    assert first["answer"] == "one"
+    assert len(first["context"]) == 2
+    assert second["answer"] == "two"
+    assert len(second["context"]) == 3
+    assert {doc.metadata["id"] for doc in second["context"]} == {"B"}
+
+
+def test_stream_yields_context_before_answer_tokens(vector_store):
+    retriever = make_retriever(vector_store, responses=["streamed answer"])
+
+    chunks = list(retriever.stream("chunk 2", [], k=3))
+
+    keys = [next(iter(chunk)) for chunk in chunks]
+    assert keys[:2] == ["rephrase", "context"]
+    assert set(keys[2:]) == {"answer"}
+    assert len(keys) > 3
+    assert len(chunks[1]["context"]) == 3
+    assert "".join(chunk["answer"] for chunk in chunks[2:]) == (
+        "streamed answer"
+    )
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from zotgpt import retrieval
+from zotgpt.retrieval import FALLBACK_PROMPTS, Retriever
+from zotgpt.server import create_app
+
+
+@pytest.fixture
+def retriever(monkeypatch):
+    monkeypatch.setattr(retrieval, "load_prompt", FALLBACK_PROMPTS.get)
+    vector_store = InMemoryVectorStore(DeterministicFakeEmbedding(size=16))
+    vector_store.add_documents([
+        Document(page_content=f"chunk {i}", metadata={"id": f"K{i % 2}"})
+        for i in range(6)
+    ])
+    llm = FakeListChatModel(responses=["async answer"])
+    return Retriever(vector_store, llm=llm)
+
+
+def post(app, path: str, payload: dict) -> httpx.Response:
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://zotgpt"
+        ) as client:
+            return await client.post(path, json=payload)
+
+    return asyncio.run(send())
+
+
+def test_aretrieve_matches_retrieve(retriever):
+    expected = retriever.retrieve("chunk", [], k=2)
+
+    response = asyncio.run(retriever.aretrieve("chunk", [], k=2))
+
+    assert response["answer"] == expected["answer"] == "async answer"
+    assert response["context"] == expected["context"]
+
+
+def test_retrieve_endpoint(retriever):
+    response = post(
+        create_app(retriever), "/retrieve", {"query": "chunk", "k": 3}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["answer"] == "async answer"
+    assert len(body["context"]) == 3
+    assert set(body["context"][0]) == {"page_content", "metadata"}
+
+
+def test_stream_endpoint_sends_ndjson(retriever):
+    response = post(
+        create_app(retriever),
+        "/stream",
+        {"query": "chunk", "chat_history": [], "k": 2},
+    )
+
+    chunks = [json.loads(line) for line in response.text.splitlines()]
+    assert [next(iter(chunk)) for chunk in chunks[:2]] == [
+        "rephrase",
+        "context",
+    ]
+    assert len(chunks[1]["context"]) == 2
+    assert "".join(chunk["answer"] for chunk in chunks[2:]) == "async answer"
@@ -0,0 +1,116 @@
+import pytest
+from conftest import make_attachment, make_parent
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from zotgpt.lexical import BM25Index
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.metastore import MetaStore
+from zotgpt.sync import sync_library
+from zotgpt.zotero import ZoteroWrapper
+
+
+@pytest.fixture
+def library(zot):
+    for i in range(3):
+        zot.add(make_parent(f"P{i}"))
+        zot.add(make_attachment(f"A{i}", f"P{i}", md5=f"md5-{i}"))
+    return zot
+
+
+@pytest.fixture
+def metastore(tmp_path):
+    store = MetaStore(str(tmp_path / "db" / "meta.sqlite"))
+    yield store
+    store.close()
+
+
+def keys(metastore: MetaStore, **where) -> list[str]:
+    return [row["key"] for row in metastore.query(["key"], where=where)]
+
+
+def test_first_sync_is_full_and_records_version(library, metastore):
+    result = sync_library(ZoteroWrapper(library), metastore, "COL1")
+
+    assert result == {"version": library.version, "upserted": 3, "deleted": 0}
+    assert keys(metastore) == ["A0", "A1", "A2"]
+    assert metastore.get_library_version("COL1") == library.version
+
+
+def test_sync_without_changes_fetches_nothing(library, metastore):
+    wrapper = ZoteroWrapper(library)
+    sync_library(wrapper, metastore, "COL1")
+    library.calls.clear()
+
+    result = sync_library(wrapper, metastore, "COL1")
+
+    assert result["upserted"] == 0
+    assert library.calls == []
+
+
+def test_sync_fetches_only_changes_since_last_version(library, metastore):
+    wrapper = ZoteroWrapper(library)
+    sync_library(wrapper, metastore, "COL1")
+    last_version = library.version
+    library.add(make_attachment("A3", "P0", md5="md5-3"))
+
+    result = sync_library(wrapper, metastore, "COL1")
+
+    assert result["upserted"] == 1
+    assert ("collection_items", 0, last_version, None) in library.calls
+    assert keys(metastore) == ["A0", "A1", "A2", "A3"]
+
+
+def test_parent_edit_keeps_embedded_flag(library, metastore):
+    wrapper = ZoteroWrapper(library)
+    sync_library(wrapper, metastore, "COL1")
+    metastore.update_embedded_value_by_key(["A0", "A1"])
+    library.add(make_parent("P0", tags=[{"tag": "retagged"}]))
+
+    result = sync_library(wrapper, metastore, "COL1")
+
+    assert result["upserted"] == 1
+    assert keys(metastore, tag="retagged") == ["A0"]
+    assert keys(metastore, embedded=1) == ["A0", "A1"]
+
+
+def test_changed_file_resets_embedded_flag(library, metastore):
+    wrapper = ZoteroWrapper(library)
+    sync_library(wrapper, metastore, "COL1")
+    metastore.update_embedded_value_by_key(["A0", "A1"])
+    library.add(make_attachment("A1", "P1", md5="md5-new"))
+
+    sync_library(wrapper, metastore, "COL1")
+
+    assert keys(metastore, embedded=1) == ["A0"]
+
+
+def test_deleted_items_leave_every_store(library, metastore, tmp_path):
+    vector_store = LocalVectorStore(
+        DeterministicFakeEmbedding(size=8), str(tmp_path / "vectors")
+    )
+    lexical_index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    documents = [
+        Document(page_content=f"chunk of {key}", metadata={"id": key})
+        for key in ["A0", "A1", "A2"]
+    ]
+    vector_store.add_documents(documents)
+    lexical_index.add_documents(documents)
+    wrapper = ZoteroWrapper(library)
+    sync_library(wrapper, metastore, "COL1")
+    library.delete("A1")
+
+    result = sync_library(
+        wrapper,
+        metastore,
+        "COL1",
+        vector_store=vector_store,
+        lexical_index=lexical_index,
+    )
+
+    assert result["deleted"] == 1
+    assert keys(metastore) == ["A0", "A2"]
+    assert len(vector_store) == 2
+    assert len(lexical_index) == 2
+    found = vector_store.similarity_search("chunk", k=3)
+    assert sorted(doc.metadata["id"] for doc in found) == ["A0", "A2"]
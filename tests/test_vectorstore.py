@@ -0,0 +1,100 @@
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_pinecone import PineconeVectorStore
+
+from zotgpt.localstore import LocalVectorStore
+from zotgpt.vectorstore import (
+    add_embedded_documents,
+    delete_item_documents,
+    replace_item_documents,
+)
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=8)
+
+
+def chunks(key: str, count: int) -> tuple[list[Document], list[list[float]]]:
+    documents = [
+        Document(page_content=f"{key} chunk {i}", metadata={"id": key})
+        for i in range(count)
+    ]
+    return documents, EMBEDDINGS.embed_documents([
+        doc.page_content for doc in documents
+    ])
+
+
+@pytest.fixture(params=["local", "chroma"])
+def vector_store(request, tmp_path):
+    if request.param == "local":
+        return LocalVectorStore(EMBEDDINGS, str(tmp_path / "local"))
+    return Chroma(
+        collection_name="test",
+        embedding_function=EMBEDDINGS,
+        persist_directory=str(tmp_path / "chroma"),
+    )
+
+
+def stored_ids(vector_store) -> list[str]:
+    docs = vector_store.similarity_search("chunk", k=100)
+    return sorted(doc.id for doc in docs)
+
+
+def test_replace_item_documents_never_duplicates(vector_store):
+    replace_item_documents(vector_store, "A", *chunks("A", 3))
+    replace_item_documents(vector_store, "B", *chunks("B", 1))
+
+    replace_item_documents(vector_store, "A", *chunks("A", 2))
+
+    assert stored_ids(vector_store) == ["A:0", "A:1", "B:0"]
+
+
+def test_delete_item_documents(vector_store):
+    replace_item_documents(vector_store, "A", *chunks("A", 2))
+    replace_item_documents(vector_store, "B", *chunks("B", 2))
+
+    delete_item_documents(vector_store, ["A", "C"])
+
+    assert stored_ids(vector_store) == ["B:0", "B:1"]
+
+
+class FakePineconeIndex:
+    """Serverless index calls: upsert, list by id prefix, delete by id."""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def upsert(self, vectors, namespace=None):
+        self.vectors.update((id_, metadata) for id_, _, metadata in vectors)
+
+    def list(self, prefix, namespace=None):
+        ids = sorted(id_ for id_ in self.vectors if id_.startswith(prefix))
+        for i in range(0, len(ids), 2):
+            yield ids[i : i + 2]
+
+    def delete(self, ids=None, namespace=None, **kwargs):
+        if "filter" in kwargs:
+            raise ValueError("Serverless indexes cannot delete by metadata")
+        for id_ in ids:
+            del self.vectors[id_]
+
+
+def test_pinecone_chunks_are_deleted_by_id_prefix():
+    store = PineconeVectorStore.__new__(PineconeVectorStore)
+    store._index = FakePineconeIndex()
+    store._namespace = None
+    store._text_key = "text"
+
+    replace_item_documents(store, "A", *chunks("A", 3))
+    replace_item_documents(store, "AB", *chunks("AB", 1))
+    replace_item_documents(store, "A", *chunks("A", 2))
+
+    assert sorted(store.index.vectors) == ["A:0", "A:1", "AB:0"]
+
+
+def test_stores_without_precomputed_vectors_are_refused():
+    store = InMemoryVectorStore(EMBEDDINGS)
+
+    with pytest.raises(ValueError, match="InMemoryVectorStore"):
+        add_embedded_documents(store, *chunks("A", 1))
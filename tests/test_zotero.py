@@ -0,0 +1,129 @@
+import time
+
+from conftest import make_attachment, make_parent
+
+from zotgpt.zotero import ZoteroItem, ZoteroWrapper, fetch_items_by_keys
+
+
+def add_papers(zot, count: int, attachments_per_parent: int = 1) -> list:
+    attachments = []
+    for i in range(count):
+        zot.add(make_parent(f"P{i:03d}"))
+        for j in range(attachments_per_parent):
+            attachments.append(
+                zot.add(make_attachment(f"A{i:03d}{j}", f"P{i:03d}"))
+            )
+    return attachments
+
+
+def test_fetch_items_by_keys_chunks_and_dedups(zot):
+    add_papers(zot, 120)
+    keys = [f"P{i:03d}" for i in range(120)] * 2 + ["", None]
+
+    items = fetch_items_by_keys(zot, keys)
+
+    assert sorted(items) == [f"P{i:03d}" for i in range(120)]
+    requests = [call[1] for call in zot.calls if call[0] == "items"]
+    assert sorted(len(chunk) for chunk in requests) == [20, 50, 50]
+
+
+def test_from_items_resolves_each_parent_once(zot):
+    attachments = add_papers(zot, 3, attachments_per_parent=2)
+
+    items = ZoteroItem.from_items(zot, attachments)
+
+    assert [item.key for item in items] == [a["key"] for a in attachments]
+    assert all(item.has_parent for item in items)
+    assert items[0].get_title() == "Paper P000"
+    assert zot.calls == [("items", ("P000", "P001", "P002"))]
+
+
+def test_from_items_falls_back_for_missing_parents(zot):
+    orphan = make_attachment("A999", "MISSING")
+    attachments = [*add_papers(zot, 1), orphan]
+
+    items = ZoteroItem.from_items(zot, attachments)
+
+    assert [item.has_parent for item in items] == [True, False]
+    assert items[1].get_title() == "Full Text PDF"
+    assert ("item", "MISSING") in zot.calls
+
+
+def test_iter_items_fetches_every_page_once(zot):
+    attachments = add_papers(zot, 23)
+    wrapper = ZoteroWrapper(zot)
+
+    items = list(wrapper.iter_items_from_collection_key("COL1", limit=5))
+
+    expected = {item["key"] for item in attachments} | {
+        f"P{i:03d}" for i in range(23)
+    }
+    assert sorted(item["key"] for item in items) == sorted(expected)
+    starts = [call[1] for call in zot.calls if call[0] == "collection_items"]
+    assert sorted(starts) == list(range(0, 46, 5))
+
+
+def test_iter_items_prefetches_before_the_first_item_is_consumed(zot):
+    add_papers(zot, 23)
+    wrapper = ZoteroWrapper(zot)
+
+    items = wrapper.iter_items_from_collection_key("COL1", limit=5)
+    next(items)
+
+    def starts():
+        calls = [call for call in zot.calls if call[0] == "collection_items"]
+        return sorted(call[1] for call in calls)
+
+    deadline = time.monotonic() + 5
+    while len(starts()) < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert starts() == list(range(0, 46, 5))
+    items.close()
+
+
+def test_iter_items_walks_pages_without_total(zot):
+    add_papers(zot, 6)
+    collection_items = zot.collection_items
+
+    def without_total(*args, **kwargs):
+        items = collection_items(*args, **kwargs)
+        zot.request.headers = {}
+        return items
+
+    zot.collection_items = without_total
+    wrapper = ZoteroWrapper(zot)
+
+    items = list(wrapper.iter_items_from_collection_key("COL1", limit=5))
+
+    assert len(items) == 12
+    starts = [call[1] for call in zot.calls if call[0] == "collection_items"]
+    assert starts == [0, 5, 10]
+
+
+def test_pdf_items_are_requested_as_attachments(zot):
+    add_papers(zot, 2)
+    zot.add(make_attachment("SNAP", "P000", contentType="text/html"))
+    wrapper = ZoteroWrapper(zot)
+
+    items = wrapper.get_pdf_items_from_collection_key("COL1")
+
+    assert sorted(item["key"] for item in items) == ["A0000", "A0010"]
+    item_types = {
+        call[3] for call in zot.calls if call[0] == "collection_items"
+    }
+    assert item_types == {"attachment"}
+
+
+def test_pdf_items_without_server_filter(zot):
+    add_papers(zot, 2)
+    wrapper = ZoteroWrapper(zot)
+
+    items = wrapper.get_pdf_items_from_collection_key(
+        "COL1", attachments_only=False
+    )
+
+    assert sorted(item["key"] for item in items) == ["A0000", "A0010"]
+    item_types = {
+        call[3] for call in zot.calls if call[0] == "collection_items"
+    }
+    assert item_types == {None}